@@ -31,8 +31,25 @@ Questions can be directed to support@sunspec.org
 """
 
 import os
+import sys
+import re
+import ast
+import copy
+import functools
+import hashlib
+import inspect
+import glob
+import argparse
+import concurrent.futures
+import subprocess
+import threading
+import queue
 import xml.etree.ElementTree as ET
 import csv
+import json
+import io
+import struct
+import zipfile
 import math
 import xlsxwriter
 import traceback
@@ -77,11 +94,261 @@ FULL_NAME = {'V': 'Voltage',
 LFRT = "LFRT"
 HFRT = "HFRT"
 
+# Time response capture modes
+SLEEP_CAPTURE = 'Sleep'
+STREAMING_CAPTURE = 'Streaming'
+
+# EUT response to phase imbalance (eut.imbalance_resp)
+AVG_3PH_RMS = 'AVG_3PH_RMS'
+INDIVIDUAL_PHASES_VOLTAGES = 'INDIVIDUAL_PHASES_VOLTAGES'
+POSITIVE_SEQUENCE_VOLTAGES = 'POSITIVE_SEQUENCE_VOLTAGES'
+
 
 class p1547Error(Exception):
     pass
 
 
+LOG_DEBUG = 'Debug'
+LOG_INFO = 'Info'
+LOG_WARNING = 'Warning'
+LOG_LEVELS = OrderedDict([(LOG_DEBUG, 10), (LOG_INFO, 20), (LOG_WARNING, 30)])
+
+
+class LibraryLog(object):
+    """
+    Logging of the library hot paths (measurements, targets and criteria of every step). The level is checked before
+    the message is formatted: the message is formatted with its arguments ('value=%s', value) or built by calling it
+    (lambda: ...) only when it is logged. The debug and info messages of a subsystem are limited to the
+    p1547.log_rate option per second, the number of dropped messages is logged with the next one. Warnings and errors
+    are always logged.
+    """
+
+    def __init__(self, ts, subsystem, level=None, rate=None):
+        """
+        :param ts:          test script object
+        :param subsystem:   name of the subsystem in the rate limit messages
+        :param level:       LOG_DEBUG, LOG_INFO or LOG_WARNING, default is the p1547.log_level option
+        :param rate:        messages per second, 0 for no limit, default is the p1547.log_rate option
+        """
+        self.ts = ts
+        self.subsystem = subsystem
+        if level is None:
+            level = ts.param_value('p1547.log_level')
+        self.level = LOG_LEVELS.get(level, LOG_LEVELS[LOG_DEBUG])
+        if rate is None:
+            rate = ts.param_value('p1547.log_rate')
+        self.rate = float(rate or 0)
+        self.window = None
+        self.count = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def enabled(self, level=LOG_DEBUG):
+        return LOG_LEVELS[level] >= self.level
+
+    def allow(self):
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            if self.window is None or now - self.window >= 1.:
+                if self.dropped:
+                    self.ts.log_debug('%s %s messages dropped' % (self.dropped, self.subsystem))
+                self.window = now
+                self.count = 0
+                self.dropped = 0
+            if self.count >= self.rate:
+                self.dropped += 1
+                return False
+            self.count += 1
+            return True
+
+    @staticmethod
+    def format(message, args):
+        if callable(message):
+            message = message()
+        return message % args if args else str(message)
+
+    def debug(self, message, *args):
+        if self.level <= LOG_LEVELS[LOG_DEBUG] and self.allow():
+            self.ts.log_debug(self.format(message, args))
+
+    def info(self, message, *args):
+        if self.level <= LOG_LEVELS[LOG_INFO] and self.allow():
+            self.ts.log(self.format(message, args))
+
+    def warning(self, message, *args):
+        self.ts.log_warning(self.format(message, args))
+
+    def error(self, message, *args):
+        self.ts.log_error(self.format(message, args))
+
+
+def library_log(ts, subsystem):
+    """
+    LibraryLog of a subsystem, created once per test script object
+
+    :param ts:          test script object
+    :param subsystem:   name of the subsystem (e.g. 'measurement', 'criteria')
+    :return: LibraryLog object
+    """
+    logs = getattr(ts, '_p1547_logs', None)
+    if logs is None:
+        logs = {}
+        try:
+            ts._p1547_logs = logs
+        except AttributeError:
+            pass
+    if subsystem not in logs:
+        logs[subsystem] = LibraryLog(ts, subsystem)
+    return logs[subsystem]
+
+
+# Types of the EUT parameters checked when the parameter snapshot is taken
+EUT_PARAMETER_TYPES = OrderedDict([
+    ('eut.v_nom', float), ('eut.s_rated', float), ('eut.v_high', float), ('eut.v_low', float),
+    ('eut.f_nom', float), ('eut.f_max', float), ('eut.f_min', float), ('eut.phases', str),
+    ('eut.p_rated', float), ('eut.p_rated_prime', float), ('eut.p_min', float), ('eut.var_rated', float),
+    ('eut.abs_enabled', str),
+])
+EUT_REQUIRED_PARAMETERS = ('eut.v_nom', 'eut.s_rated')
+EUT_PHASES = ('single phase', 'split phase', 'three phase')
+
+
+class ParameterSnapshot(object):
+    """
+    Read-only snapshot of the test parameters, shared by the library classes of a test. The EUT parameters are read
+    and validated when the snapshot is taken, the other parameters are read from the test script the first time they
+    are used. A value never changes once read, so the parameters cannot drift during a run.
+    """
+
+    def __init__(self, ts, params=None):
+        """
+        :param ts:      test script object
+        :param params:  dictionary of all the parameter values (e.g. from read_test_config), default reads them
+                        from ts when they are used
+        """
+        values = OrderedDict(params or {})
+        for name in EUT_PARAMETER_TYPES:
+            if name not in values:
+                values[name] = ts.param_value(name)
+        object.__setattr__(self, 'ts', ts)
+        object.__setattr__(self, 'values', values)
+        object.__setattr__(self, 'complete', params is not None)
+        self.validate()
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is immutable' % type(self).__name__)
+
+    def validate(self):
+        """
+        Check the types of the EUT parameters and that the required ones are set
+
+        :return: nothing
+        """
+        errors = []
+        for name, ptype in EUT_PARAMETER_TYPES.items():
+            value = self.values.get(name)
+            if value is None:
+                if name in EUT_REQUIRED_PARAMETERS:
+                    errors.append(f'{name} is not set')
+            elif ptype is float and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                errors.append(f'{name} = {value!r} is not a number')
+            elif ptype is str and not isinstance(value, str):
+                errors.append(f'{name} = {value!r} is not a string')
+        for name in EUT_REQUIRED_PARAMETERS:
+            value = self.values.get(name)
+            if isinstance(value, (int, float)) and value <= 0:
+                errors.append(f'{name} = {value!r} must be positive')
+        phases = self.values.get('eut.phases')
+        if isinstance(phases, str) and phases.lower() not in EUT_PHASES:
+            errors.append(f'eut.phases = {phases!r} is not one of {EUT_PHASES}')
+        if errors:
+            self.ts.log_error('Incorrect Parameter value : %s' % '; '.join(errors))
+            raise p1547Error('Incorrect Parameter value : %s' % '; '.join(errors))
+
+    def param_value(self, name):
+        """
+        Same as ts.param_value
+
+        :param name:    parameter name, e.g. 'eut.v_nom'
+        :return: parameter value, None if it is not set
+        """
+        if name not in self.values:
+            if self.complete:
+                return None
+            self.values[name] = self.ts.param_value(name)
+        return self.values[name]
+
+
+def parameter_snapshot(ts):
+    """
+    ParameterSnapshot of a test, taken once per test script object. The parameters of an OfflineTestScript are all
+    taken at once.
+
+    :param ts:          test script object
+    :return: ParameterSnapshot object
+    """
+    snapshot = getattr(ts, '_p1547_params', None)
+    if snapshot is None:
+        snapshot = ParameterSnapshot(ts, params=ts.params if isinstance(ts, OfflineTestScript) else None)
+        try:
+            ts._p1547_params = snapshot
+        except AttributeError:
+            pass
+    return snapshot
+
+
+def params(info, group_name='p1547'):
+    """
+    Library options shared by the P1547 test scripts. These are opt-in, the defaults keep the original
+    behaviour of the library.
+
+    :param info:        script info object
+    :param group_name:  name of the parameter group
+    :return: nothing
+    """
+    gname = lambda name: group_name + '.' + name
+    info.param_group(group_name, label='P1547 Library Options', glob=True)
+    info.param(gname('capture_mode'), label='Time response capture mode', default=SLEEP_CAPTURE,
+               values=[SLEEP_CAPTURE, STREAMING_CAPTURE])
+    info.param(gname('capture_period'), label='Streaming sample period (s)', default=0.05,
+               active=gname('capture_mode'), active_value=[STREAMING_CAPTURE])
+    info.param(gname('adaptive_ss'), label='Adaptive steady state (end the steps once Y is within the envelope)',
+               default='Disabled', values=['Disabled', 'Enabled'],
+               active=gname('capture_mode'), active_value=[STREAMING_CAPTURE])
+    info.param(gname('adaptive_ss_dwell'), label='Adaptive steady state dwell time (s)', default=5.0,
+               active=gname('adaptive_ss'), active_value=['Enabled'])
+    info.param(gname('profile'), label='Time the library and driver calls (timing.json)',
+               default='Disabled', values=['Disabled', 'Enabled'])
+    info.param(gname('log_level'), label='Level of the library step messages', default=LOG_DEBUG,
+               values=list(LOG_LEVELS))
+    info.param(gname('log_rate'), label='Maximum library messages per second and subsystem (0: no limit)',
+               default=0)
+    info.param(gname('virtual_lab'), label='Virtual lab (simulated EUT, grid, PV and DAQ)', default='Disabled',
+               values=['Disabled', 'Enabled'])
+    info.param(gname('virtual_lab_speed'), label='Virtual lab speed (x real time)', default=100.0,
+               active=gname('virtual_lab'), active_value=['Enabled'])
+    info.param(gname('virtual_lab_response'), label='Virtual lab EUT response time (fraction of Tr)', default=0.5,
+               active=gname('virtual_lab'), active_value=['Enabled'])
+
+
+def waveform_params(info, group_name='waveform'):
+    """
+    Options of the waveform export of the scripts capturing waveforms on the real-time target (VRT, FRT, UI, PCRT)
+
+    :param info:        script info object
+    :param group_name:  name of the parameter group
+    :return: nothing
+    """
+    gname = lambda name: group_name + '.' + name
+    info.param_group(group_name, label='Waveform Export', glob=True)
+    info.param(gname('mat_dir'), label='Directory of the .mat files written by the target (empty: DAS driver)',
+               default='')
+    info.param(gname('timeout'), label='Maximum wait for the .mat file (s)', default=60.0)
+    info.param(gname('csv'), label='Export the waveforms to csv', default='Yes', values=['Yes', 'No'])
+
+
 """
 This section is for EUT parameters needed such as V, P, Q, etc.
 """
@@ -96,11 +363,12 @@ def VersionValidation(script_version):
 class EutParameters(object):
     def __init__(self, ts):
         self.ts = ts
+        params = parameter_snapshot(ts)
         try:
-            self.v_nom = ts.param_value('eut.v_nom')
-            self.s_rated = ts.param_value('eut.s_rated')
-            self.v_high = ts.param_value('eut.v_high')
-            self.v_low = ts.param_value('eut.v_low')
+            self.v_nom = params.param_value('eut.v_nom')
+            self.s_rated = params.param_value('eut.s_rated')
+            self.v_high = params.param_value('eut.v_high')
+            self.v_low = params.param_value('eut.v_low')
 
             '''
             Minimum required accuracy (MRA) (per Table 3 of IEEE Std 1547-2018)
@@ -125,8 +393,8 @@ class EutParameters(object):
             '''
             self.MRA = {
                 'V': 0.01 * self.v_nom,
-                'Q': 0.05 * ts.param_value('eut.s_rated'),
-                'P': 0.05 * ts.param_value('eut.s_rated'),
+                'Q': 0.05 * self.s_rated,
+                'P': 0.05 * self.s_rated,
                 'F': 0.01,
                 'T': 0.01,
                 'PF': 0.01
@@ -136,35 +404,35 @@ class EutParameters(object):
             self.MRA_F_trans = 0.1
             self.MRA_T_trans = 2. / 60.
 
-            if ts.param_value('eut.f_nom'):
-                self.f_nom = ts.param_value('eut.f_nom')
+            if params.param_value('eut.f_nom'):
+                self.f_nom = params.param_value('eut.f_nom')
             else:
                 self.f_nom = None
 
-            if ts.param_value('eut.f_max'):
-                self.f_max = ts.param_value('eut.f_max')
+            if params.param_value('eut.f_max'):
+                self.f_max = params.param_value('eut.f_max')
             else:
                 self.f_max = None
-            if ts.param_value('eut.f_min'):
-                self.f_min = ts.param_value('eut.f_min')
+            if params.param_value('eut.f_min'):
+                self.f_min = params.param_value('eut.f_min')
             else:
                 self.f_min = None
 
-            if ts.param_value('eut.phases') is not None:
-                self.phases = ts.param_value('eut.phases')
+            if params.param_value('eut.phases') is not None:
+                self.phases = params.param_value('eut.phases')
             else:
                 self.phases = None
-            if ts.param_value('eut.p_rated') is not None:
-                self.p_rated = ts.param_value('eut.p_rated')
-                self.p_rated_prime = ts.param_value('eut.p_rated_prime')  # absorption power
+            if params.param_value('eut.p_rated') is not None:
+                self.p_rated = params.param_value('eut.p_rated')
+                self.p_rated_prime = params.param_value('eut.p_rated_prime')  # absorption power
                 if self.p_rated_prime is None:
                     self.p_rated_prime = -self.p_rated
-                self.p_min = ts.param_value('eut.p_min')
-                self.var_rated = ts.param_value('eut.var_rated')
+                self.p_min = params.param_value('eut.p_min')
+                self.var_rated = params.param_value('eut.var_rated')
             else:
                 self.var_rated = None
             # self.imbalance_angle_fix = imbalance_angle_fix
-            self.absorb = ts.param_value('eut.abs_enabled')
+            self.absorb = params.param_value('eut.abs_enabled')
 
         except Exception as e:
             self.ts.log_error('Incorrect Parameter value : %s' % e)
@@ -245,9 +513,371 @@ class UtilParameters:
         return self.script_complete_name
 
 
+class ResultSummary(object):
+    """
+    Writer for result_summary.csv that replaces open(..., 'a+'). Rows are buffered until they are
+    complete and written with a single write followed by fsync at each step boundary, so an interrupted
+    test cannot lose or tear rows. Every row is also appended to a typed binary sidecar
+    (result_summary.bin, described by result_summary.json) that read_result_summary_sidecar opens as a
+    NumPy memmap.
+    """
+    TEXT_COLUMNS = ('STEP', 'FILENAME', '90%_BY_TR=1', 'WITHIN_BOUNDS_BY_TR=1', 'WITHIN_BOUNDS_BY_LAST_TR')
+    TEXT_SIZE = 64
+
+    def __init__(self, path, sidecar=True, autoflush=True):
+        """
+        :param path:        path of the csv file, rows are appended when it exists
+        :param sidecar:     write the binary sidecar
+        :param autoflush:   flush after each complete row, otherwise rows are kept until flush() is called
+        """
+        self.path = path
+        self.autoflush = autoflush
+        self.pending = ''
+        self.rows = []
+        self.columns = None
+        self.dtype = None
+        if sidecar:
+            base = os.path.splitext(path)[0]
+            self.sidecar_path = base + '.bin'
+            self.sidecar_header_path = base + '.json'
+        else:
+            self.sidecar_path = None
+            self.sidecar_header_path = None
+        self.sidecar_fd = None
+        self.repair()
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def repair(self):
+        """
+        Remove the partial row left at the end of the files by an interrupted run
+        """
+        if os.path.exists(self.path):
+            with open(self.path, 'rb+') as f:
+                data = f.read()
+                if data and not data.endswith(b'\n'):
+                    f.truncate(data.rfind(b'\n') + 1)
+
+        if self.sidecar_path is not None and os.path.exists(self.sidecar_header_path):
+            with open(self.sidecar_header_path) as f:
+                header = json.load(f)
+            self.columns = header['columns']
+            self.dtype = np.dtype([tuple(descr) for descr in header['descr']])
+            if os.path.exists(self.sidecar_path):
+                size = os.path.getsize(self.sidecar_path)
+                if size % self.dtype.itemsize:
+                    with open(self.sidecar_path, 'rb+') as f:
+                        f.truncate(size - size % self.dtype.itemsize)
+
+    def write(self, text):
+        """
+        Same as file.write, only complete lines are written to disk
+
+        :param text:    one or several csv lines
+        :return: number of characters buffered
+        """
+        self.pending += text
+        if '\n' in self.pending:
+            lines, self.pending = self.pending.rsplit('\n', 1)
+            self.rows.extend(lines.split('\n'))
+            if self.autoflush:
+                self.flush()
+        return len(text)
+
+    def flush(self):
+        """
+        Write the buffered rows to the csv file and to the sidecar and sync both to disk
+        """
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        os.write(self.fd, ''.join(row + '\n' for row in rows).encode())
+        os.fsync(self.fd)
+        if self.sidecar_path is not None:
+            self.write_sidecar(rows)
+
+    def write_sidecar(self, rows):
+        records = []
+        for row in rows:
+            fields = [field.strip() for field in next(csv.reader([row]))]
+            if self.columns is None:
+                self.columns = fields
+                continue
+            if fields == self.columns:
+                continue
+            if fields and 'STEP' in fields and len(fields) != len(self.columns):
+                # Another test layout appended to the same summary, the sidecar only keeps the first one
+                self.sidecar_path = None
+                return
+            if len(fields) != len(self.columns):
+                continue
+            if self.dtype is None:
+                self.set_sidecar_dtype(fields)
+            records.append(tuple(self.convert(name, field) for name, field in zip(self.columns, fields)))
+
+        if records:
+            if self.sidecar_fd is None:
+                self.sidecar_fd = os.open(self.sidecar_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self.sidecar_fd, np.array(records, dtype=self.dtype).tobytes())
+            os.fsync(self.sidecar_fd)
+
+    def set_sidecar_dtype(self, fields):
+        """
+        Column types are taken from the first row: numbers (or None) are stored as float64 and the other
+        columns as fixed size strings
+        """
+        descr = []
+        for name, field in zip(self.columns, fields):
+            if name in self.TEXT_COLUMNS or not self.is_number(field):
+                descr.append((name, 'S%d' % self.TEXT_SIZE))
+            else:
+                descr.append((name, '<f8'))
+        self.dtype = np.dtype(descr)
+        with open(self.sidecar_header_path, 'w') as f:
+            json.dump({'columns': self.columns, 'descr': descr}, f)
+
+    @staticmethod
+    def is_number(field):
+        if field in ('', 'None', 'nan'):
+            return True
+        try:
+            float(field)
+            return True
+        except ValueError:
+            return False
+
+    def convert(self, name, field):
+        if self.dtype[name].kind == 'S':
+            return field.encode()[:self.TEXT_SIZE]
+        try:
+            return float(field)
+        except ValueError:
+            return np.nan
+
+    def close(self):
+        if self.pending:
+            self.rows.append(self.pending)
+            self.pending = ''
+        self.flush()
+        os.close(self.fd)
+        if self.sidecar_fd is not None:
+            os.close(self.sidecar_fd)
+            self.sidecar_fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def read_result_summary_sidecar(path):
+    """
+    Open the binary sidecar of a result summary without parsing the csv
+
+    :param path:    path of result_summary.csv (or of its .bin sidecar)
+    :return: read-only NumPy structured array (memmap) with one record per row
+    """
+    base = os.path.splitext(path)[0]
+    with open(base + '.json') as f:
+        header = json.load(f)
+    dtype = np.dtype([tuple(descr) for descr in header['descr']])
+    size = os.path.getsize(base + '.bin') if os.path.exists(base + '.bin') else 0
+    if size < dtype.itemsize:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(base + '.bin', dtype=dtype, mode='r', shape=(size // dtype.itemsize,))
+
+
+class TrValues(object):
+    """
+    Values measured and calculated at each Tr of a step. Numeric values are stored in one array indexed by
+    [measurement, Tr iteration, field] and the pass/fail verdicts in an array indexed by
+    [measurement, Tr iteration]. The string keys of the previous tr_value dictionary (e.g. 'Q_TR_2_MIN',
+    'TR_90_%_PF', 'timestamp_1') are still accepted with tr_value[key].
+    """
+    MEAS = 0
+    TARG = 1
+    MIN = 2
+    MAX = 3
+    FIELDS = ('MEAS', 'TARG', 'MIN', 'MAX')
+    KEY_PATTERN = re.compile(r'^(?P<meas>[A-Z]+)_TR_(?:TARG_(?P<targ_iter>\d+)|(?P<iter>\d+)(?:_(?P<field>MIN|MAX|PF))?)$')
+
+    __slots__ = ('meas_values', 'index', 'n_iter', 'values', 'verdicts', 'timestamps', 'first_iter', 'last_iter',
+                 'tr_90_pf', 'extra')
+
+    def __init__(self, meas_values, n_tr=2):
+        self.meas_values = []
+        self.index = {}
+        self.n_iter = None
+        self.values = np.empty((0, 0, len(self.FIELDS)))
+        self.verdicts = np.empty((0, 0), dtype=object)
+        self.reset(n_tr=n_tr)
+        for meas_value in meas_values:
+            self.add_measurement(meas_value)
+
+    def reset(self, n_tr=2):
+        """
+        Clear the values before a new step. The arrays are reused when the number of Tr does not change.
+
+        :param n_tr:    number of Tr of the step, iterations 0 to n_tr + 1 are stored
+        :return: nothing
+        """
+        n_iter = n_tr + 2
+        if n_iter != self.n_iter:
+            self.n_iter = n_iter
+            self.values = np.empty((len(self.meas_values), n_iter, len(self.FIELDS)))
+            self.verdicts = np.empty((len(self.meas_values), n_iter), dtype=object)
+        self.values.fill(np.nan)
+        self.verdicts.fill(None)
+        self.timestamps = [None] * n_iter
+        self.first_iter = None
+        self.last_iter = None
+        self.tr_90_pf = None
+        self.extra = {}
+
+    def add_measurement(self, meas_value):
+        if meas_value not in self.index:
+            self.index[meas_value] = len(self.meas_values)
+            self.meas_values.append(meas_value)
+            self.values = np.concatenate((self.values, np.full((1, self.n_iter, len(self.FIELDS)), np.nan)))
+            self.verdicts = np.concatenate((self.verdicts, np.full((1, self.n_iter), None, dtype=object)))
+        return self.index[meas_value]
+
+    def set(self, meas_value, tr_iter, field, value):
+        """
+        Store a numeric value
+
+        :param meas_value:  measurement (e.g. 'Q')
+        :param tr_iter:     Tr iteration
+        :param field:       TrValues.MEAS, TrValues.TARG, TrValues.MIN or TrValues.MAX
+        :param value:       value, None is stored as NaN
+        """
+        i = self.index.get(meas_value)
+        if i is None:
+            i = self.add_measurement(meas_value)
+        self.values[i, tr_iter, field] = np.nan if value is None else value
+
+    def get(self, meas_value, tr_iter, field):
+        """
+        Numeric value, None when it was not recorded
+        """
+        i = self.index.get(meas_value)
+        if i is None or tr_iter >= self.n_iter:
+            return None
+        value = self.values[i, tr_iter, field]
+        return None if np.isnan(value) else float(value)
+
+    def set_verdict(self, meas_value, tr_iter, verdict):
+        i = self.index.get(meas_value)
+        if i is None:
+            i = self.add_measurement(meas_value)
+        self.verdicts[i, tr_iter] = verdict
+
+    def get_verdict(self, meas_value, tr_iter):
+        i = self.index.get(meas_value)
+        if i is None or tr_iter >= self.n_iter:
+            return None
+        return self.verdicts[i, tr_iter]
+
+    def as_array(self):
+        """
+        Copy of the numeric values, shape (measurements, Tr iterations, fields)
+        """
+        return self.values.copy()
+
+    def copy(self):
+        tr_value = TrValues(self.meas_values, n_tr=self.n_iter - 2)
+        tr_value.values[...] = self.values
+        tr_value.verdicts[...] = self.verdicts
+        tr_value.timestamps = list(self.timestamps)
+        tr_value.first_iter = self.first_iter
+        tr_value.last_iter = self.last_iter
+        tr_value.tr_90_pf = self.tr_90_pf
+        tr_value.extra = dict(self.extra)
+        return tr_value
+
+    """
+    Access with the string keys of the previous tr_value dictionary
+    """
+
+    def __getitem__(self, key):
+        if key == 'FIRST_ITER':
+            return self.first_iter
+        elif key == 'LAST_ITER':
+            return self.last_iter
+        elif key == 'TR_90_%_PF':
+            return self.tr_90_pf
+        elif key.startswith('timestamp_'):
+            return self.timestamps[int(key[len('timestamp_'):])]
+        match = self.KEY_PATTERN.match(key)
+        if match is None:
+            return self.extra[key]
+        if match.group('targ_iter') is not None:
+            return self.get(match.group('meas'), int(match.group('targ_iter')), self.TARG)
+        tr_iter = int(match.group('iter'))
+        field = match.group('field')
+        if field == 'PF':
+            return self.get_verdict(match.group('meas'), tr_iter)
+        return self.get(match.group('meas'), tr_iter, self.MEAS if field is None else getattr(self, field))
+
+    def __setitem__(self, key, value):
+        if key == 'FIRST_ITER':
+            self.first_iter = value
+        elif key == 'LAST_ITER':
+            self.last_iter = value
+        elif key == 'TR_90_%_PF':
+            self.tr_90_pf = value
+        elif key.startswith('timestamp_'):
+            self.timestamps[int(key[len('timestamp_'):])] = value
+        else:
+            match = self.KEY_PATTERN.match(key)
+            if match is None:
+                self.extra[key] = value
+            elif match.group('targ_iter') is not None:
+                self.set(match.group('meas'), int(match.group('targ_iter')), self.TARG, value)
+            elif match.group('field') == 'PF':
+                self.set_verdict(match.group('meas'), int(match.group('iter')), value)
+            else:
+                field = match.group('field')
+                self.set(match.group('meas'), int(match.group('iter')),
+                         self.MEAS if field is None else getattr(self, field), value)
+
+    def items(self):
+        """
+        Recorded values with the string keys of the previous tr_value dictionary
+        """
+        items = []
+        for meas_value, i in self.index.items():
+            for tr_iter in range(self.n_iter):
+                for field, name in ((self.MEAS, '%s_TR_%s'), (self.TARG, '%s_TR_TARG_%s'),
+                                    (self.MIN, '%s_TR_%s_MIN'), (self.MAX, '%s_TR_%s_MAX')):
+                    if not np.isnan(self.values[i, tr_iter, field]):
+                        items.append((name % (meas_value, tr_iter), float(self.values[i, tr_iter, field])))
+                if self.verdicts[i, tr_iter] is not None:
+                    items.append(('%s_TR_%s_PF' % (meas_value, tr_iter), self.verdicts[i, tr_iter]))
+        for tr_iter, timestamp in enumerate(self.timestamps):
+            if timestamp is not None:
+                items.append((f'timestamp_{tr_iter}', timestamp))
+        items += [('FIRST_ITER', self.first_iter), ('LAST_ITER', self.last_iter), ('TR_90_%_PF', self.tr_90_pf)]
+        return items + list(self.extra.items())
+
+    def __repr__(self):
+        return 'TrValues(%s)' % dict(self.items())
+
+
+def stack_tr_values(tr_values):
+    """
+    Stack the values of several steps for analysis
+
+    :param tr_values:   list of TrValues with the same measurements and number of Tr
+    :return: array of shape (steps, measurements, Tr iterations, fields)
+    """
+    return np.stack([tr_value.values for tr_value in tr_values])
+
+
 class DataLogging:
     # def __init__(self, meas_values, x_criteria, y_criteria):
     def __init__(self):
+        params = parameter_snapshot(self.ts)
         self.type_meas = {'V': 'AC_VRMS', 'I': 'AC_IRMS', 'P': 'AC_P', 'Q': 'AC_Q', 'VA': 'AC_S',
                           'F': 'AC_FREQ', 'PF': 'AC_PF'}
         # Values to be recorded
@@ -258,17 +888,59 @@ class DataLogging:
         # self.y_criteria = y_criteria
         self.rslt_sum_col_name = ''
         self.sc_points = {}
+        self.set_channel_map()
         # self._config()
         self.set_sc_points()
         self.set_result_summary_name()
         self.tr = None
         self.n_tr = None
         self.initial_value = {}
-        self.tr_value = collections.OrderedDict()
+        self.tr_value = TrValues(self.meas_values)
         self.current_step_label = None
+        self.capture_mode = SLEEP_CAPTURE
+        self.capture_period = 0.05
+        self.capture_buffer = collections.deque(maxlen=4096)
+        self.set_capture_mode(mode=params.param_value('p1547.capture_mode'),
+                              sample_period=params.param_value('p1547.capture_period'))
+        self.adaptive_dwell = None
+        self.step_timing = {}
+        if params.param_value('p1547.adaptive_ss') == 'Enabled':
+            self.set_adaptive_steady_state(dwell=params.param_value('p1547.adaptive_ss_dwell') or 5.0)
 
     # def __config__(self):
 
+    def set_capture_mode(self, mode=None, sample_period=None):
+        """
+        Select how record_timeresponse gets the Tr values
+
+        :param mode:            SLEEP_CAPTURE sleeps until each Tr boundary and takes one sample,
+                                STREAMING_CAPTURE samples continuously and interpolates at the Tr boundaries
+        :param sample_period:   time between two DAQ samples in streaming mode (s)
+        :return: nothing
+        """
+        if mode is not None:
+            if mode not in (SLEEP_CAPTURE, STREAMING_CAPTURE):
+                raise p1547Error(f'Unknown time response capture mode: {mode}')
+            self.capture_mode = mode
+        if sample_period is not None:
+            self.capture_period = float(sample_period)
+        self.ts.log_debug(f'P1547 Time response capture mode has been set to {self.capture_mode}')
+
+    def set_adaptive_steady_state(self, dwell=None):
+        """
+        Enable or disable the adaptive steady state. In streaming mode, once Tr_1 is captured the last Tr evaluation
+        point is declared as soon as all the Y values have stayed within their pass/fail envelope for the dwell
+        time. The standard and adaptive step durations are added to the result summary.
+
+        :param dwell:   time (s) the Y values must stay within the envelope, None disables the adaptive mode
+        :return: nothing
+        """
+        self.adaptive_dwell = None if dwell is None else float(dwell)
+        if self.adaptive_dwell is not None and self.capture_mode != STREAMING_CAPTURE:
+            self.ts.log_warning('P1547 Adaptive steady state is only used with the streaming capture mode')
+        self.set_result_summary_name()
+        self.ts.log_debug(f'P1547 Adaptive steady state dwell has been set to {self.adaptive_dwell}')
+
     def reset_time_settings(self, tr, number_tr=2):
         self.tr = tr
         self.ts.log_debug(f'P1547 Time response has been set to {self.tr} seconds')
@@ -334,6 +1006,9 @@ class DataLogging:
 
         row_data.append('STEP')
         row_data.append('FILENAME')
+        if getattr(self, 'adaptive_dwell', None) is not None:
+            row_data.append('STANDARD_TIME')
+            row_data.append('ADAPTIVE_TIME')
 
         self.rslt_sum_col_name = ','.join(row_data) + '\n'
         self.ts.log_debug(f'summary column={self.rslt_sum_col_name}'.rstrip())
@@ -394,6 +1069,37 @@ class DataLogging:
         """
         return self.sc_points
 
+    def set_channel_map(self):
+        """
+        Precompute the DAQ channels of every measurement type for the number of phases of the EUT. The channels summed
+        in the totals are kept in one list (frequency only uses the first phase) so the totals of all the measurement
+        types are computed from one array read with a single np.add.reduceat per sample.
+
+        :return: nothing
+        """
+        nb_phases = {'single phase': 1, 'split phase': 2, 'three phase': 3}.get(str(self.phases).lower())
+        self.channel_map = None
+        self.channel_labels = []
+        self.channel_slices = {}
+        if nb_phases is None:
+            return
+        self.channel_map = OrderedDict()
+        starts = []
+        scales = []
+        for type_meas, meas_root in self.type_meas.items():
+            labels = ['%s_%s' % (meas_root, phase) for phase in range(1, nb_phases + 1)]
+            self.channel_map[type_meas] = labels
+            # No need to do data average for frequency, V is the average of the phases, the others are summed
+            summed = labels[:1] if type_meas == 'F' else labels
+            start = len(self.channel_labels)
+            self.channel_labels += summed
+            self.channel_slices[type_meas] = slice(start, len(self.channel_labels))
+            starts.append(start)
+            scales.append(1. / len(summed) if type_meas == 'V' else 1.)
+        self.channel_starts = np.array(starts)
+        self.channel_scales = np.array(scales)
+        self.channel_index = {type_meas: i for i, type_meas in enumerate(self.channel_map)}
+
     def get_measurement_label(self, type_meas):
         """
         Returns the measurement label for a measurement type
@@ -401,6 +1107,8 @@ class DataLogging:
         :param type_meas:   (str) Either V, P, PF, I, F, VA, or Q
         :return:            (list of str) List of labeled measurements, e.g., ['AC_VRMS_1', 'AC_VRMS_2', 'AC_VRMS_3']
         """
+        if getattr(self, 'channel_map', None) is not None:
+            return list(self.channel_map[type_meas])
         meas_root = self.type_meas[type_meas]
         if self.phases.lower() == 'single phase':
             meas_label = [meas_root + '_1']
@@ -411,60 +1119,83 @@ class DataLogging:
 
         return meas_label
 
-    def get_measurement_total(self, type_meas, log=False):
+    def get_measurement_total(self, type_meas, log=False, data=None):
         """
         Sum or average the EUT values from all phases
 
-        :param data:        dataset from data acquisition object
         :param type_meas:   Either V,P or Q
         :param log:         Boolean variable to disable or enable logging
+        :param data:        dataset from data acquisition object, defaults to the last sample read (self.data)
         :return: Any measurements from the DAQ
         """
-        value = None
-        nb_phases = None
-        self.ts.log_debug(self.data.get(self.get_measurement_label(type_meas)[0]))
-        try:
-            if self.phases == 'Single phase':
-                value = self.data.get(self.get_measurement_label(type_meas)[0])
-                if log:
-                    self.ts.log_debug('        %s are: %s'
-                                      % (self.get_measurement_label(type_meas), value))
-                nb_phases = 1
-
-            elif self.phases == 'Split phase':
-                value1 = self.data.get(self.get_measurement_label(type_meas)[0])
-                value2 = self.data.get(self.get_measurement_label(type_meas)[1])
-                if log:
-                    self.ts.log_debug('        %s are: %s, %s'
-                                      % (self.get_measurement_label(type_meas), value1, value2))
-                value = value1 + value2
-                nb_phases = 2
-
-            elif self.phases == 'Three phase':
-                # self.ts.log_debug(f'type_meas={type_meas}')
-                value1 = self.data.get(self.get_measurement_label(type_meas)[0])
-                value2 = self.data.get(self.get_measurement_label(type_meas)[1])
-                value3 = self.data.get(self.get_measurement_label(type_meas)[2])
-                if log:
-                    self.ts.log_debug('        %s are: %s, %s, %s'
-                                      % (self.get_measurement_label(type_meas), value1, value2, value3))
-                value = value1 + value2 + value3
-                nb_phases = 3
-            # TODO : imbalance_resp should change the way you acquire the data
-            if type_meas == 'V':
-                # average value of V
-                value = value / nb_phases
-            elif type_meas == 'F':
-                # No need to do data average for frequency
-                value = self.data.get(self.get_measurement_label(type_meas)[0])
-            return round(value, 3)
+        if data is None:
+            data = self.data
+        log_meas = library_log(self.ts, 'measurement')
+        if self.channel_map is None:
+            self.ts.log_error('Inverter phase parameter not set correctly.')
+            self.ts.log_error('phases=%s' % self.phases)
+            return None
+        labels = self.channel_labels[self.channel_slices[type_meas]]
+        values = np.array([data.get(label) for label in labels], dtype=float)
+        log_meas.debug(lambda: values[0])
+        if log:
+            log_meas.debug('        %s are: %s', self.channel_map[type_meas], ', '.join(str(v) for v in values))
+        value = values.sum()
+        if type_meas == 'V':
+            # average value of V
+            value = value / len(values)
+        if np.isnan(value):
+            self.ts.log_error('Inverter phase parameter not set correctly.')
+            self.ts.log_error('phases=%s' % self.phases)
+            return None
+        return round(float(value), 3)
 
-        except Exception as e:
+    def get_measurement_totals(self, data=None, types=None):
+        """
+        Same as get_measurement_total for several measurement types, computed from one read of the channels of the
+        sample
+
+        :param data:        dataset from data acquisition object, defaults to the last sample read (self.data)
+        :param types:       measurement types, defaults to all of them
+        :return: OrderedDict with the total of each measurement type (None if a channel is missing)
+        """
+        if data is None:
+            data = self.data
+        if types is None:
+            types = list(self.type_meas)
+        if self.channel_map is None:
+            self.ts.log_error('Inverter phase parameter not set correctly.')
+            self.ts.log_error('phases=%s' % self.phases)
+            return OrderedDict((type_meas, None) for type_meas in types)
+        values = np.array([data.get(label) for label in self.channel_labels], dtype=float)
+        totals = np.round(np.add.reduceat(values, self.channel_starts) * self.channel_scales, 3)
+        result = OrderedDict()
+        for type_meas in types:
+            value = totals[self.channel_index[type_meas]]
+            result[type_meas] = None if np.isnan(value) else float(value)
+        if None in result.values():
             self.ts.log_error('Inverter phase parameter not set correctly.')
             self.ts.log_error('phases=%s' % self.phases)
-            #raise p1547Error('Error in get_measurement_total() : %s' % (str(e)))
+        return result
+
+    def get_dataset_measurement_total(self, dataset, type_meas):
+        """
+        Same as get_measurement_total but for every row of a saved dataset
+
+        :param dataset:     DataFrame read from a dataset csv file
+        :param type_meas:   Either V, P, Q, F or PF
+        :return: array with one total per row
+        """
+        labels = self.get_measurement_label(type_meas)
+        values = dataset[labels].to_numpy(dtype=float)
+        if type_meas == 'F':
+            total = values[:, 0]
+        elif type_meas == 'V':
+            total = values.sum(axis=1) / len(labels)
+        else:
+            total = values.sum(axis=1)
+        return np.round(total, 3)
 
-       
 
     def get_rslt_sum_col_name(self):
         """
@@ -487,32 +1218,36 @@ class DataLogging:
 
         xs = self.x_criteria
         ys = list(self.y_criteria.keys())
-        first_iter = self.tr_value['FIRST_ITER']
-        last_iter = self.tr_value['LAST_ITER']
+        tr_value = self.tr_value
+        first_iter = tr_value.first_iter
+        last_iter = tr_value.last_iter
         row_data = []
 
         # Time response criteria will take last placed value of Y variables
         if self.criteria_mode[0]:
-            row_data.append(str(self.tr_value['TR_90_%_PF']))
+            row_data.append(str(tr_value.tr_90_pf))
         if self.criteria_mode[1]:
-            row_data.append(str(self.tr_value['%s_TR_%s_PF' % (ys[-1], first_iter)]))
+            row_data.append(str(tr_value.get_verdict(ys[-1], first_iter)))
         if self.criteria_mode[2]:
-            row_data.append(str(self.tr_value['%s_TR_%s_PF' % (ys[-1], last_iter)]))
+            row_data.append(str(tr_value.get_verdict(ys[-1], last_iter)))
 
         # Default measured values are V, P and Q (F can be added) refer to set_meas_variable function
         for meas_value in self.meas_values:
-            row_data.append(str(self.tr_value['%s_TR_%d' % (meas_value, last_iter)]))
+            row_data.append(str(tr_value.get(meas_value, last_iter, TrValues.MEAS)))
             # Variables needed for variations
             if meas_value in xs:
-                row_data.append(str(self.tr_value['%s_TR_TARG_%d' % (meas_value, last_iter)]))
+                row_data.append(str(tr_value.get(meas_value, last_iter, TrValues.TARG)))
             # Variables needed for criteria verifications with min max passfail
             if meas_value in ys:
-                row_data.append(str(self.tr_value['%s_TR_TARG_%s' % (meas_value, last_iter)]))
-                row_data.append(str(self.tr_value['%s_TR_%s_MIN' % (meas_value, last_iter)]))
-                row_data.append(str(self.tr_value['%s_TR_%s_MAX' % (meas_value, last_iter)]))
+                row_data.append(str(tr_value.get(meas_value, last_iter, TrValues.TARG)))
+                row_data.append(str(tr_value.get(meas_value, last_iter, TrValues.MIN)))
+                row_data.append(str(tr_value.get(meas_value, last_iter, TrValues.MAX)))
 
         row_data.append(self.current_step_label)
         row_data.append(str(self.filename))
+        if self.adaptive_dwell is not None:
+            row_data.append(str(self.step_timing.get('standard')))
+            row_data.append(str(self.step_timing.get('adaptive')))
         # self.ts.log_debug(f'rowdata={row_data}')
         row_data_str = ','.join(row_data) + '\n'
 
@@ -535,23 +1270,24 @@ class DataLogging:
         self.current_step_label = step_label
         daq.data_sample()
         self.data = daq.data_capture_read()
+        self.initial_value['daq_time'] = self.get_sample_time(self.data)
+        self.capture_buffer.clear()
         daq.sc['event'] = self.current_step_label
+        totals = self.get_measurement_totals(types=self.meas_values)
         if isinstance(self.x_criteria, list):
             for xs in self.x_criteria:
-                self.initial_value[xs] = {'x_value': self.get_measurement_total(type_meas=xs, log=False)}
+                self.initial_value[xs] = {'x_value': totals[xs]}
                 daq.sc['%s_MEAS' % xs] = self.initial_value[xs]['x_value']
         else:
-            self.initial_value[self.x_criteria] = {
-                'x_value': self.get_measurement_total(type_meas=self.x_criteria, log=False)}
+            self.initial_value[self.x_criteria] = {'x_value': totals[self.x_criteria]}
             daq.sc['%s_MEAS' % self.x_criteria] = self.initial_value[self.x_criteria]['x_value']
 
         if isinstance(self.y_criteria, dict):
             for ys in list(self.y_criteria.keys()):
-                self.initial_value[ys] = {'y_value': self.get_measurement_total(type_meas=ys, log=False)}
+                self.initial_value[ys] = {'y_value': totals[ys]}
                 daq.sc['%s_MEAS' % ys] = self.initial_value[ys]["y_value"]
         else:
-            self.initial_value[self.y_criteria] = {
-                'y_value': self.get_measurement_total(type_meas=self.y_criteria, log=False)}
+            self.initial_value[self.y_criteria] = {'y_value': totals[self.y_criteria]}
             daq.sc['%s_MEAS' % self.y_criteria] = self.initial_value[self.y_criteria]['y_value']
 
         """
@@ -562,7 +1298,7 @@ class DataLogging:
         """
         daq.data_sample()
 
-    def record_timeresponse(self, daq):
+    def record_timeresponse(self, daq, step_dict=None):
         """
         Get the data from a specific time response (tr) corresponding to x and y values returns a dictionary
         but also writes in the soft channels of the DAQ system
@@ -573,27 +1309,27 @@ class DataLogging:
         :param x_target:        The target value of X value (e.g. FW -> f_step)
         :param y_target:        The target value of Y value (e.g. LAP -> act_pwrs_limits)
         :param n_tr:            The number of time responses used to validate the response and steady state values
+        :param step_dict:       step values of the current step, needed by the adaptive steady state
 
         :return: returns a dictionary with the timestamp, event and total EUT reactive power
         """
 
-        x = self.x_criteria
-        y = list(self.y_criteria.keys())
         # self.tr = tr
+        self.tr_value.reset(n_tr=self.n_tr)
+        # a step without step values must not reuse the ones of the previous step
+        self.step_dict = step_dict
+        self.step_timing = {'standard': self.tr * (self.n_tr + 1), 'adaptive': self.tr * (self.n_tr + 1)}
 
         first_tr = self.initial_value['timestamp'] + timedelta(seconds=self.tr)
         tr_list = [first_tr]
 
         for i in range(self.n_tr):
             tr_list.append(tr_list[i] + timedelta(seconds=self.tr))
-            for meas_value in self.meas_values:
-                self.tr_value['%s_TR_%s' % (meas_value, i)] = None
-                if meas_value in x:
-                    self.tr_value['%s_TR_TARG_%s' % (meas_value, i)] = None
-                elif meas_value in y:
-                    self.tr_value['%s_TR_TARG_%s' % (meas_value, i)] = None
-                    self.tr_value['%s_TR_%s_MIN' % (meas_value, i)] = None
-                    self.tr_value['%s_TR_%s_MAX' % (meas_value, i)] = None
+
+        if self.capture_mode == STREAMING_CAPTURE:
+            self.stream_timeresponse(daq=daq)
+            return self.tr_value
+
         tr_iter = 1
 
         for tr_ in tr_list:
@@ -612,30 +1348,266 @@ class DataLogging:
             # store the daq.sc['Y_TARGET'], daq.sc['Y_TARGET_MIN'], and daq.sc['Y_TARGET_MAX'] in tr_value
             for meas_value in self.meas_values:
                 try:
-                    self.tr_value['%s_TR_%s' % (meas_value, tr_iter)] = daq.sc['%s_MEAS' % meas_value]
+                    self.tr_value.set(meas_value, tr_iter, TrValues.MEAS, daq.sc['%s_MEAS' % meas_value])
 
-                    self.ts.log('Value %s: %s' % (meas_value, daq.sc['%s_MEAS' % meas_value]))
+                    library_log(self.ts, 'capture').info('Value %s: %s', meas_value, daq.sc['%s_MEAS' % meas_value])
 
                 except Exception as e:
                     self.ts.log_error('Test script exception: %s' % traceback.format_exc())
                     self.ts.log_debug('Measured value (%s) not recorded: %s' % (meas_value, e))
 
             # self.tr_value[tr_iter]["timestamp"] = tr_
-            self.tr_value[f'timestamp_{tr_iter}'] = tr_
-            self.tr_value['LAST_ITER'] = tr_iter - 1
+            self.tr_value.timestamps[tr_iter] = tr_
+            self.tr_value.last_iter = tr_iter - 1
             tr_iter = tr_iter + 1
 
-        self.tr_value['FIRST_ITER'] = 1
+        self.tr_value.first_iter = 1
 
         return self.tr_value
 
         # except Exception as e:
         #    raise p1547Error('Error in get_tr_data(): %s' % (str(e)))
 
+    def get_sample_time(self, data):
+        """
+        Timestamp of a DAQ sample. The DAQ 'TIME' channel is used when available, otherwise the
+        monotonic clock of the test station.
+
+        :param data:    dictionary returned by daq.data_capture_read()
+        :return: time in seconds
+        """
+        if data is not None and data.get('TIME') is not None:
+            return float(data.get('TIME'))
+        return time.monotonic()
+
+    def stream_timeresponse(self, daq):
+        """
+        Streaming version of record_timeresponse. The DAQ is sampled continuously, every sample is
+        stored in a ring buffer keyed by its timestamp and the values at each Tr boundary are linearly
+        interpolated between the two samples that bracket it. The step closes as soon as the last
+        boundary is covered by the buffer.
+
+        :param daq:             data acquisition object from svpelab library
+        :return: nothing, self.tr_value is updated
+        """
+        t0 = self.initial_value.get('daq_time')
+        if t0 is None:
+            t0 = self.get_sample_time(None)
+        boundaries = [t0 + self.tr * (i + 1) for i in range(self.n_tr + 1)]
+        # Guard against a DAQ clock that stops advancing (e.g. simulation stopped)
+        deadline = time.monotonic() + 2.0 * (boundaries[-1] - t0) + 10.0
+        self.ts.log('Streaming DAQ samples for %s seconds to get the Tr data for analysis...' %
+                    (boundaries[-1] - t0))
+
+        adaptive = self.adaptive_dwell is not None and self.n_tr >= 2
+        if adaptive and getattr(self, 'step_dict', None) is None:
+            self.ts.log_debug('Adaptive steady state skipped, the step values are not known before the evaluation')
+            adaptive = False
+        inside_since = None
+
+        tr_iter = 1
+        while tr_iter <= len(boundaries):
+            daq.data_sample()
+            data = daq.data_capture_read()
+            sample_time = self.get_sample_time(data)
+            totals = self.get_measurement_totals(data=data, types=self.meas_values)
+            self.capture_buffer.append((sample_time, [np.nan if value is None else value for value in totals.values()]))
+
+            while tr_iter <= len(boundaries) and sample_time >= boundaries[tr_iter - 1]:
+                self.store_tr_sample(daq=daq, tr_iter=tr_iter, t=boundaries[tr_iter - 1], elapsed=self.tr * tr_iter)
+                tr_iter += 1
+
+            if adaptive and tr_iter <= len(boundaries):
+                try:
+                    inside = self.within_envelope(data)
+                except Exception as e:
+                    self.ts.log_debug('Adaptive steady state disabled for this step: %s' % e)
+                    adaptive = False
+                    inside = False
+                # the dwell only starts once the first Tr has elapsed
+                if not inside or tr_iter == 1:
+                    inside_since = None
+                elif inside_since is None:
+                    inside_since = sample_time
+                if inside_since is not None and sample_time - inside_since >= self.adaptive_dwell:
+                    # the remaining Tr (including the last evaluated one) take the steady-state sample
+                    while tr_iter <= len(boundaries):
+                        self.store_tr_sample(daq=daq, tr_iter=tr_iter, t=sample_time, elapsed=sample_time - t0)
+                        tr_iter += 1
+                    self.step_timing['adaptive'] = round(sample_time - t0, 3)
+                    self.ts.log('Steady state reached after %0.1f s instead of %0.1f s' %
+                                (self.step_timing['adaptive'], self.step_timing['standard']))
+
+            if tr_iter <= len(boundaries):
+                if time.monotonic() > deadline:
+                    raise p1547Error('DAQ timestamps stopped advancing before Tr_%s was captured' % tr_iter)
+                self.ts.sleep(self.capture_period)
+
+        self.data = data
+        self.tr_value.first_iter = 1
+
+    def within_envelope(self, data):
+        """
+        Check if all the Y values of a sample are within the pass/fail envelope of the current step
+
+        :param data:    dictionary returned by daq.data_capture_read()
+        :return: True if all the Y values are within [target_min, target_max]
+        """
+        self.data = data
+        for y, function in self.y_criteria.items():
+            y_meas = self.get_measurement_total(type_meas=y, log=False, data=data)
+            target_min, target_max = self.calculate_min_max_values(function=function)
+            if y_meas is None or not target_min <= y_meas <= target_max:
+                return False
+        return True
+
+    def store_tr_sample(self, daq, tr_iter, t, elapsed):
+        """
+        Interpolate the buffered samples at a Tr boundary and store the result in tr_value and in the
+        DAQ soft channels
+
+        :param daq:         data acquisition object from svpelab library
+        :param tr_iter:     Tr iteration number (1 to n_tr + 1)
+        :param t:           time of the Tr boundary in the time base of the samples (s)
+        :param elapsed:     time of the Tr boundary since the beginning of the step (s)
+        :return: nothing
+        """
+        daq.sc['EVENT'] = "{0}_TR_{1}".format(self.current_step_label, tr_iter)
+        times = np.array([sample[0] for sample in self.capture_buffer])
+        values = np.array([sample[1] for sample in self.capture_buffer], dtype=float)
+        for i, meas_value in enumerate(self.meas_values):
+            value = float(np.interp(t, times, values[:, i]))
+            value = None if math.isnan(value) else round(value, 3)
+            daq.sc['%s_MEAS' % meas_value] = value
+            self.tr_value.set(meas_value, tr_iter, TrValues.MEAS, value)
+            library_log(self.ts, 'capture').info('Value %s: %s', meas_value, value)
+
+        self.tr_value.timestamps[tr_iter] = self.initial_value['timestamp'] + timedelta(seconds=elapsed)
+        self.tr_value.last_iter = tr_iter - 1
+
+
+"""
+Section for the characteristic curves
+"""
+
+
+class PiecewiseLinearCurve(object):
+    """
+    Immutable piecewise-linear characteristic (VV, VW and WV). Y is interpolated from the curve points and then
+    scaled by the power level. Scalar inputs return a float, array inputs return an array.
+    """
+    __slots__ = ('x', 'y', 'scale')
+
+    def __init__(self, x, y, scale=1.0):
+        """
+        :param x:       X values of the curve points
+        :param y:       Y values of the curve points
+        :param scale:   multiplier applied to the interpolated Y (power level in p.u.)
+        """
+        x = np.array(x, dtype=float)
+        y = np.array(y, dtype=float)
+        x.setflags(write=False)
+        y.setflags(write=False)
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
+        object.__setattr__(self, 'scale', scale)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is immutable' % type(self).__name__)
+
+    def __call__(self, value):
+        y_value = np.interp(value, self.x, self.y) * self.scale
+        if np.ndim(y_value) == 0:
+            return float(y_value)
+        return y_value
+
+    def __repr__(self):
+        return '%s(x=%s, y=%s, scale=%s)' % (type(self).__name__, self.x.tolist(), self.y.tolist(), self.scale)
+
+
+class FrequencyWattCurve(PiecewiseLinearCurve):
+    """
+    Immutable frequency-droop characteristic (FW). The active power is held in the deadband, follows the droop
+    outside of it and is limited to p_min (over-frequency) and p_rated (under-frequency).
+    """
+    __slots__ = ('f_nom', 'dbf', 'kof', 'p_rated', 'p_min', 'pwr')
+
+    def __init__(self, f_nom, dbf, kof, p_rated, p_min, pwr=1.0):
+        """
+        :param f_nom:       nominal frequency (Hz)
+        :param dbf:         deadband (Hz)
+        :param kof:         droop in p.u.
+        :param p_rated:     rated active power (W)
+        :param p_min:       minimum active power (W)
+        :param pwr:         power level in p.u.
+        """
+        p_db = p_rated * pwr
+        f_dob = f_nom + dbf
+        f_dub = f_nom - dbf
+        PiecewiseLinearCurve.__init__(self, [f_dub, f_dob], [p_db, p_db], scale=pwr)
+        for name, value in zip(FrequencyWattCurve.__slots__, (f_nom, dbf, kof, p_rated, p_min, pwr)):
+            object.__setattr__(self, name, value)
+
+    def __call__(self, value):
+        f = np.asarray(value, dtype=float)
+        f_dub, f_dob = self.x
+        p_db = self.p_rated * self.pwr
+        p_avl = self.p_rated * (1.0 - self.pwr)
+        p_over = np.maximum(p_db - ((f - f_dob) / (self.f_nom * self.kof)) * p_db, self.p_min)
+        p_under = np.minimum(((f_dub - f) / (self.f_nom * self.kof)) * p_avl + p_db, self.p_rated)
+        p_targ = np.where(f > f_dob, p_over, np.where(f < f_dub, p_under, p_db)) * self.scale
+        if np.ndim(p_targ) == 0:
+            return float(p_targ)
+        return p_targ
+
+    def __repr__(self):
+        return '%s(f_nom=%s, dbf=%s, kof=%s, p_rated=%s, p_min=%s, pwr=%s)' % (
+            type(self).__name__, self.f_nom, self.dbf, self.kof, self.p_rated, self.p_min, self.pwr)
+
 
 class CriteriaValidation:
     def __init__(self, criteria_mode):
         self.criteria_mode = criteria_mode
+        self.curve_cache = {}
+
+    def get_curve(self, function, curve=None, pwr=None):
+        """
+        Get the characteristic curve object of a function. The curves are built once per (function, curve, pwr)
+
+        :param function:    VV, VW, WV or FW
+        :param curve:       characteristic curve number, default is the current curve
+        :param pwr:         power level in p.u., default is the current power level. An array of power levels
+                            gives a curve that is not cached
+        :return: PiecewiseLinearCurve or FrequencyWattCurve object
+        """
+        if curve is None:
+            curve = self.curve
+        if pwr is None:
+            pwr = self.pwr
+        if np.ndim(pwr) == 0:
+            pwr = float(pwr)
+            key = (function, curve, pwr)
+            if key in self.curve_cache:
+                return self.curve_cache[key]
+
+        pairs = self.param[function][curve]
+        if function == VV:
+            curve_obj = PiecewiseLinearCurve([pairs['V1'], pairs['V2'], pairs['V3'], pairs['V4']],
+                                             [pairs['Q1'], pairs['Q2'], pairs['Q3'], pairs['Q4']], scale=pwr)
+        elif function == VW:
+            curve_obj = PiecewiseLinearCurve([pairs['V1'], pairs['V2']], [pairs['P1'], pairs['P2']], scale=pwr)
+        elif function == WV:
+            curve_obj = PiecewiseLinearCurve([pairs['P1'], pairs['P2'], pairs['P3']],
+                                             [pairs['Q1'], pairs['Q2'], pairs['Q3']], scale=pwr)
+        elif function == FW:
+            curve_obj = FrequencyWattCurve(self.f_nom, pairs['dbf'], pairs['kof'], self.p_rated, self.p_min, pwr=pwr)
+        else:
+            raise p1547Error(f'No characteristic curve for {function}')
+
+        if np.ndim(pwr) == 0:
+            self.curve_cache[key] = curve_obj
+            library_log(self.ts, 'criteria').debug('%s curve %s at %s p.u. = %s', function, curve, pwr, curve_obj)
+        return curve_obj
 
     def define_target(self, daq, step_dict=None, y_criterias_mod=None):
         """
@@ -660,25 +1632,30 @@ class CriteriaValidation:
 
         y = list(y_criteria.keys())
         # self.tr = tr
-        self.ts.log_debug(f'daq={daq.sc}')
+        log_criteria = library_log(self.ts, 'criteria')
+        log_criteria.debug('daq=%s', daq.sc)
         for tr_iter in range(self.n_tr + 1):
-            self.ts.log_debug(f'tr_iter={tr_iter}')
+            log_criteria.debug('tr_iter=%s', tr_iter)
             # store the daq.sc['Y_TARGET'], daq.sc['Y_TARGET_MIN'], and daq.sc['Y_TARGET_MAX'] in tr_value
             for meas_value in self.meas_values:
                 try:
                     if meas_value in x:
 
                         if (self.step_dict is not None) and (meas_value in list(self.step_dict.keys())):
-                            self.ts.log_debug(f'step_dict')
-                            daq.sc['%s_TARGET' % meas_value] = self.step_dict[meas_value]
-                            self.tr_value['%s_TR_TARG_%s' % (meas_value, tr_iter)] = self.step_dict[meas_value]
-                            self.ts.log_debug(f'tr_targ={self.tr_value["%s_TR_TARG_%s" % (meas_value, tr_iter)]}')
-                            self.ts.log('X Value (%s) = %s' % (meas_value, daq.sc['%s_MEAS' % meas_value]))
+                            log_criteria.debug('step_dict')
+                            x_target = self.step_dict[meas_value]
+                            if np.ndim(x_target) == 1:
+                                # per-phase targets (INDIVIDUAL_PHASES_VOLTAGES) are recorded as their average
+                                x_target = round(float(np.mean(x_target)), 2)
+                            daq.sc['%s_TARGET' % meas_value] = x_target
+                            self.tr_value.set(meas_value, tr_iter, TrValues.TARG, x_target)
+                            log_criteria.debug('tr_targ=%s', self.step_dict[meas_value])
+                            log_criteria.info('X Value (%s) = %s', meas_value, daq.sc['%s_MEAS' % meas_value])
 
                     elif meas_value in y:
                         if self.step_dict is not None:
                             # self.ts.log_debug(f'meas={meas_value} et step_dict={self.step_dict}')
-                            self.ts.log_debug(f'function={y_criteria[meas_value]}')
+                            log_criteria.debug('function=%s', y_criteria[meas_value])
 
                             daq.sc['%s_TARGET' % meas_value] = self.update_target_value(function=y_criteria[meas_value])
                             daq.sc['%s_TARGET_MIN' % meas_value], daq.sc['%s_TARGET_MAX' % meas_value] = \
@@ -690,14 +1667,14 @@ class CriteriaValidation:
                                                                                             meas_value])
                             daq.sc['%s_TARGET_MIN' % meas_value], daq.sc['%s_TARGET_MAX' % meas_value] = \
                                 self.calculate_min_max_values(function=y_criteria[meas_value], step_dict=step_dict)
-                        self.tr_value[f'{meas_value}_TR_TARG_{tr_iter}'] = daq.sc['%s_TARGET' % meas_value]
-                        self.tr_value[f'{meas_value}_TR_{tr_iter}_MIN'] = daq.sc['%s_TARGET_MIN' % meas_value]
-                        self.tr_value[f'{meas_value}_TR_{tr_iter}_MAX'] = daq.sc['%s_TARGET_MAX' % meas_value]
-                        self.ts.log_debug(f"{meas_value}_TR_TARG_{tr_iter}")
-                        self.ts.log_debug(f'tr_target={self.tr_value[f"{meas_value}_TR_TARG_{tr_iter}"]}')
-                        self.ts.log('Y Value (%s) = %s. Pass/fail bounds = [%s, %s]' %
-                                    (meas_value, daq.sc['%s_MEAS' % meas_value],
-                                     daq.sc['%s_TARGET_MIN' % meas_value], daq.sc['%s_TARGET_MAX' % meas_value]))
+                        self.tr_value.set(meas_value, tr_iter, TrValues.TARG, daq.sc['%s_TARGET' % meas_value])
+                        self.tr_value.set(meas_value, tr_iter, TrValues.MIN, daq.sc['%s_TARGET_MIN' % meas_value])
+                        self.tr_value.set(meas_value, tr_iter, TrValues.MAX, daq.sc['%s_TARGET_MAX' % meas_value])
+                        log_criteria.debug('%s_TR_TARG_%s', meas_value, tr_iter)
+                        log_criteria.debug('tr_target=%s', daq.sc['%s_TARGET' % meas_value])
+                        log_criteria.info('Y Value (%s) = %s. Pass/fail bounds = [%s, %s]',
+                                          meas_value, daq.sc['%s_MEAS' % meas_value],
+                                          daq.sc['%s_TARGET_MIN' % meas_value], daq.sc['%s_TARGET_MAX' % meas_value])
                 except Exception as e:
                     self.ts.log_error('Test script exception: %s' % traceback.format_exc())
                     self.ts.log_debug('Measured value (%s) not recorded: %s' % (meas_value, e))
@@ -707,30 +1684,17 @@ class CriteriaValidation:
         step_dict = self.step_dict
 
         if function == VV:
-            vv_pairs = self.get_params(function=VV, curve=self.curve)
-            x = [vv_pairs['V1'], vv_pairs['V2'],
-                 vv_pairs['V3'], vv_pairs['V4']]
-            y = [vv_pairs['Q1'], vv_pairs['Q2'],
-                 vv_pairs['Q3'], vv_pairs['Q4']]
             if isinstance(step_dict, dict):
-                q_value = float(np.interp(step_dict['V'], x, y))
-            else:
-                q_value = float(np.interp(value, x, y))
-            q_value *= self.pwr
+                value = step_dict['V']
+            # each phase responds to its own voltage with a third of the rated power
+            q_value = float(np.mean(self.get_curve(VV)(value)))
             return round(q_value, 1)
 
         if function == VW:
-            # self.ts.log_debug(f'VW target calculation')
-            vw_pairs = self.get_params(function=VW, curve=self.curve)
-            self.ts.log_debug(f'vw_pairs={vw_pairs}')
-            x = [vw_pairs['V1'], vw_pairs['V2']]
-            y = [vw_pairs['P1'], vw_pairs['P2']]
             if isinstance(step_dict, dict):
-                p_value = float(np.interp(step_dict['V'], x, y))
-            else:
-                p_value = float(np.interp(value, x, y))
-            p_value *= self.pwr
-            self.ts.log_debug(f'p_value={p_value}')
+                value = step_dict['V']
+            p_value = float(np.mean(self.get_curve(VW)(value)))
+            library_log(self.ts, 'criteria').debug('p_value=%s', p_value)
             return round(p_value, 1)
 
         if function == CPF:
@@ -744,40 +1708,18 @@ class CriteriaValidation:
             return round(q_value, 1)
 
         if function == WV:
-            # self.ts.log_debug(f'WV target calculation')
-            x = [self.param[WV][self.curve]['P1'], self.param[WV][self.curve]['P2'], self.param[WV][self.curve]['P3']]
-            y = [self.param[WV][self.curve]['Q1'], self.param[WV][self.curve]['Q2'], self.param[WV][self.curve]['Q3']]
-            q_value = float(np.interp(step_dict['P'], x, y))
-            q_value *= self.pwr
-            self.ts.log_debug('Power value: %s --> q_target: %s' % (value, q_value))
+            q_value = self.get_curve(WV)(step_dict['P'])
+            library_log(self.ts, 'criteria').debug('Power value: %s --> q_target: %s', value, q_value)
             return q_value
 
         if function == FW:
-            # self.ts.log_debug(f'FW target calculation')
-            p_targ = None
-            fw_pairs = self.get_params(function=FW, curve=self.curve)
-            f_dob = self.f_nom + fw_pairs['dbf']
-            f_dub = self.f_nom - fw_pairs['dbf']
-            p_db = self.p_rated * self.pwr
-            p_avl = self.p_rated * (1.0 - self.pwr)
             if isinstance(step_dict, dict):
                 value = step_dict['F']
-            self.ts.log_debug(f'value={value}')
-            if f_dub <= value <= f_dob:
-                p_targ = p_db
-            elif value > f_dob:
-                p_targ = p_db - ((value - f_dob) / (self.f_nom * self.param[FW][self.curve]['kof'])) * p_db
-                if p_targ < self.p_min:
-                    p_targ = self.p_min
-            elif value < f_dub:
-                p_targ = ((f_dub - value) / (self.f_nom * self.param[FW][self.curve]['kof'])) * p_avl + p_db
-                if p_targ > self.p_rated:
-                    p_targ = self.p_rated
-            p_targ *= self.pwr
-            return round(p_targ, 2)
+            library_log(self.ts, 'criteria').debug('value=%s', value)
+            return round(self.get_curve(FW)(value), 2)
 
         if function == LAP:
-            self.ts.log_debug(f'LAP target calculation')
+            library_log(self.ts, 'criteria').debug('LAP target calculation')
             p_targ = (step_dict['P'] * self.p_rated) + self.MRA['P']
             return p_targ
 
@@ -854,7 +1796,12 @@ class CriteriaValidation:
 
         self.step_dict = step_dict
         self.define_target(daq=daq, y_criterias_mod=y_criterias_mod)
+        self.grade_criterias()
 
+    def grade_criterias(self):
+        """
+        Grade the step against the targets recorded by define_target. The DAQ is not used.
+        """
         if self.criteria_mode[0]:
             self.open_loop_resp_criteria()
         if self.criteria_mode[1] or self.criteria_mode[2]:
@@ -900,7 +1847,7 @@ class CriteriaValidation:
         y = list(self.y_criteria.keys())[0]
         mra_y = self.MRA[y]
 
-        duration = self.tr_value[f"timestamp_{tr}"] - self.initial_value['timestamp']
+        duration = self.tr_value.timestamps[tr] - self.initial_value['timestamp']
         duration = duration.total_seconds()
         self.ts.log('Calculating pass/fail for Tr = %s sec, with a target of %s sec' %
                     (duration, tr))
@@ -915,11 +1862,12 @@ class CriteriaValidation:
             # y_start = tr_value['%s_INITIAL' % y]
             mra_t = self.MRA['T'] * duration  # MRA(X) = MRA(time) = 0.01*duration
         # self.ts.log_debug(f'tr_value={self.tr_value}')
-        y_ss = self.tr_value[f'{y}_TR_TARG_{tr}']
+        y_ss = self.tr_value.get(y, tr, TrValues.TARG)
         y_target = self.calculate_open_loop_value(y0=y_start, y_ss=y_ss, duration=duration, tr=tr)  # 90%
-        y_meas = self.tr_value[f'{y}_TR_{tr}']
-        self.ts.log_debug(
-            f'y_target = {y_target:.2f}, y_ss [{y_ss:.2f}], y_start [{y_start:.2f}], duration = {duration}, tr={tr}')
+        y_meas = self.tr_value.get(y, tr, TrValues.MEAS)
+        log_criteria = library_log(self.ts, 'criteria')
+        log_criteria.debug('y_target = %.2f, y_ss [%.2f], y_start [%.2f], duration = %s, tr=%s',
+                           y_target, y_ss, y_start, duration, tr)
 
         if y_start <= y_target:  # increasing values of y
             increasing = True
@@ -944,106 +1892,334 @@ class CriteriaValidation:
             # Pass: Ymeas <= Ymax when decreasing y output
             if increasing:
                 if y_min <= y_meas:
-                    self.tr_value['TR_90_%_PF'] = 'Pass'
+                    self.tr_value.tr_90_pf = 'Pass'
                 else:
-                    self.tr_value['TR_90_%_PF'] = 'Fail'
-                self.ts.log_debug('Transient y_targ = %s, y_min [%s] <= y_meas [%s] = %s' %
-                                  (y_target, y_min, y_meas, self.tr_value['TR_90_%_PF']))
+                    self.tr_value.tr_90_pf = 'Fail'
+                log_criteria.debug('Transient y_targ = %s, y_min [%s] <= y_meas [%s] = %s',
+                                   y_target, y_min, y_meas, self.tr_value.tr_90_pf)
             else:  # decreasing
                 if y_meas <= y_max:
-                    self.tr_value['TR_90_%_PF'] = 'Pass'
+                    self.tr_value.tr_90_pf = 'Pass'
                 else:
-                    self.tr_value['TR_90_%_PF'] = 'Fail'
-                self.ts.log_debug('Transient y_targ = %s, y_meas [%s] <= y_max [%s] = %s'
-                                  % (y_target, y_meas, y_max, self.tr_value['TR_90_%_PF']))
+                    self.tr_value.tr_90_pf = 'Fail'
+                log_criteria.debug('Transient y_targ = %s, y_meas [%s] <= y_max [%s] = %s',
+                                   y_target, y_meas, y_max, self.tr_value.tr_90_pf)
 
         else:  # 2-sided analysis
             # Pass/Fail: Ymin <= Ymeas <= Ymax
             if y_min <= y_meas <= y_max:
-                self.tr_value['TR_90_%_PF'] = 'Pass'
+                self.tr_value.tr_90_pf = 'Pass'
             else:
-                self.tr_value['TR_90_%_PF'] = 'Fail'
-            display_value_p1 = f'Transient y_targ ={y_target:.2f}, y_min [{y_min:.2f}] <= y_meas'
-            display_value_p2 = f'[{y_meas:.2f}] <= y_max [{y_max:.2f}] = {self.tr_value["TR_90_%_PF"]}'
-
-            self.ts.log_debug(f'{display_value_p1} {display_value_p2}')
+                self.tr_value.tr_90_pf = 'Fail'
+            log_criteria.debug('Transient y_targ =%.2f, y_min [%.2f] <= y_meas [%.2f] <= y_max [%.2f] = %s',
+                               y_target, y_min, y_meas, y_max, self.tr_value.tr_90_pf)
 
     def result_accuracy_criteria(self):
 
         # Note: Note sure where criteria_mode[1] (SS accuracy after 1 Tr) is used in IEEE 1547.1
         self.ts.log_debug(f'RESULT_ACCURACY')
+        tr_value = self.tr_value
         for y in self.y_criteria:
-            for tr_iter in range(self.tr_value['FIRST_ITER'], self.tr_value['LAST_ITER'] + 1):
+            for tr_iter in range(tr_value.first_iter, tr_value.last_iter + 1):
 
-                if (self.tr_value['FIRST_ITER'] == tr_iter and self.criteria_mode[1]) or \
-                        (self.tr_value['LAST_ITER'] == tr_iter and self.criteria_mode[2]):
+                if (tr_value.first_iter == tr_iter and self.criteria_mode[1]) or \
+                        (tr_value.last_iter == tr_iter and self.criteria_mode[2]):
 
                     # pass/fail assessment for the steady-state values
                     # self.ts.log_debug(f'current iter={tr_iter}')
-                    if self.tr_value['%s_TR_%s_MIN' % (y, tr_iter)] <= \
-                            self.tr_value['%s_TR_%s' % (y, tr_iter)] <= self.tr_value['%s_TR_%s_MAX' % (y, tr_iter)]:
-                        self.tr_value['%s_TR_%s_PF' % (y, tr_iter)] = 'Pass'
+                    y_min = tr_value.get(y, tr_iter, TrValues.MIN)
+                    y_meas = tr_value.get(y, tr_iter, TrValues.MEAS)
+                    y_max = tr_value.get(y, tr_iter, TrValues.MAX)
+                    if y_min <= y_meas <= y_max:
+                        tr_value.set_verdict(y, tr_iter, 'Pass')
                     else:
-                        self.tr_value['%s_TR_%s_PF' % (y, tr_iter)] = 'Fail'
+                        tr_value.set_verdict(y, tr_iter, 'Fail')
 
                     self.ts.log('  Steady state %s(Tr_%s) evaluation: %0.1f <= %0.1f <= %0.1f  [%s]' % (
-                        y,
-                        tr_iter,
-                        self.tr_value['%s_TR_%s_MIN' % (y, tr_iter)],
-                        self.tr_value['%s_TR_%s' % (y, tr_iter)],
-                        self.tr_value['%s_TR_%s_MAX' % (y, tr_iter)],
-                        self.tr_value['%s_TR_%s_PF' % (y, tr_iter)]))
+                        y, tr_iter, y_min, y_meas, y_max, tr_value.get_verdict(y, tr_iter)))
 
 
-class ImbalanceComponent:
+class BatchCriteriaValidation:
+    """
+    Vectorized version of CriteriaValidation. All the steps of a run are graded at once from NumPy arrays
+    instead of one step at a time through tr_value. The functions follow the same equations as
+    update_target_value, calculate_min_max_values, open_loop_resp_criteria and result_accuracy_criteria.
+    """
 
-    def __init__(self):
-        self.mag = {}
-        self.ang = {}
+    def batch_target_values(self, function, steps, curve=None, pwr=None):
+        """
+        Calculate the Y target of every step
 
-    def set_imbalance_config(self, imbalance_angle_fix=None):
+        :param function:    VV, VW, WV, FW, CPF, CRP or LAP
+        :param steps:       dictionary (or DataFrame) of arrays with the step values (same keys as step_dict)
+        :param curve:       characteristic curve number, default is the current curve
+        :param pwr:         power level in p.u., scalar or array, default is the current power level
+        :return: array of targets
         """
-        Initialize the case possibility for imbalance test either with fix 120 degrees for the angle or
-        with a calculated angles that would result in a null sequence zero
+        if curve is None:
+            curve = self.curve
+        if pwr is None:
+            pwr = self.pwr
+        pwr = np.asarray(pwr, dtype=float)
+
+        if function in (VV, VW):
+            y = self.get_curve(function, curve, pwr)(np.asarray(steps['V'], dtype=float))
+            if np.ndim(y) == 2:
+                # per-phase voltages (INDIVIDUAL_PHASES_VOLTAGES), each phase carries a third of the rated power
+                y = y.mean(axis=1)
+            return np.round(y, 1)
 
-        :param imbalance_angle_fix:   string (Yes or No)
-        if Yes, angle are fix at 120 degrees for both cases.
-        if No, resulting sequence zero will be null for both cases.
+        elif function == WV:
+            return self.get_curve(WV, curve, pwr)(np.asarray(steps['P'], dtype=float))
 
-        :return: None
+        elif function == FW:
+            return np.round(self.get_curve(FW, curve, pwr)(np.asarray(steps['F'], dtype=float)), 2)
+
+        elif function == CPF:
+            p = np.asarray(steps['P'], dtype=float)
+            pf = np.asarray(steps['PF'], dtype=float)
+            return np.sqrt(np.square(p) * ((1 / np.square(pf)) - 1))
+
+        elif function == CRP:
+            return np.round(np.asarray(steps['Q'], dtype=float), 1)
+
+        elif function == LAP:
+            return np.asarray(steps['P'], dtype=float) * self.p_rated + self.MRA['P']
+
+        raise p1547Error(f'Batch evaluation is not available for {function}')
+
+    def batch_min_max_values(self, function, steps, curve=None, pwr=None, x_mra=False):
+        """
+        Calculate the pass/fail envelope of every step
+
+        :param function:    VV, VW, WV, FW, CPF, CRP or LAP
+        :param steps:       dictionary (or DataFrame) of arrays with the step values
+        :param curve:       characteristic curve number, default is the current curve
+        :param pwr:         power level in p.u., scalar or array, default is the current power level
+        :param x_mra:       False gives the envelope used by calculate_min_max_values (target +/- 1.5*MRA(Y)).
+                            True also shifts X by +/- 1.5*MRA(X) and keeps the widest bounds
+        :return: tuple of arrays (target_min, target_max)
         """
+        x_name = {VV: 'V', VW: 'V', WV: 'P', FW: 'F'}.get(function)
+        y_name = {VV: 'Q', VW: 'P', WV: 'Q', FW: 'P', CPF: 'Q', CRP: 'Q', LAP: 'P'}[function]
+        target = self.batch_target_values(function, steps, curve=curve, pwr=pwr)
 
-        '''
-                                            Table 24 - Imbalanced Voltage Test Cases
-                +-----------------------------------------------------+-----------------------------------------------+
-                | Phase A (p.u.)  | Phase B (p.u.)  | Phase C (p.u.)  | In order to keep V0 magnitude                 |
-                |                 |                 |                 | and angle at 0. These parameter can be used.  |
-                +-----------------+-----------------+-----------------+-----------------------------------------------+
-                |       Mag       |       Mag       |       Mag       | Mag   | Ang  | Mag   | Ang   | Mag   | Ang    |
-        +-------+-----------------+-----------------+-----------------+-------+------+-------+-------+-------+--------+
-        |Case A |     >= 1.07     |     <= 0.91     |     <= 0.91     | 1.08  | 0.0  | 0.91  |-126.59| 0.91  | 126.59 |
-        +-------+-----------------+-----------------+-----------------+-------+------+-------+-------+-------+--------+
-        |Case B |     <= 0.91     |     >= 1.07     |     >= 1.07     | 0.9   | 0.0  | 1.08  |-114.5 | 1.08  | 114.5  |
-        +-------+-----------------+-----------------+-----------------+-------+------+-------+-------+-------+--------+
+        if function == CRP:
+            q = np.asarray(steps['Q'], dtype=float)
+            return q - self.MRA['Q'], q + self.MRA['Q']
+
+        if x_mra and x_name is not None:
+            x = np.asarray(steps[x_name], dtype=float)
+            a_x = self.MRA[x_name] * 1.5
+            shifted = dict(steps)
+            shifted[x_name] = x + a_x
+            y_high_x = self.batch_target_values(function, shifted, curve=curve, pwr=pwr)
+            shifted[x_name] = x - a_x
+            y_low_x = self.batch_target_values(function, shifted, curve=curve, pwr=pwr)
+            y_min = np.minimum(y_high_x, y_low_x)
+            y_max = np.maximum(y_high_x, y_low_x)
+        else:
+            y_min = target
+            y_max = target
 
-        For tests with imbalanced, three-phase voltages, the manufacturer shall state whether the EUT responds
-        to individual phase voltages, or the average of the three-phase effective (RMS) values or the positive
-        sequence of voltages. For EUTs that respond to individual phase voltages, the response of each
-        individual phase shall be evaluated. For EUTs that response to the average of the three-phase effective
-        (RMS) values mor the positive sequence of voltages, the total three-phase reactive and active power
-        shall be evaluated.
-        '''
-        try:
-            if imbalance_angle_fix == 'std':
-                # Case A
-                self.mag['case_a'] = [1.07 * self.v_nom, 0.91 * self.v_nom, 0.91 * self.v_nom]
-                self.ang['case_a'] = [0.0, -120.0, 120.0]
-                # Case B
-                self.mag['case_b'] = [0.91 * self.v_nom, 1.07 * self.v_nom, 1.07 * self.v_nom]
-                self.ang['case_b'] = [0.0, -120.0, 120.0]
-                self.ts.log("Setting test with imbalanced test with FIXED angles/values")
-            elif imbalance_angle_fix == 'fix_mag':
-                # Case A
+        a_y = self.MRA[y_name] * 1.5
+        return y_min - a_y, y_max + a_y
+
+    def batch_open_loop_value(self, y0, y_ss, duration, tr):
+        """
+        Vectorized calculate_open_loop_value
+
+        :param y0:          initial Y(0) values
+        :param y_ss:        steady-state solutions
+        :param duration:    times since the change in the input parameter (s)
+        :param tr:          open loop response time (s)
+        :return: array of anticipated Y(duration) values
+        """
+        time_const = tr / (-(math.log(0.1)))
+        resp_fraction = 1 - np.exp(-np.asarray(duration, dtype=float) / time_const)
+        return (np.asarray(y_ss, dtype=float) - y0) * resp_fraction + y0
+
+    def batch_evaluate_criterias(self, steps, function=None, curve=None, pwr=None, x_mra=False, tr=1):
+        """
+        Grade every step of a run in one pass
+
+        :param steps:       dictionary (or DataFrame) of equal length arrays with
+                            - the step values, same keys as the step_dict given to evaluate_criterias
+                            - 'Y_INITIAL': Y measured at the beginning of the step
+                            - 'Y_TR_1': Y measured at the first Tr
+                            - 'Y_TR_LAST': Y measured at the last Tr (LAST_ITER)
+                            - 'DURATION' (optional): time between the step and the first Tr sample
+                            - 'PWR' (optional): power level of each step in p.u.
+        :param function:    function used for the targets, default is the first Y criteria
+        :param curve:       characteristic curve number, default is the current curve
+        :param pwr:         power level used when steps has no 'PWR' column
+        :param x_mra:       see batch_min_max_values
+        :param tr:          response time given to the open loop response, same as open_loop_resp_criteria
+        :return: DataFrame with targets, bounds and verdicts of each step
+        """
+        y = list(self.y_criteria.keys())[0]
+        if function is None:
+            function = self.y_criteria[y]
+        if 'PWR' in steps:
+            pwr = np.asarray(steps['PWR'], dtype=float)
+
+        y_initial = np.asarray(steps['Y_INITIAL'], dtype=float)
+        y_tr_1 = np.asarray(steps['Y_TR_1'], dtype=float)
+        y_tr_last = np.asarray(steps['Y_TR_LAST'], dtype=float)
+        if 'DURATION' in steps:
+            duration = np.asarray(steps['DURATION'], dtype=float)
+        else:
+            duration = np.full(len(y_initial), float(self.tr))
+
+        target = self.batch_target_values(function, steps, curve=curve, pwr=pwr)
+        target_min, target_max = self.batch_min_max_values(function, steps, curve=curve, pwr=pwr, x_mra=x_mra)
+
+        results = pd.DataFrame({f'{y}_TARGET': target,
+                                f'{y}_TARGET_MIN': target_min,
+                                f'{y}_TARGET_MAX': target_max})
+
+        if self.criteria_mode[0]:
+            # Open loop response at 1 Tr, see open_loop_resp_criteria
+            mra_y = self.MRA[y]
+            if self.script_name == CRP:
+                y_start = np.zeros(len(y_initial))
+                mra_t = np.zeros(len(y_initial))
+            else:
+                y_start = y_initial
+                mra_t = self.MRA['T'] * duration
+            y_target = self.batch_open_loop_value(y_start, target, duration, tr)
+            increasing = y_start <= y_target
+            y_early = self.batch_open_loop_value(y_start, target, duration - 1.5 * mra_t, tr)
+            y_late = self.batch_open_loop_value(y_start, target, duration + 1.5 * mra_t, tr)
+            y_min = np.where(increasing, y_early, y_late) - 1.5 * mra_y
+            y_max = np.where(increasing, y_late, y_early) + 1.5 * mra_y
+            if self.script_name == CRP:
+                passed = np.where(increasing, y_min <= y_tr_1, y_tr_1 <= y_max)
+            else:
+                passed = (y_min <= y_tr_1) & (y_tr_1 <= y_max)
+            results['90%_BY_TR=1'] = np.where(passed, 'Pass', 'Fail')
+
+        if self.criteria_mode[1]:
+            passed = (target_min <= y_tr_1) & (y_tr_1 <= target_max)
+            results['WITHIN_BOUNDS_BY_TR=1'] = np.where(passed, 'Pass', 'Fail')
+        if self.criteria_mode[2]:
+            passed = (target_min <= y_tr_last) & (y_tr_last <= target_max)
+            results['WITHIN_BOUNDS_BY_LAST_TR'] = np.where(passed, 'Pass', 'Fail')
+
+        return results
+
+
+"""
+Section for the symmetrical components of the imbalanced-grid tests
+"""
+
+# Fortescue transform, rows give the zero, positive and negative sequence of the phasors of phases A, B and C
+FORTESCUE_A = np.exp(2j * np.pi / 3.)
+FORTESCUE = np.array([[1., 1., 1.],
+                      [1., FORTESCUE_A, FORTESCUE_A ** 2],
+                      [1., FORTESCUE_A ** 2, FORTESCUE_A]]) / 3.
+NOMINAL_ANGLES = (0., -120., 120.)
+
+
+def phase_phasors(mag, ang=None):
+    """
+    Build the phasors of the three phases
+
+    :param mag:     magnitudes, array of shape (..., 3)
+    :param ang:     angles in degrees, array broadcastable to mag, default is the balanced 0, -120, 120
+    :return: complex array of shape (..., 3)
+    """
+    mag = np.asarray(mag, dtype=float)
+    if ang is None:
+        ang = NOMINAL_ANGLES
+    return mag * np.exp(1j * np.radians(np.asarray(ang, dtype=float)))
+
+
+def sequence_components(mag, ang=None):
+    """
+    Zero, positive and negative sequence of the three phases, for one set of phasors or for every row of a dataset
+
+    :param mag:     magnitudes, array of shape (..., 3)
+    :param ang:     angles in degrees, array broadcastable to mag, default is the balanced 0, -120, 120
+    :return: tuple of complex arrays of shape (...) (zero, positive, negative)
+    """
+    seq = phase_phasors(mag, ang) @ FORTESCUE.T
+    return seq[..., 0], seq[..., 1], seq[..., 2]
+
+
+def dataset_sequence_components(dataset, meas_root='AC_VRMS', angle_root=None):
+    """
+    Magnitudes of the sequence components of a three-phase measurement for every row of a dataset. Without angle
+    channels the phases are assumed at 0, -120 and 120 degrees, so only the magnitude imbalance is seen.
+
+    :param dataset:     DataFrame read from a dataset csv file
+    :param meas_root:   channel root of the phase magnitudes, e.g. 'AC_VRMS' or 'AC_IRMS'
+    :param angle_root:  channel root of the phase angles in degrees, None to use the balanced angles
+    :return: DataFrame with the <meas_root>_ZERO, <meas_root>_POS, <meas_root>_NEG and <meas_root>_UNBALANCE
+             (negative over positive sequence) columns
+    """
+    phases = ['_1', '_2', '_3']
+    mag = dataset[[meas_root + ph for ph in phases]].to_numpy(dtype=float)
+    ang = None
+    if angle_root is not None:
+        ang = dataset[[angle_root + ph for ph in phases]].to_numpy(dtype=float)
+    zero, pos, neg = (np.abs(seq) for seq in sequence_components(mag, ang))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        unbalance = np.where(pos > 0., neg / pos, np.nan)
+    return pd.DataFrame({meas_root + '_ZERO': zero, meas_root + '_POS': pos, meas_root + '_NEG': neg,
+                         meas_root + '_UNBALANCE': unbalance}, index=dataset.index)
+
+
+class ImbalanceComponent:
+
+    def __init__(self):
+        self.mag = {}
+        self.ang = {}
+        self.imbalance_resp = AVG_3PH_RMS
+
+    def set_imbalance_config(self, imbalance_angle_fix=None):
+        """
+        Initialize the case possibility for imbalance test either with fix 120 degrees for the angle or
+        with a calculated angles that would result in a null sequence zero
+
+        :param imbalance_angle_fix:   string (Yes or No)
+        if Yes, angle are fix at 120 degrees for both cases.
+        if No, resulting sequence zero will be null for both cases.
+
+        :return: None
+        """
+
+        '''
+                                            Table 24 - Imbalanced Voltage Test Cases
+                +-----------------------------------------------------+-----------------------------------------------+
+                | Phase A (p.u.)  | Phase B (p.u.)  | Phase C (p.u.)  | In order to keep V0 magnitude                 |
+                |                 |                 |                 | and angle at 0. These parameter can be used.  |
+                +-----------------+-----------------+-----------------+-----------------------------------------------+
+                |       Mag       |       Mag       |       Mag       | Mag   | Ang  | Mag   | Ang   | Mag   | Ang    |
+        +-------+-----------------+-----------------+-----------------+-------+------+-------+-------+-------+--------+
+        |Case A |     >= 1.07     |     <= 0.91     |     <= 0.91     | 1.08  | 0.0  | 0.91  |-126.59| 0.91  | 126.59 |
+        +-------+-----------------+-----------------+-----------------+-------+------+-------+-------+-------+--------+
+        |Case B |     <= 0.91     |     >= 1.07     |     >= 1.07     | 0.9   | 0.0  | 1.08  |-114.5 | 1.08  | 114.5  |
+        +-------+-----------------+-----------------+-----------------+-------+------+-------+-------+-------+--------+
+
+        For tests with imbalanced, three-phase voltages, the manufacturer shall state whether the EUT responds
+        to individual phase voltages, or the average of the three-phase effective (RMS) values or the positive
+        sequence of voltages. For EUTs that respond to individual phase voltages, the response of each
+        individual phase shall be evaluated. For EUTs that response to the average of the three-phase effective
+        (RMS) values mor the positive sequence of voltages, the total three-phase reactive and active power
+        shall be evaluated.
+        '''
+        try:
+            if imbalance_angle_fix == 'std':
+                # Case A
+                self.mag['case_a'] = [1.07 * self.v_nom, 0.91 * self.v_nom, 0.91 * self.v_nom]
+                self.ang['case_a'] = [0.0, -120.0, 120.0]
+                # Case B
+                self.mag['case_b'] = [0.91 * self.v_nom, 1.07 * self.v_nom, 1.07 * self.v_nom]
+                self.ang['case_b'] = [0.0, -120.0, 120.0]
+                self.ts.log("Setting test with imbalanced test with FIXED angles/values")
+            elif imbalance_angle_fix == 'fix_mag':
+                # Case A
                 self.mag['case_a'] = [1.07 * self.v_nom, 0.91 * self.v_nom, 0.91 * self.v_nom]
                 self.ang['case_a'] = [0.0, -126.59, 126.59]
                 # Case B
@@ -1072,12 +2248,14 @@ class ImbalanceComponent:
             self.ts.log_error('Incorrect Parameter value : %s' % e)
             raise
 
-    def set_grid_asymmetric(self, grid, case, imbalance_resp='AVG_3PH_RMS'):
+    def set_grid_asymmetric(self, grid, case, imbalance_resp=AVG_3PH_RMS):
         """
         Configure the grid simulator to change the magnitude and angles.
         :param grid:   A gridsim object from the svpelab library
         :param case:   string (case_a or case_b)
-        :return: nothing
+        :param imbalance_resp:  AVG_3PH_RMS, INDIVIDUAL_PHASES_VOLTAGES or POSITIVE_SEQUENCE_VOLTAGES
+        :return: the voltage the EUT responds to, i.e. the average of the phase voltages, the list of the phase
+                 voltages (each phase is graded on its own voltage) or the magnitude of the positive sequence
         """
         self.ts.log_debug(f'mag={self.mag}')
         self.ts.log_debug(f'mag={self.ang}')
@@ -1086,15 +2264,36 @@ class ImbalanceComponent:
 
         if grid is not None:
             grid.config_asymmetric_phase_angles(mag=self.mag[case], angle=self.ang[case])
-        if imbalance_resp == 'AVG_3PH_RMS':
+        self.imbalance_resp = imbalance_resp
+        if imbalance_resp == AVG_3PH_RMS:
             self.ts.log_debug(f'mag={self.mag[case]}')
             return round(sum(self.mag[case]) / 3.0, 2)
-        elif imbalance_resp is 'INDIVIDUAL_PHASES_VOLTAGES':
-            # TODO TO BE COMPLETED
-            pass
-        elif imbalance_resp is 'POSITIVE_SEQUENCE_VOLTAGES':
-            # TODO to be completed
-            pass
+        elif imbalance_resp == INDIVIDUAL_PHASES_VOLTAGES:
+            return [round(mag, 2) for mag in self.mag[case]]
+        elif imbalance_resp == POSITIVE_SEQUENCE_VOLTAGES:
+            zero, pos, neg = sequence_components(self.mag[case], self.ang[case])
+            self.ts.log_debug(f'V0={abs(zero):.2f}, V1={abs(pos):.2f}, V2={abs(neg):.2f}')
+            return round(float(abs(pos)), 2)
+        raise p1547Error(f'Unknown EUT response to phase imbalance: {imbalance_resp}')
+
+    def get_dataset_response_voltage(self, dataset, imbalance_resp=None, angle_root=None):
+        """
+        Voltage the EUT responds to for every row of a dataset
+
+        :param dataset:         DataFrame read from a dataset csv file
+        :param imbalance_resp:  AVG_3PH_RMS, INDIVIDUAL_PHASES_VOLTAGES or POSITIVE_SEQUENCE_VOLTAGES, default is
+                                the mode of the last set_grid_asymmetric
+        :param angle_root:      channel root of the phase angles, None to use the balanced angles
+        :return: array with one voltage per row, or of shape (rows, 3) for INDIVIDUAL_PHASES_VOLTAGES
+        """
+        if imbalance_resp is None:
+            imbalance_resp = self.imbalance_resp
+        if imbalance_resp == POSITIVE_SEQUENCE_VOLTAGES:
+            return dataset_sequence_components(dataset, 'AC_VRMS', angle_root)['AC_VRMS_POS'].to_numpy()
+        values = dataset[self.get_measurement_label('V')].to_numpy(dtype=float)
+        if imbalance_resp == INDIVIDUAL_PHASES_VOLTAGES:
+            return values
+        return values.mean(axis=1)
 
 
 """
@@ -1109,6 +2308,68 @@ Section reserved for HIL model object
 """
 
 
+class HilParameterStage(object):
+    """
+    Staging layer for the parameters pushed to the HIL target.
+
+    Parameters are staged locally and only the ones that differ from the last values pushed to the target are sent
+    when commit() is called, in a single transaction.
+    """
+    def __init__(self, push, ts=None):
+        """
+        :param push:   callable receiving a list of (name, value) tuples, e.g. hil.set_matlab_variables
+        :param ts:     test script object used for debug logging (optional)
+        """
+        self.push = push
+        self.ts = ts
+        self.pushed = {}
+        self.staged = OrderedDict()
+
+    def stage(self, parameters):
+        """
+        Stage parameters for the next commit.
+
+        :param parameters:   list of (name, value) tuples
+        """
+        for name, value in parameters:
+            if isinstance(value, (list, tuple, np.ndarray)):
+                value = [float(v) for v in value]
+            self.staged[name] = value
+
+    def pending(self):
+        """
+        Return the staged parameters that differ from the values already on the target.
+
+        :return: list of (name, value) tuples
+        """
+        return [(name, value) for name, value in self.staged.items()
+                if name not in self.pushed or self.pushed[name] != value]
+
+    def commit(self):
+        """
+        Push the changed parameters to the target in one transaction.
+
+        :return: number of parameters pushed
+        """
+        parameters = self.pending()
+        if self.ts is not None:
+            self.ts.log_debug('HIL parameters: %d staged, %d pushed' % (len(self.staged), len(parameters)))
+        if parameters and self.push is not None:
+            self.push(parameters)
+        self.pushed.update(parameters)
+        self.staged.clear()
+        return len(parameters)
+
+    def invalidate(self):
+        """
+        Forget the values pushed to the target, e.g. after the model has been (re)loaded. The pushed values are
+        staged again so they are restored on the next commit; values staged since then take precedence.
+        """
+        for name, value in self.pushed.items():
+            self.staged.setdefault(name, value)
+        self.pushed.clear()
+
+
 class HilModel(object):
     def __init__(self, ts, support_interfaces):
         self.params = {}
@@ -1121,6 +2382,7 @@ class HilModel(object):
             self.hil = support_interfaces.get('hil')
         else:
             self.hil = None
+        self.hil_stage = HilParameterStage(self.hil.set_matlab_variables if self.hil is not None else None, ts)
         self.set_time_path()
         self.set_nominal_values()
         #self.set_input_scale_offset()
@@ -1133,7 +2395,8 @@ class HilModel(object):
         parameters = []
         parameters.append((f"VNOM", 1.0))
         parameters.append((f"FNOM", self.f_nom))
-        self.hil.set_matlab_variables(parameters)
+        self.hil_stage.stage(parameters)
+        self.commit_parameters()
 
     def set_time_path(self):
         """
@@ -1141,6 +2404,21 @@ class HilModel(object):
         """
         self.hil.set_time_sig("/SM_Source/IEEE_1547_TESTING/Clock/port1")
 
+    def load_model_on_hil(self):
+        """
+        Load the model on the target. The target variables are reset by the load, so all the parameters pushed
+        before the load (e.g. VNOM, FNOM) are pushed again, after the load, with the next commit. Since the ride-through
+        scripts load the model for every test, only the parameters pushed between two loads are compared.
+        """
+        self.hil_stage.invalidate()
+        return self.hil.load_model_on_hil()
+
+    def commit_parameters(self):
+        """
+        Push the staged parameters that changed since the last commit to the target
+        """
+        return self.hil_stage.commit()
+
     def set_input_scale_offset(self):
         """
         Set input scale and offset of voltage and current
@@ -1168,7 +2446,8 @@ class HilModel(object):
             parameters.append((f"CURRENT_INPUT_OFFSET_PH{ph}", float(offset_current[i])))
             i = i + 1
 
-        self.hil.set_matlab_variables(parameters)
+        self.hil_stage.stage(parameters)
+        self.commit_parameters()
 
     """
     Getter functions
@@ -1459,27 +2738,28 @@ class FrequencyWatt(EutParameters, UtilParameters):
 
     def set_params(self):
 
-        p_small = self.ts.param_value('eut_fw.p_small')
+        params = parameter_snapshot(self.ts)
+        p_small = params.param_value('eut_fw.p_small')
         if p_small is None:
             p_small = 0.05
 
         self.param[FW] = {}
-        if self.ts.param_value('fw.test_1_tr') is None:
+        if params.param_value('fw.test_1_tr') is None:
             # Based on table 34 and category III
             tr_1 = 5.0
         else:
-            tr_1 = self.ts.param_value('fw.test_1_tr')
+            tr_1 = params.param_value('fw.test_1_tr')
         self.param[FW][1] = {
             'dbf': 0.036,
             'kof': 0.05,
             'TR': tr_1,
             'f_small': p_small * self.f_nom * 0.05
         }
-        if self.ts.param_value('fw.test_2_tr') is None:
+        if params.param_value('fw.test_2_tr') is None:
             # Based on table 35 and category III
             tr_2 = 0.2
         else:
-            tr_2 = self.ts.param_value('fw.test_2_tr')
+            tr_2 = params.param_value('fw.test_2_tr')
         self.param[FW][2] = {
             'dbf': 0.017,
             'kof': 0.03,
@@ -1559,8 +2839,9 @@ class Interoperability(EutParameters):
         # self.set_imbalance_config()
 
     def set_params(self):
-        self.param['settings_test'] = self.ts.param_value('iop.settings_test')
-        self.param['monitoring_test'] = self.ts.param_value('iop.monitoring_test')
+        params = parameter_snapshot(self.ts)
+        self.param['settings_test'] = params.param_value('iop.settings_test')
+        self.param['monitoring_test'] = params.param_value('iop.monitoring_test')
 
 
 class WattVar(EutParameters, UtilParameters):
@@ -1584,7 +2865,7 @@ class WattVar(EutParameters, UtilParameters):
             p = 0.2 * self.p_rated
             self.ts.log('P1 power is set using 20% p_rated')
 
-        if self.absorb is "Yes":
+        if self.absorb == "Yes":
             self.ts.log('Adding EUT Absorption Points (P1_prime-P3_prime, Q1_prime-Q3_prime)')
             self.param[WV][1] = {
                 'P1': round(p, 2),
@@ -1755,14 +3036,219 @@ class Prioritization(EutParameters, UtilParameters):
         return step_dicts
 
 
+"""
+This section is for the grading of the steps
+"""
+
+
+class StepPipeline(object):
+    """
+    Grade the steps of a test in the order they are captured: submit() grades the step that record_timeresponse has
+    just captured, writes its row with write_rslt_sum and adds it to the result summary.
+
+    The grading takes about a millisecond per step with the virtual lab, against the 2*TR seconds of the step, so it
+    is done right away on the main thread rather than overlapped with the next step.
+    """
+
+    def __init__(self, active_function, daq, result_summary=None):
+        """
+        :param active_function: ActiveFunction object of the test script
+        :param daq:             data acquisition object from svpelab library
+        :param result_summary:  result summary file the rows are written to (optional)
+        """
+        self.active_function = active_function
+        self.ts = active_function.ts
+        self.daq = daq
+        self.result_summary = result_summary
+
+    def submit(self, step_dict=None, y_criterias_mod=None):
+        """
+        Grade the step that has just been captured by record_timeresponse
+
+        :param step_dict:           step values, as for evaluate_criterias
+        :param y_criterias_mod:     y criteria modification, as for evaluate_criterias
+        :return: result summary row of the step
+        """
+        af = self.active_function
+        af.evaluate_criterias(daq=self.daq, step_dict=step_dict, y_criterias_mod=y_criterias_mod)
+        row = af.write_rslt_sum()
+        if self.result_summary is not None:
+            self.result_summary.write(row)
+        return row
+
+    def flush(self):
+        """
+        Flush the result summary
+        """
+        if self.result_summary is not None:
+            self.result_summary.flush()
+
+    def close(self):
+        """
+        Called on the way out of the scripts
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+
+"""
+This section is for the profiling of the step cycle
+"""
+
+TIMING_FILE = 'timing.json'
+PROFILED_METHODS = ['start', 'record_timeresponse', 'evaluate_criterias', 'define_target', 'grade_criterias',
+                    'write_rslt_sum']
+PROFILED_LOGS = ['log', 'log_debug', 'log_warning', 'log_error']
+
+
+class Profiler(object):
+    """
+    Monotonic timers around the step cycle of the ActiveFunction (start, record_timeresponse, evaluate_criterias and
+    its define_target and grade_criterias parts, write_rslt_sum), the public methods of the drivers (daq, grid, eut,
+    pv, ...) and the ts logging. Every call is recorded under '<object>.<method>' and write() saves the count, total,
+    p50, p95 and max of each one in timing.json, next to result_summary.csv.
+
+    The methods are timed by swapping the class of the object for a subclass, so the copies of the ActiveFunction
+    are timed too. The ts logging methods are replaced on the ts object until write() puts them back. When the
+    p1547.profile option is disabled, nothing is wrapped.
+    """
+
+    def __init__(self, ts, enabled=None):
+        """
+        :param ts:          test script object
+        :param enabled:     True/False, default is the p1547.profile option
+        """
+        self.ts = ts
+        if enabled is None:
+            enabled = ts.param_value('p1547.profile') == 'Enabled'
+        self.enabled = enabled
+        self.calls = OrderedDict()
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        # ts logging methods replaced by instrument(), with the attribute they replaced (None: the class method)
+        self.logs = {}
+
+    def record(self, name, duration):
+        with self.lock:
+            self.calls.setdefault(name, []).append(duration)
+
+    def timer(self, name, func):
+        profiler = self
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(name, time.monotonic() - start)
+        return timed
+
+    def wrap(self, obj, name, methods=None):
+        """
+        Time the methods of an object
+
+        :param obj:         object to instrument, None is skipped
+        :param name:        name of the object in the report
+        :param methods:     names of the methods, default is all the public methods of the class
+        :return: obj
+        """
+        if not self.enabled or obj is None or getattr(obj, '_p1547_profiled', False):
+            return obj
+        cls = type(obj)
+        if methods is None:
+            methods = [m for m in dir(cls) if not m.startswith('_')]
+        # only the plain functions of the class, not the static/class methods and the properties
+        methods = [m for m in methods if inspect.isfunction(inspect.getattr_static(cls, m, None))]
+        attrs = {m: self.timer(f'{name}.{m}', getattr(cls, m)) for m in methods}
+        attrs['_p1547_profiled'] = True
+        try:
+            obj.__class__ = type(cls.__name__, (cls,), attrs)
+        except TypeError:
+            # classes with a fixed layout, time the bound methods of this object instead
+            for m in methods:
+                setattr(obj, m, self.timer(f'{name}.{m}', getattr(obj, m)))
+        return obj
+
+    def instrument(self, active_function, **drivers):
+        """
+        Time the step cycle of the ActiveFunction, the drivers and the logging
+
+        :param active_function:     ActiveFunction object
+        :param drivers:             name=driver objects (None are skipped), e.g. daq=daq, grid=grid, eut=eut, pv=pv
+        :return: self
+        """
+        if not self.enabled:
+            return self
+        self.wrap(active_function, 'p1547', PROFILED_METHODS)
+        for name, driver in drivers.items():
+            self.wrap(driver, name)
+        for m in PROFILED_LOGS:
+            if m not in self.logs and callable(getattr(self.ts, m, None)):
+                self.logs[m] = vars(self.ts).get(m)
+                setattr(self.ts, m, self.timer(f'ts.{m}', getattr(self.ts, m)))
+        return self
+
+    def restore(self):
+        """
+        Put back the ts logging methods replaced by instrument()
+        """
+        for m, original in self.logs.items():
+            if original is None:
+                delattr(self.ts, m)
+            else:
+                setattr(self.ts, m, original)
+        self.logs = {}
+
+    def report(self):
+        """
+        :return: dictionary name -> statistics (s) of the calls, slowest total first
+        """
+        with self.lock:
+            calls = {name: np.array(durations) for name, durations in self.calls.items()}
+        stats = OrderedDict()
+        for name, d in sorted(calls.items(), key=lambda item: -item[1].sum()):
+            stats[name] = OrderedDict([('count', int(len(d))),
+                                       ('total', float(d.sum())),
+                                       ('p50', float(np.percentile(d, 50))),
+                                       ('p95', float(np.percentile(d, 95))),
+                                       ('max', float(d.max()))])
+        return stats
+
+    def write(self, filename=TIMING_FILE):
+        """
+        Save the report in the results of the test and log the slowest calls. The ts logging is no longer timed
+        afterwards.
+
+        :param filename:    name of the report
+        :return: nothing
+        """
+        if not self.enabled:
+            return
+        self.restore()
+        stats = self.report()
+        with open(self.ts.result_file_path(filename), 'w') as f:
+            json.dump({'wall_time': time.monotonic() - self.start_time, 'calls': stats}, f, indent=1)
+        self.ts.result_file(filename)
+        for name, stat in list(stats.items())[:5]:
+            self.ts.log('Timing %s: %d calls, %0.3f s total, p95 %0.3f s' % (name, stat['count'], stat['total'],
+                                                                            stat['p95']))
+
+
 """
 This section is for the Active function
 """
 
 
-class ActiveFunction(DataLogging, CriteriaValidation, ImbalanceComponent, VoltWatt, VoltVar, ConstantReactivePower,
-                     ConstantPowerFactor, WattVar, FrequencyWatt, Interoperability, LimitActivePower, Prioritization,
-                     UnintentionalIslanding):
+class ActiveFunction(DataLogging, CriteriaValidation, BatchCriteriaValidation, ImbalanceComponent, VoltWatt, VoltVar,
+                     ConstantReactivePower, ConstantPowerFactor, WattVar, FrequencyWatt, Interoperability,
+                     LimitActivePower, Prioritization, UnintentionalIslanding):
     """
     This class acts as the main function
     As multiple functions might be needed for a compliance script, this function will inherit
@@ -1854,11 +3340,65 @@ This section is for Ride-Through test
 """
 
 
+"""
+Section for the ride-through test sequences
+"""
+
+# Condition letters of each test sequence, keyed by (category, mode, consecutive).
+# A space only separates the sub-sequences for readability.
+VRT_SEQUENCES = OrderedDict([
+    ((CAT_2, LV, True), "ABCDE ABCDEF ABCD'F"),
+    ((CAT_2, LV, False), "ABCDEF"),
+    ((CAT_3, LV, True), "ABCD ABCD ABCDE ABC'DE"),
+    ((CAT_3, LV, False), "ABCDE"),
+    ((CAT_2, HV, True), "ABCD ABCDE"),
+    ((CAT_2, HV, False), "ABCDE"),
+    ((CAT_3, HV, True), "AB AB ABC AB'C"),
+    ((CAT_3, HV, False), "ABC"),
+])
+FRT_SEQUENCE = "EGH"
+
+
+def parse_sequence(sequence, prefix=''):
+    """
+    Split a condition-letter string into the test condition keys
+
+    :param sequence:    condition letters, e.g. "ABCD'F"
+    :param prefix:      prefix of the test condition keys, e.g. 'Step '
+    :return: list of test condition keys, e.g. ['A', 'B', 'C', "D'", 'F']
+    """
+    return [prefix + letter for letter in re.findall(r"[A-Z]'?", sequence)]
+
+
+def build_test_sequence(sequence, test_condition, t0, columns, prefix=''):
+    """
+    Materialise a test sequence table with its start and end timing
+
+    :param sequence:        condition-letter string
+    :param test_condition:  dictionary of pd.Series [condition, minimum duration, value] keyed by test condition
+    :param t0:              start time of the first condition (s)
+    :param columns:         column names of the test condition series
+    :param prefix:          prefix of the test condition keys
+    :return: pd.DataFrame with the columns plus the *_START_TIMING and *_END_TIMING columns
+    """
+    keys = parse_sequence(sequence, prefix)
+    values = np.array([[float(v) for v in test_condition[key].values] for key in keys])
+    duration = values[:, columns.index('MIN_DURATION')]
+    # cumulative sum including t0 keeps the same floating point additions as chaining end to start
+    end_timing = np.cumsum(np.concatenate(([float(t0)], duration)))
+    test_sequences_df = pd.DataFrame(values, columns=columns)
+    name = columns[0].split('_')[0]
+    test_sequences_df[f'{name}_START_TIMING'] = end_timing[:-1]
+    test_sequences_df[f'{name}_END_TIMING'] = end_timing[1:]
+    return test_sequences_df
+
+
 class VoltageRideThrough(HilModel, EutParameters, DataLogging):
     def __init__(self, ts, support_interfaces):
         EutParameters.__init__(self, ts)
         HilModel.__init__(self, ts, support_interfaces)
         self.wfm_header = None
+        self.sequence_cache = {}
         self._config()
         self.phase_combination = None
 
@@ -1873,17 +3413,18 @@ class VoltageRideThrough(HilModel, EutParameters, DataLogging):
 
     def set_vrt_params(self):
         try:
+            params = parameter_snapshot(self.ts)
             # RT test parameters
-            self.params["lv_mode"] = self.ts.param_value('vrt.lv_ena')
-            self.params["hv_mode"] = self.ts.param_value('vrt.hv_ena')
-            self.params["categories"] = self.ts.param_value('vrt.cat')
-            self.params["range_steps"] = self.ts.param_value('vrt.range_steps')
-            self.params["eut_startup_time"] = self.ts.param_value('eut.startup_time')
+            self.params["lv_mode"] = params.param_value('vrt.lv_ena')
+            self.params["hv_mode"] = params.param_value('vrt.hv_ena')
+            self.params["categories"] = params.param_value('vrt.cat')
+            self.params["range_steps"] = params.param_value('vrt.range_steps')
+            self.params["eut_startup_time"] = params.param_value('eut.startup_time')
             self.params["model_name"] = self.hil.rt_lab_model
-            self.params["range_steps"] = self.ts.param_value('vrt.range_steps')
-            self.params["phase_comb"] = self.ts.param_value('vrt.phase_comb')
-            self.params["dataset"] = self.ts.param_value('vrt.dataset_type')
-            self.params["consecutive_ena"] = self.ts.param_value('vrt.consecutive_ena')
+            self.params["range_steps"] = params.param_value('vrt.range_steps')
+            self.params["phase_comb"] = params.param_value('vrt.phase_comb')
+            self.params["dataset"] = params.param_value('vrt.dataset_type')
+            self.params["consecutive_ena"] = params.param_value('vrt.consecutive_ena')
 
         except Exception as e:
             self.ts.log_error('Incorrect Parameter value : %s' % e)
@@ -1925,14 +3466,16 @@ class VoltageRideThrough(HilModel, EutParameters, DataLogging):
 
         vrt_values_list = self.extend_list_end(test_sequence["VRT_VALUES"].to_list(), 0.0, 20)
         parameters.append(("VRT_VALUES", vrt_values_list))
-        self.hil.set_matlab_variables(parameters)
+        self.hil_stage.stage(parameters)
+        self.commit_parameters()
 
     def set_phase_combination(self, phase):
         parameters = []
 
         for ph in phase:
             parameters.append((f"VRT_PH{ph}_ENABLE", 1.0))
-        self.hil.set_matlab_variables(parameters)
+        self.hil_stage.stage(parameters)
+        self.commit_parameters()
 
     def set_wfm_file_header(self):
         self.wfm_header = ['TIME',
@@ -1947,6 +3490,10 @@ class VoltageRideThrough(HilModel, EutParameters, DataLogging):
         # Set useful variables
         mra_v_pu = self.MRA["V"] / self.v_nom
         RANGE_STEPS = self.params["range_steps"]
+        # The Figure sequences are static, only the Random ones are drawn again each time
+        cache_key = (current_mode, RANGE_STEPS, self.params["consecutive_ena"])
+        if cache_key in self.sequence_cache:
+            return self.sequence_cache[cache_key].copy()
         index = ['VRT_CONDITION', 'MIN_DURATION', 'VRT_VALUES']
         TEST_CONDITION = {}
         # each condition are set with a pandas series as follow:
@@ -2055,6 +3602,8 @@ class VoltageRideThrough(HilModel, EutParameters, DataLogging):
         The idea is just to show this on the data.
         '''
         test_sequences_df = self.get_test_sequence(current_mode, TEST_CONDITION)
+        if RANGE_STEPS == "Figure":
+            self.sequence_cache[cache_key] = test_sequences_df.copy()
 
         return test_sequences_df
 
@@ -2068,122 +3617,11 @@ class VoltageRideThrough(HilModel, EutParameters, DataLogging):
             CONSECUTIVE = True
         else:
             CONSECUTIVE = False
-        test_sequences_df = pd.DataFrame(columns=index)
-        if CAT_2 in current_mode and LV in current_mode:
-            if CONSECUTIVE:
-                # ABCDE
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["E"], ignore_index=True)
-                # ABCDEF
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["E"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["F"], ignore_index=True)
-                # ABCD'F
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D'"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["F"], ignore_index=True)
-
-            else:
-                # ABCDEF 
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["E"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["F"], ignore_index=True)
-        elif CAT_3 in current_mode and LV in current_mode:
-            if CONSECUTIVE:
-                # ABCD
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                # ABCD
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                # ABCDE
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["E"], ignore_index=True)
-                # ABC'DE
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C'"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["E"], ignore_index=True)
-            else:
-                # ABCDE
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["E"], ignore_index=True)
-        elif CAT_2 in current_mode and HV in current_mode:
-            if CONSECUTIVE:
-                # ABCD
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-
-                # ABCDE
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["E"], ignore_index=True)
-            else:
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["D"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["E"], ignore_index=True)
-                pass
-        elif CAT_3 in current_mode and HV in current_mode:
-            if CONSECUTIVE:
-                # AB
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-
-                # AB
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-
-                # ABC
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-
-                # AB'C
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B'"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-            else:
-                test_sequences_df = test_sequences_df.append(test_condition["A"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["B"], ignore_index=True)
-                test_sequences_df = test_sequences_df.append(test_condition["C"], ignore_index=True)
-                pass
-
-        test_sequences_df.loc[0, 'VRT_START_TIMING'] = T0
-        # Calculate the timing sequences
-        test_sequences_df.loc[0, 'VRT_END_TIMING'] = T0 + test_sequences_df.loc[0, 'MIN_DURATION']
-        for i in range(1, len(test_sequences_df)):
-            test_sequences_df.loc[i, 'VRT_START_TIMING'] = test_sequences_df.loc[i - 1, 'VRT_END_TIMING']
-            test_sequences_df.loc[i, 'VRT_END_TIMING'] = test_sequences_df.loc[i, 'VRT_START_TIMING'] + \
-                                                         test_sequences_df.loc[i, 'MIN_DURATION']
-        return test_sequences_df
+        for (category, mode, consecutive), sequence in VRT_SEQUENCES.items():
+            if category in current_mode and mode in current_mode and consecutive == CONSECUTIVE:
+                return build_test_sequence(sequence, test_condition, T0, index)
+        self.ts.log_error('No VRT test sequence for mode %s' % current_mode)
+        raise p1547Error('No VRT test sequence for mode %s' % current_mode)
 
     def set_vrt_modes(self):
         modes = []
@@ -2209,6 +3647,10 @@ class VoltageRideThrough(HilModel, EutParameters, DataLogging):
     def get_wfm_file_header(self):
         return self.wfm_header
 
+    def get_evaluation(self):
+        # continuous operation region of Table 15 and Table 16 of IEEE 1547-2018 (Category II and III)
+        return RideThroughEvaluation(f_nom=self.f_nom, continuous=(0.88, 1.10))
+
     def get_modes(self):
         return self.params["modes"]
 
@@ -2219,6 +3661,7 @@ class FrequencyRideThrough(HilModel, EutParameters, DataLogging):
         self.params = {}
         HilModel.__init__(self, ts, support_interfaces)
         self.wfm_header = None
+        self.sequence_cache = {}
         self._config()
 
     def _config(self):
@@ -2232,14 +3675,15 @@ class FrequencyRideThrough(HilModel, EutParameters, DataLogging):
 
     def set_frt_params(self):
         try:
+            params = parameter_snapshot(self.ts)
             # RT test parameters
-            self.params["lf_mode"] = self.ts.param_value('frt.lf_ena')
-            self.params["hf_mode"] = self.ts.param_value('frt.hf_ena')
-            self.params["lf_parameter"] = self.ts.param_value('frt.lf_parameter')
-            self.params["lf_period"] = self.ts.param_value('frt.lf_period')
-            self.params["hf_parameter"] = self.ts.param_value('frt.hf_parameter')
-            self.params["hf_period"] = self.ts.param_value('frt.hf_period')
-            self.params["eut_startup_time"] = self.ts.param_value('eut.startup_time')
+            self.params["lf_mode"] = params.param_value('frt.lf_ena')
+            self.params["hf_mode"] = params.param_value('frt.hf_ena')
+            self.params["lf_parameter"] = params.param_value('frt.lf_parameter')
+            self.params["lf_period"] = params.param_value('frt.lf_period')
+            self.params["hf_parameter"] = params.param_value('frt.hf_parameter')
+            self.params["hf_period"] = params.param_value('frt.hf_period')
+            self.params["eut_startup_time"] = params.param_value('eut.startup_time')
             # self.params["model_name"] = self.hil.rt_lab_model
 
         except Exception as e:
@@ -2265,6 +3709,8 @@ class FrequencyRideThrough(HilModel, EutParameters, DataLogging):
         # Set useful variables
         mra_f = self.MRA["F"]
         index = ['FRT_CONDITION', 'MIN_DURATION', 'FRT_VALUES']
+        if current_mode in self.sequence_cache:
+            return self.sequence_cache[current_mode].copy()
         TEST_CONDITION = {}
         # Test Procedure 5.5.3.4
         if LFRT in current_mode:
@@ -2280,6 +3726,7 @@ class FrequencyRideThrough(HilModel, EutParameters, DataLogging):
                                                  index=index)
             TEST_CONDITION["Step H"] = pd.Series([1, 1, self.f_nom], index=index)
         test_sequences_df = self.get_test_sequence(current_mode, TEST_CONDITION)
+        self.sequence_cache[current_mode] = test_sequences_df.copy()
 
         return test_sequences_df
 
@@ -2300,7 +3747,8 @@ class FrequencyRideThrough(HilModel, EutParameters, DataLogging):
 
         values_list = self.extend_list_end(test_sequence["FRT_VALUES"].to_list(), 0.0, 4)
         parameters.append(("FRT_VALUES", values_list))
-        self.hil.set_matlab_variables(parameters)
+        self.hil_stage.stage(parameters)
+        self.commit_parameters()
 
     """
     Getter functions
@@ -2315,19 +3763,7 @@ class FrequencyRideThrough(HilModel, EutParameters, DataLogging):
     def get_test_sequence(self, current_mode, test_condition):
         index = ['FRT_CONDITION', 'MIN_DURATION', 'FRT_VALUES']
         T0 = self.params["eut_startup_time"]
-        test_sequences_df = pd.DataFrame(columns=index)
-        test_sequences_df = test_sequences_df.append(test_condition["Step E"], ignore_index=True)
-        test_sequences_df = test_sequences_df.append(test_condition["Step G"], ignore_index=True)
-        test_sequences_df = test_sequences_df.append(test_condition["Step H"], ignore_index=True)
-
-        test_sequences_df.loc[0, 'FRT_START_TIMING'] = T0
-        # Calculate the timing sequences
-        test_sequences_df.loc[0, 'FRT_END_TIMING'] = T0 + test_sequences_df.loc[0, 'MIN_DURATION']
-        for i in range(1, len(test_sequences_df)):
-            test_sequences_df.loc[i, 'FRT_START_TIMING'] = test_sequences_df.loc[i - 1, 'FRT_END_TIMING']
-            test_sequences_df.loc[i, 'FRT_END_TIMING'] = test_sequences_df.loc[i, 'FRT_START_TIMING'] + \
-                                                         test_sequences_df.loc[i, 'MIN_DURATION']
-        return test_sequences_df
+        return build_test_sequence(FRT_SEQUENCE, test_condition, T0, index, prefix='Step ')
 
     def get_frt_stop_time(self, test_sequences_df):
         return test_sequences_df["FRT_END_TIMING"].iloc[-1]
@@ -2338,11 +3774,2376 @@ class FrequencyRideThrough(HilModel, EutParameters, DataLogging):
     def get_wfm_file_header(self):
         return self.wfm_header
 
+    def get_evaluation(self):
+        # the continuous operation region is the nominal frequency of the first and last steps
+        return RideThroughEvaluation(f_nom=self.f_nom)
+
     def extend_list_end(self, _list, extend_value, final_length):
         list_length = len(_list)
         _list.extend([float(extend_value)] * (final_length - list_length))
         return _list
 
 
-if __name__ == "__main__":
-    pass
+"""
+This section is for the waveform export of the real-time target captures
+"""
+
+
+def read_mat4_header(path):
+    """
+    Header of a MATLAB level 4 file, the format RT-LAB OpWriteFile writes: one double matrix with a row per signal
+    (time first) and a column per sample.
+
+    :param path:    .mat file
+    :return: (name, number of rows, number of columns, offset of the data) or None if it is not a level 4 double
+             matrix
+    """
+    with open(path, 'rb') as f:
+        head = f.read(20)
+        if len(head) < 20:
+            return None
+        mopt, mrows, ncols, imagf, namlen = struct.unpack('<5i', head)
+        # little endian IEEE, double precision, full numeric matrix
+        if mopt != 0 or imagf != 0 or mrows <= 0 or ncols < 0 or not 0 < namlen < 64:
+            return None
+        name = f.read(namlen).rstrip(b'\0').decode('ascii', 'replace')
+    return name, mrows, ncols, 20 + namlen
+
+
+class WaveformExport(object):
+    """
+    Export the waveform captured by the real-time target. Instead of a fixed wait for the target to save the .mat
+    file, the file is polled until it has its full size and does not change anymore. It is then read in chunks of
+    samples through a memory map and streamed to a WaveformStore (and to csv), so the whole waveform is never held in
+    memory.
+
+    Without the directory of the .mat files (waveform.mat_dir option) or for other .mat formats, the waveform is
+    read with the DAS driver after the fixed wait, as before.
+    """
+
+    def __init__(self, ts, daq, mat_file=None, channels=None, wait_time=10., chunk_points=100000):
+        """
+        :param ts:              test script object
+        :param daq:             data acquisition object from svpelab library
+        :param mat_file:        name of the .mat file, None for the newest one in the directory
+        :param channels:        names of the signals, time first
+        :param wait_time:       fixed wait when the .mat file is read by the DAS driver (s)
+        :param chunk_points:    number of samples read at once
+        """
+        self.ts = ts
+        self.daq = daq
+        self.mat_dir = ts.param_value('waveform.mat_dir') or None
+        self.timeout = ts.param_value('waveform.timeout') or 60.
+        self.csv = ts.param_value('waveform.csv') != 'No'
+        self.mat_file = mat_file
+        self.channels = channels
+        self.wait_time = wait_time
+        self.chunk_points = chunk_points
+        self.since = time.time()
+        self.path = None
+
+    def find(self):
+        if self.mat_file is not None:
+            path = os.path.join(self.mat_dir, self.mat_file)
+            return path if os.path.exists(path) and os.path.getmtime(path) >= self.since else None
+        files = [f for f in glob.glob(os.path.join(self.mat_dir, '*.mat')) if os.path.getmtime(f) >= self.since]
+        return max(files, key=os.path.getmtime) if files else None
+
+    def complete(self, path):
+        """
+        :return: None if the file is not a level 4 double matrix, else whether all the samples are written
+        """
+        header = read_mat4_header(path)
+        if header is None:
+            return None
+        name, mrows, ncols, offset = header
+        return ncols > 0 and os.path.getsize(path) == offset + 8 * mrows * ncols
+
+    def wait(self, interval=0.5, stable_polls=2):
+        """
+        Wait until the target has saved the waveform file
+
+        :param interval:        polling interval (s)
+        :param stable_polls:    number of polls the file has to keep its full size
+        :return: True when the file can be read, False when it is read by the DAS driver
+        """
+        self.path = None
+        if self.mat_dir is None:
+            self.ts.log('Waiting %s seconds for Opal to save the waveform data.' % self.wait_time)
+            self.ts.sleep(self.wait_time)
+            return False
+
+        elapsed = 0.
+        last = None
+        count = 0
+        while elapsed < self.timeout:
+            path = self.find()
+            if path is not None:
+                size = (path, os.path.getsize(path), os.path.getmtime(path))
+                count = count + 1 if size == last else 0
+                last = size
+                if count >= stable_polls:
+                    complete = self.complete(path)
+                    if complete is None:
+                        self.ts.log_warning('Waveform file %s is not a MATLAB level 4 file, it is read by the DAS '
+                                            'driver' % path)
+                        return False
+                    if complete:
+                        self.path = path
+                        self.ts.log('Waveform file %s saved after %0.1f s' % (os.path.basename(path), elapsed))
+                        return True
+            self.ts.sleep(interval)
+            elapsed += interval
+        self.ts.log_warning('Waveform file not saved after %s s, it is read by the DAS driver' % self.timeout)
+        return False
+
+    def export(self, filename, index=0, windows=None):
+        """
+        Write the waveform to the store filename.wfm and to filename.csv
+
+        :param filename:    name of the result files, without extension
+        :param index:       index of the dataset when the waveform is read by the DAS driver
+        :param windows:     time windows of the test conditions saved in the store, see sequence_windows()
+        :return: list of the result files written, the csv file first
+        """
+        if self.path is not None:
+            files = self.export_mat(filename, windows)
+        else:
+            files = self.export_dataset(filename, index, windows)
+        self.since = time.time()
+        self.path = None
+        for f in files:
+            self.ts.result_file(f)
+        return files
+
+    def export_mat(self, filename, windows=None):
+        name, mrows, ncols, offset = read_mat4_header(self.path)
+        channels = self.channels
+        if channels is None or len(channels) != mrows:
+            if channels is not None:
+                self.ts.log_warning('The waveform has %s signals, %s names given' % (mrows, len(channels)))
+            channels = ['TIME'] + ['CH_%d' % i for i in range(1, mrows)]
+        # column-major (signals x samples) in the file, so the samples are contiguous rows of the memory map
+        data = np.memmap(self.path, dtype='<f8', mode='r', offset=offset, shape=(ncols, mrows))
+        self.ts.log('Processing waveform dataset (%s samples of %s signals)' % (ncols, mrows))
+        chunks = (data[i:i + self.chunk_points] for i in range(0, ncols, self.chunk_points))
+        files = self.write(filename, channels, chunks, windows)
+        del data
+        return files
+
+    def export_dataset(self, filename, index, windows=None):
+        ds = self.daq.waveform_capture_dataset()  # returns list of databases of waveforms (overloaded)
+        self.ts.log('Number of waveforms to save %s' % len(ds))
+        if len(ds) <= index:
+            return []
+        files = []
+        if self.csv:
+            csv_file = filename + '.csv'
+            self.ts.log('Saving file: %s' % csv_file)
+            ds[index].to_csv(self.ts.result_file_path(csv_file))
+            files.append(csv_file)
+        data = np.array(ds[index].data, dtype=float).T
+        chunks = (data[i:i + self.chunk_points] for i in range(0, len(data), self.chunk_points))
+        return files + self.write(filename, list(ds[index].points), chunks, windows, csv=False)
+
+    def write(self, filename, channels, chunks, windows=None, csv=None):
+        csv = self.csv if csv is None else csv
+        store_file = filename + '.wfm'
+        csv_file = filename + '.csv'
+        self.ts.log('Saving file: %s' % store_file)
+        csv_f = open(self.ts.result_file_path(csv_file), 'w') if csv else None
+        try:
+            if csv_f is not None:
+                csv_f.write(','.join(channels) + '\n')
+            with WaveformStore(self.ts.result_file_path(store_file), channels, windows=windows) as store:
+                for chunk in chunks:
+                    store.append(chunk)
+                    if csv_f is not None:
+                        np.savetxt(csv_f, chunk, delimiter=',', fmt='%.10g')
+        finally:
+            if csv_f is not None:
+                csv_f.close()
+        files = [store_file]
+        if csv:
+            files.insert(0, csv_file)
+        return files
+
+
+def sequence_windows(test_sequences_df):
+    """
+    Time windows of the conditions of a ride-through test sequence (VRT_CONDITION, VRT_START_TIMING and
+    VRT_END_TIMING columns for the VRT), in the time base of the simulation
+
+    :param test_sequences_df:   test sequence from set_test_conditions()
+    :return: list of dictionaries with the condition, value, start and end of each window
+    """
+    name = test_sequences_df.columns[0].split('_')[0]
+    return [{'condition': float(row[f'{name}_CONDITION']),
+             'value': float(row[f'{name}_VALUES']),
+             'start': float(row[f'{name}_START_TIMING']),
+             'end': float(row[f'{name}_END_TIMING'])} for _, row in test_sequences_df.iterrows()]
+
+
+class WaveformStore(object):
+    """
+    Compressed, column-oriented storage of a waveform. The file is a zip archive with one deflated .npy member per
+    channel and chunk of samples (<channel>/<chunk>.npy) and a header.json member with the channel names, the time
+    index of the chunks (first and last time of each chunk) and the time windows of the test conditions. A window
+    or a few channels are read by decompressing only the chunks they need.
+
+    Writing:
+        with p1547.WaveformStore(path, ['TIME', 'AC_V_1'], windows=p1547.sequence_windows(df)) as store:
+            store.append(chunk)  # samples x channels
+
+    Reading:
+        store = p1547.WaveformStore(path)
+        df = store.window(2.0, channels=['AC_V_1'])  # pandas DataFrame indexed on TIME
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, channels=None, windows=None, time_channel='TIME'):
+        """
+        :param path:            file of the store
+        :param channels:        names of the channels, None to open an existing store
+        :param windows:         time windows of the test conditions, see sequence_windows()
+        :param time_channel:    name of the channel used for the time index
+        """
+        self.path = path
+        self.zip = None
+        if channels is None:
+            with zipfile.ZipFile(path, 'r') as zf:
+                self.header = json.loads(zf.read('header.json').decode('utf-8'))
+            return
+        if time_channel not in channels:
+            time_channel = channels[0]
+        self.header = {'version': self.VERSION,
+                       'channels': list(channels),
+                       'time_channel': time_channel,
+                       'samples': 0,
+                       'chunks': [],
+                       'windows': windows or []}
+        self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def member(self, channel, chunk):
+        return '%s/%05d.npy' % (channel, chunk)
+
+    def append(self, data):
+        """
+        Add the next chunk of samples
+
+        :param data:    array of samples x channels
+        """
+        data = np.asarray(data, dtype='<f8')
+        if data.ndim != 2 or data.shape[1] != len(self.header['channels']):
+            raise p1547Error('Waveform chunk of shape %s for %s channels' % (data.shape,
+                                                                             len(self.header['channels'])))
+        if len(data) == 0:
+            return
+        n = len(self.header['chunks'])
+        t = data[:, self.header['channels'].index(self.header['time_channel'])]
+        for i, channel in enumerate(self.header['channels']):
+            buf = io.BytesIO()
+            np.save(buf, np.ascontiguousarray(data[:, i]))
+            self.zip.writestr(self.member(channel, n), buf.getvalue())
+        self.header['chunks'].append({'start': self.header['samples'], 'points': len(data),
+                                      't_start': float(t[0]), 't_end': float(t[-1])})
+        self.header['samples'] += len(data)
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.writestr('header.json', json.dumps(self.header, indent=1))
+            self.zip.close()
+            self.zip = None
+
+    @property
+    def channels(self):
+        return self.header['channels']
+
+    @property
+    def windows(self):
+        return self.header['windows']
+
+    def read(self, t_start=None, t_end=None, channels=None):
+        """
+        Read the samples between two times
+
+        :param t_start:     first time, None for the start of the waveform
+        :param t_end:       last time, None for the end of the waveform
+        :param channels:    names of the channels, None for all of them
+        :return: pandas DataFrame indexed on the time channel
+        """
+        t_name = self.header['time_channel']
+        channels = [c for c in (channels or self.channels) if c != t_name]
+        for c in channels:
+            if c not in self.channels:
+                raise p1547Error('No channel %s in the waveform %s' % (c, self.path))
+        # the time index of the chunks gives the chunks to decompress
+        chunks = [n for n, c in enumerate(self.header['chunks'])
+                  if (t_start is None or c['t_end'] >= t_start) and (t_end is None or c['t_start'] <= t_end)]
+        columns = {c: [] for c in [t_name] + channels}
+        with zipfile.ZipFile(self.path, 'r') as zf:
+            for n in chunks:
+                for c in columns:
+                    with zf.open(self.member(c, n)) as f:
+                        columns[c].append(np.load(io.BytesIO(f.read())))
+        data = {c: np.concatenate(v) if v else np.empty(0) for c, v in columns.items()}
+        mask = np.ones(len(data[t_name]), dtype=bool)
+        if t_start is not None:
+            mask &= data[t_name] >= t_start
+        if t_end is not None:
+            mask &= data[t_name] <= t_end
+        return pd.DataFrame({c: data[c][mask] for c in channels}, index=pd.Index(data[t_name][mask], name=t_name))
+
+    def window(self, condition, channels=None):
+        """
+        Read the samples of the windows of a test condition
+
+        :param condition:   test condition (1.0 for A, 2.0 for B, 12.0 for B', ...)
+        :param channels:    names of the channels, None for all of them
+        :return: pandas DataFrame indexed on the time channel
+        """
+        frames = [self.read(w['start'], w['end'], channels) for w in self.windows if w['condition'] == condition]
+        if not frames:
+            raise p1547Error('No window of condition %s in the waveform %s' % (condition, self.path))
+        return pd.concat(frames)
+
+
+"""
+This section is for the ride-through evaluation of the captures
+"""
+
+RT_EVALUATION = 'rt_evaluation.csv'
+
+
+def cycle_rms(t, x, f_nom):
+    """
+    RMS over the last cycle at every sample (trailing window, vectorized with a cumulative sum)
+
+    :param t:       times (s)
+    :param x:       samples x signals
+    :param f_nom:   nominal frequency (Hz)
+    :return: samples x signals
+    """
+    return np.sqrt(cycle_mean(t, np.square(x), f_nom))
+
+
+def cycle_mean(t, x, f_nom):
+    """
+    Mean over the last cycle at every sample (trailing window, vectorized with a cumulative sum). The samples of the
+    first cycle, without a full cycle before them, are nan.
+    """
+    x = np.asarray(x, dtype=float)
+    if len(t) < 2:
+        return np.full(x.shape, np.nan)
+    n = max(int(round(1. / (f_nom * np.median(np.diff(t))))), 1)
+    c = np.concatenate([np.zeros((1,) + x.shape[1:]), np.cumsum(x, axis=0)])
+    mean = np.full(x.shape, np.nan)
+    mean[n - 1:] = (c[n:] - c[:-n]) / n
+    return mean
+
+
+def window_reduce(ufunc, x, starts, ends):
+    """
+    Reduce x over the sample ranges [starts, ends) of all the windows at once. Empty ranges give nan.
+    """
+    x = np.append(np.asarray(x, dtype=float), np.nan)
+    idx = np.ravel(np.column_stack([starts, ends]))
+    out = ufunc.reduceat(x, idx)[::2]
+    out[ends <= starts] = np.nan
+    return out
+
+
+class RideThroughEvaluation(object):
+    """
+    Evaluation of the ride-through captures per test condition. The capture is joined with the windows of the test
+    sequence (see sequence_windows()) and, for every window, computes with vectorized NumPy reductions:
+        I_MIN           minimum cycle RMS current, per unit of the pre-disturbance current (current continuity)
+        CESSATION       the current of every phase dropped below trip_level and came back later in the capture
+                        (momentary cessation, permitted in the permissive operation regions)
+        TRIP            the current of every phase dropped below trip_level and never came back (the EUT tripped)
+        TRIP_TIME       time from the start of the window to the drop of the current (s)
+        P_MIN           minimum cycle average power, per unit of the pre-disturbance power
+        RESTORE_TIME    for the windows in the continuous operation region, time from the start of the window until
+                        the power is back to restore_level of the pre-disturbance power (s)
+    The pre-disturbance current and power are the averages over the second half of the first window.
+
+    A window fails when the EUT tripped, or when the output is not restored within restore_time. Ceasing to energize
+    is not a failure by itself: the restoration is checked in the windows of the continuous operation region.
+    """
+
+    def __init__(self, f_nom=60., continuous=None, trip_level=0.1, restore_level=0.8, restore_time=0.4):
+        """
+        :param f_nom:           nominal frequency (Hz)
+        :param continuous:      (min, max) of the condition values of the continuous operation region, default is
+                                the value of the first window
+        :param trip_level:      current under which the EUT is considered tripped (pu of pre-disturbance current)
+        :param restore_level:   power to restore (pu of pre-disturbance power)
+        :param restore_time:    maximum time to restore the power (s)
+        """
+        self.f_nom = f_nom
+        self.continuous = continuous
+        self.trip_level = trip_level
+        self.restore_level = restore_level
+        self.restore_time = restore_time
+
+    def signals(self, data):
+        """
+        Cycle RMS currents and cycle average total power of a capture
+
+        :param data:    DataFrame indexed on time, with the AC_I_<phase> instantaneous currents (or the AC_IRMS_<phase>
+                        RMS currents) and the AC_P_<phase> powers (or the AC_V_<phase> voltages)
+        :return: (times, currents samples x phases, power)
+        """
+        t = data.index.to_numpy(dtype=float)
+        irms = [c for c in data.columns if re.match(r'^AC_IRMS_\d$', c)]
+        inst = [c for c in data.columns if re.match(r'^AC_I_\d$', c)]
+        if irms:
+            i = data[irms].to_numpy(dtype=float)
+        elif inst:
+            i = cycle_rms(t, data[inst].to_numpy(dtype=float), self.f_nom)
+        else:
+            raise p1547Error('No current in the ride-through capture')
+        p_cols = [c for c in data.columns if re.match(r'^AC_P_\d$', c)]
+        if p_cols:
+            p = data[p_cols].to_numpy(dtype=float).sum(axis=1)
+        else:
+            v = data[[c.replace('I', 'V', 1) for c in inst]].to_numpy(dtype=float)
+            p = (v * data[inst].to_numpy(dtype=float)).sum(axis=1)
+        return t, i, cycle_mean(t, p, self.f_nom)
+
+    def evaluate(self, data, windows):
+        """
+        :param data:    capture, see signals()
+        :param windows: windows of the test conditions, see sequence_windows()
+        :return: DataFrame with a row per window
+        """
+        t, i, p = self.signals(data)
+        starts_t = np.array([w['start'] for w in windows], dtype=float)
+        ends_t = np.array([w['end'] for w in windows], dtype=float)
+        values = np.array([w.get('value', np.nan) for w in windows], dtype=float)
+        starts = np.searchsorted(t, starts_t)
+        ends = np.searchsorted(t, ends_t, side='right')
+
+        ref = slice(np.searchsorted(t, (starts_t[0] + ends_t[0]) / 2.), ends[0])
+        i_ref = np.nanmean(i[ref]) if ref.stop > ref.start else np.nan
+        p_ref = np.nanmean(p[ref]) if ref.stop > ref.start else np.nan
+
+        i_max = np.nanmax(i, axis=1)  # largest phase current
+        i_min = window_reduce(np.fmin, np.nanmin(i, axis=1), starts, ends) / i_ref
+        p_min = window_reduce(np.fmin, p, starts, ends) / p_ref
+
+        # first sample of every window under the trip level / over the restore level
+        samples = np.arange(len(t), dtype=float)
+        first_trip = window_reduce(np.fmin, np.where(i_max < self.trip_level * i_ref, samples, np.inf), starts, ends)
+        first_restore = window_reduce(np.fmin, np.where(p >= self.restore_level * p_ref, samples, np.inf),
+                                      starts, ends)
+        dropped = np.isfinite(first_trip)
+        # the EUT only tripped when it does not energize again until the end of the capture
+        energized = np.flatnonzero(i_max >= self.trip_level * i_ref)
+        last_energized = energized[-1] if len(energized) else -1
+        trip = dropped & (first_trip > last_energized)
+        cessation = dropped & ~trip
+        t_ext = np.append(t, np.nan)
+        trip_time = np.where(dropped, t_ext[np.where(dropped, first_trip, len(t)).astype(int)] - starts_t, np.nan)
+        restored = np.isfinite(first_restore)
+        restore_time = np.where(restored, t_ext[np.where(restored, first_restore, len(t)).astype(int)] - starts_t,
+                                np.nan)
+
+        if self.continuous is not None:
+            recovery = (values >= self.continuous[0]) & (values <= self.continuous[1])
+        else:
+            recovery = np.isclose(values, values[0])
+        recovery[0] = False
+        restore_time[~recovery] = np.nan
+        late = recovery & ~(restore_time <= self.restore_time)
+        captured = ends > starts
+
+        return pd.DataFrame({'CONDITION': [w['condition'] for w in windows],
+                             'VALUE': values,
+                             'START': starts_t,
+                             'END': ends_t,
+                             'I_MIN': i_min,
+                             'CESSATION': cessation,
+                             'TRIP': trip,
+                             'TRIP_TIME': trip_time,
+                             'P_MIN': p_min,
+                             'RESTORE_TIME': restore_time,
+                             'RESULT': np.where(~captured, 'No Data', np.where(trip | late, 'Fail', 'Pass'))})
+
+    def evaluate_store(self, path):
+        """
+        Evaluate a waveform store saved with the windows of its test sequence
+
+        :param path:    .wfm file
+        :return: DataFrame with a row per window
+        """
+        store = WaveformStore(path)
+        if not store.windows:
+            raise p1547Error('No test condition windows in the waveform %s' % path)
+        channels = [c for c in store.channels if re.match(r'^AC_(I|IRMS|P|V)_\d$', c)]
+        return self.evaluate(store.read(channels=channels), store.windows)
+
+    def write(self, ts, test_name, metrics, filename=RT_EVALUATION):
+        """
+        Append the metrics of a test to the evaluation summary of the results
+
+        :param ts:          test script object
+        :param test_name:   name of the test
+        :param metrics:     DataFrame returned by evaluate
+        :param filename:    summary file
+        :return: nothing
+        """
+        path = ts.result_file_path(filename)
+        new = not os.path.exists(path)
+        metrics = metrics.copy()
+        metrics.insert(0, 'TEST', test_name)
+        metrics.to_csv(path, mode='a', header=new, index=False)
+        if new:
+            ts.result_file(filename)
+        failed = metrics[metrics['RESULT'] == 'Fail']
+        ts.log('%s: %s of %s condition windows passed' % (test_name, int((metrics['RESULT'] == 'Pass').sum()),
+                                                          len(metrics)))
+        for _, row in failed.iterrows():
+            ts.log_warning('%s condition %s: tripped %s, restore time %s s' % (test_name, row['CONDITION'],
+                                                                              row['TRIP'], row['RESTORE_TIME']))
+
+
+def evaluate_ride_through(paths, jobs=None, output=None, **kwargs):
+    """
+    Evaluate many waveform stores in parallel, one process per store
+
+    :param paths:   list of .wfm files
+    :param jobs:    number of worker processes, default is the number of cores
+    :param output:  csv file of the merged evaluation (optional)
+    :param kwargs:  options of RideThroughEvaluation
+    :return: DataFrame with a row per window and file, the files that could not be evaluated have a RESULT Error
+    """
+    evaluation = RideThroughEvaluation(**kwargs)
+    frames = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = OrderedDict((path, executor.submit(evaluation.evaluate_store, path)) for path in paths)
+        for path, future in futures.items():
+            try:
+                metrics = future.result()
+            except Exception as e:
+                metrics = pd.DataFrame({'RESULT': ['Error'], 'ERROR': [str(e)]})
+            metrics.insert(0, 'FILE', path)
+            frames.append(metrics)
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if output is not None:
+        merged.to_csv(output, index=False)
+    return merged
+
+
+"""
+This section is for the instrument bring-up of the scripts
+"""
+
+
+def bring_up(ts, devices, overrides=None, max_workers=None):
+    """
+    Initialize the test instruments concurrently. Each instrument starts as soon as the instruments it depends on
+    are up, the independent ones (network and serial handshakes) run at the same time. The init latency of each
+    instrument is logged.
+
+    Example:
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            'pvsim': (lambda chil: pvsim.pvsim_init(ts, support_interfaces={'hil': chil}), ('hil',)),
+            'das': (lambda chil, pv: das.das_init(ts, support_interfaces={'hil': chil, 'pvsim': pv}),
+                    ('hil', 'pvsim'))})
+
+    :param ts:          test script object
+    :param devices:     dictionary of name: (init function, names of the dependencies). The init function is called
+                        with the dependencies in that order.
+    :param overrides:   dictionary of name: object for the instruments that are already available (e.g. virtual
+                        lab), these are not initialized
+    :param max_workers: number of threads, default is one per instrument
+    :return: OrderedDict of name: instrument object, in the order of devices
+    """
+    results = dict(overrides or {})
+    latency = {}
+    pending = OrderedDict((name, spec) for name, spec in devices.items() if name not in results)
+    for name, (init, deps) in pending.items():
+        for dep in deps:
+            if dep not in devices and dep not in results:
+                ts.log_error('Unknown dependency %s of instrument %s' % (dep, name))
+                raise p1547Error('Unknown dependency %s of instrument %s' % (dep, name))
+
+    def run(init, args):
+        start = time.time()
+        obj = init(*args)
+        return obj, time.time() - start
+
+    start = time.time()
+    error = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or max(len(pending), 1)) as executor:
+        running = {}
+        while pending or running:
+            if error is None:
+                for name in [n for n, (init, deps) in pending.items() if all(d in results for d in deps)]:
+                    init, deps = pending.pop(name)
+                    running[executor.submit(run, init, [results[d] for d in deps])] = name
+            else:
+                pending.clear()
+            if not running:
+                if pending:
+                    ts.log_error('Circular dependencies between instruments %s' % ', '.join(pending))
+                    raise p1547Error('Circular dependencies between instruments %s' % ', '.join(pending))
+                break
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name], latency[name] = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = (name, e)
+
+    if error is not None:
+        # close the instruments that came up, the script does not get them
+        for name in latency:
+            if results.get(name) is not None and hasattr(results[name], 'close'):
+                try:
+                    results[name].close()
+                except Exception as e:
+                    ts.log_warning('Could not close %s: %s' % (name, e))
+        ts.log_error('Initialization of %s failed: %s' % error)
+        raise error[1]
+
+    ts.log('Instruments up in %0.2f s (%s)' % (time.time() - start, ', '.join(
+        '%s %0.2f s' % (name, latency[name]) for name in devices if name in latency)))
+    return OrderedDict((name, results.get(name)) for name in devices)
+
+
+def config_hil(chil):
+    """
+    Configure the HIL. Used as the bring_up step the instruments opened through the HIL connection depend on, so
+    they are opened against a configured HIL:
+
+        'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+        'pvsim': (lambda chil, config: pvsim.pvsim_init(ts, support_interfaces={'hil': chil}), ('hil', 'config')),
+
+    :param chil:        HIL object, None without HIL
+    :return: True
+    """
+    if chil is not None:
+        chil.config()
+    return True
+
+
+def power_up(ts, grid=None, pv=None, v_nom=None, p_rated=None, settle=0.):
+    """
+    Turn on the AC and DC sources so the EUT can be initialized. Used as the bring_up step the EUT init depends on,
+    so the EUT communications are only opened once it is powered:
+
+        'power': (lambda pv, daq: p1547.power_up(ts, pv=pv, p_rated=p_rated), ('pvsim', 'das')),
+        'der': (lambda chil, power: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'power'))
+
+    :param ts:          test script object
+    :param grid:        grid simulator object, set to v_nom (None leaves the AC source as it is)
+    :param pv:          PV simulator object, turned on
+    :param v_nom:       grid simulator voltage (V)
+    :param p_rated:     PV simulator power (W), None leaves the power setting as it is
+    :param settle:      time to wait once the sources are on (s)
+    :return: True
+    """
+    # grid simulator is initialized with test parameters and enabled
+    if grid is not None and v_nom is not None:
+        grid.voltage(v_nom)
+    # pv simulator is initialized with test parameters and enabled
+    if pv is not None:
+        if p_rated is not None:
+            pv.power_set(p_rated)
+        pv.power_on()  # Turn on DC so the EUT can be initialized
+    if settle:
+        ts.sleep(settle)
+    return True
+
+
+def wait_eut_startup(ts, read_power, p_start, mra, timeout=120., ramp_time=8., window=2., interval=0.25,
+                     max_interval=0.5):
+    """
+    Wait for the EUT to start and to finish its power ramp. The power is first polled with an interval that doubles
+    from interval to max_interval until it goes above p_start; max_interval is kept short so the start is detected
+    within half a second. The ramp is then complete as soon as the power stays within the MRA over window seconds,
+    or after ramp_time seconds at most.
+
+    The times are counted with ts.sleep, so that they follow the virtual lab clock.
+
+    :param ts:              test script object
+    :param read_power:      function returning the EUT active power (W)
+    :param p_start:         power above which the EUT is started (W)
+    :param mra:             minimum required accuracy of the active power (W)
+    :param timeout:         maximum time to wait for the EUT to start (s)
+    :param ramp_time:       maximum time to wait for the power ramp (s)
+    :param window:          time the power has to be stable for (s)
+    :param interval:        polling interval (s)
+    :param max_interval:    maximum polling interval while waiting for the start (s)
+    :return: dictionary with the start time, ramp time and final power or None if the EUT did not start
+    """
+    power = read_power()
+    elapsed = 0.
+    wait = interval
+    while power <= p_start:
+        if elapsed >= timeout:
+            ts.log_warning('EUT power is %0.1f W after %0.1f s, it did not start' % (power, elapsed))
+            return None
+        ts.log('Inverter power is at %0.1f. Waiting up to %0.1f more seconds or until EUT starts...' %
+               (power, timeout - elapsed))
+        wait = min(wait, timeout - elapsed)
+        ts.sleep(wait)
+        elapsed += wait
+        wait = min(wait * 2., max_interval)
+        power = read_power()
+    start_time = elapsed
+
+    ts.log('Waiting for EUT to ramp up')
+    samples = collections.deque([(0., power)])
+    ramp = 0.
+    while ramp < ramp_time:
+        ts.sleep(interval)
+        ramp += interval
+        power = read_power()
+        samples.append((ramp, power))
+        while samples[0][0] < ramp - window:
+            samples.popleft()
+        values = [p for t, p in samples]
+        if samples[0][0] <= ramp - window and max(values) - min(values) <= mra:
+            break
+    else:
+        ts.log_warning('EUT power not stable within %0.1f W after %0.1f s' % (mra, ramp_time))
+
+    ts.log('EUT started after %0.2f s, power ramp of %0.2f s, power is %0.1f W' % (start_time, ramp, power))
+    return {'start_time': start_time, 'ramp_time': ramp, 'power': power}
+
+
+"""
+This section is for the RLC load balancing and the clearing time search of the unintentional islanding test
+"""
+
+
+def setup_fingerprint(ts, names):
+    """
+    Fingerprint of the test setup, used to only reuse the results kept across runs (e.g. RLC balance, clearing time
+    sweep) with the setup that produced them.
+
+    :param ts:      test script object
+    :param names:   names of the parameters that define the setup, e.g. ['eut.v_nom', 'hil_config.model_name']
+    :return: hexadecimal digest of the parameter values
+    """
+    values = {name: ts.param_value(name) for name in names}
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class RlcBalancer(object):
+    """
+    Adjust the resistor and capacitor settings of the RLC load bank until the utility (S3) active and reactive
+    powers are zero. The sensitivity of the R and C settings to P and Q is learned from the measurements with
+    Broyden updates, each move is a bounded Newton step. The converged settings and sensitivity of each test case
+    are kept in a JSON file, with the fingerprint of the setup, and used as a warm start for the next run with the
+    same setup.
+    """
+
+    def __init__(self, ts, case, cache_file=None, gain=(50.5/11700., 6./1300.), damping=0.5, max_step=5.,
+                 limits=(-100., 100.), fingerprint=None):
+        """
+        :param ts:          test script object
+        :param case:        test case name (e.g. '1A')
+        :param cache_file:  JSON file of the converged settings, None to not keep them
+        :param gain:        initial R and C change per W and var of utility power (% / W, % / var)
+        :param damping:     fraction of the step applied as long as the gain has not been learned
+        :param max_step:    maximum R and C change per iteration (%)
+        :param limits:      minimum and maximum R and C settings (%)
+        :param fingerprint: fingerprint of the test setup, see setup_fingerprint()
+        """
+        self.ts = ts
+        self.case = case
+        self.cache_file = cache_file
+        self.fingerprint = fingerprint
+        self.damping = damping
+        self.max_step = max_step
+        self.limits = limits
+        self.gain = np.diag(gain)
+        self.learned = False
+        self.x = None
+        self.y = None
+        self.iterations = 0
+        self.warm = None
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file) as f:
+                    self.warm = json.load(f).get(case)
+            except (IOError, ValueError) as e:
+                ts.log_warning('Could not read the RLC balance cache %s: %s' % (cache_file, e))
+        if self.warm is not None and self.warm.get('fingerprint') != fingerprint:
+            ts.log_warning('The RLC balance of test %s in %s was made with another setup, it is not used' %
+                           (case, cache_file))
+            self.warm = None
+        if self.warm is not None:
+            self.gain = np.array(self.warm['gain'])
+            self.learned = True
+
+    def start(self, r, l, c):
+        """
+        :param r:   resistor setting (%)
+        :param l:   inductor setting (%)
+        :param c:   capacitor setting (%)
+        :return: R, L, C settings to start from, the converged ones of the last run of the test case if known
+        """
+        if self.warm is None:
+            return r, l, c
+        self.ts.log('Starting the RLC balance of test %s from RLC = [%0.3f, %0.3f, %0.3f]%%' %
+                    (self.case, self.warm['r'], self.warm['l'], self.warm['c']))
+        return self.warm['r'], self.warm['l'], self.warm['c']
+
+    def update(self, p_utility, q_utility, r, l, c):
+        """
+        :param p_utility:   utility/source active power in watts
+        :param q_utility:   utility/source reactive power in var
+        :param r:           resistor setting the powers were measured with (%)
+        :param l:           inductor setting (%)
+        :param c:           capacitor setting (%)
+        :return: next R, L, C settings
+        """
+        x = np.array([r, c], dtype=float)
+        y = np.array([p_utility, q_utility], dtype=float)
+        if self.x is not None:
+            dx = x - self.x
+            dy = y - self.y
+            dy2 = dy.dot(dy)
+            # the settings give dy = J.dx and the gain is -J^-1, secant (Broyden) update of the gain
+            if dy2 > 0. and np.abs(dx).max() > 1e-9:
+                self.gain = self.gain + np.outer(-dx - self.gain.dot(dy), dy) / dy2
+                self.learned = True
+        self.x = x
+        self.y = y
+        self.iterations += 1
+
+        step = self.gain.dot(y)
+        if not self.learned:
+            step = step * self.damping
+        largest = np.abs(step).max()
+        if largest > self.max_step:
+            step = step * (self.max_step / largest)
+        r_new, c_new = np.clip(x + step, self.limits[0], self.limits[1])
+        return float(r_new), l, float(c_new)
+
+    def converged(self, r, l, c):
+        """
+        Keep the converged settings of the test case as the warm start of the next run
+
+        :param r:   resistor setting (%)
+        :param l:   inductor setting (%)
+        :param c:   capacitor setting (%)
+        """
+        self.ts.log('RLC balance of test %s converged in %s iterations, RLC = [%0.3f, %0.3f, %0.3f]%%' %
+                    (self.case, self.iterations, r, l, c))
+        if self.cache_file is None:
+            return
+        cache = {}
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file) as f:
+                    cache = json.load(f)
+            except (IOError, ValueError):
+                cache = {}
+        cache[self.case] = {'r': r, 'l': l, 'c': c, 'gain': self.gain.tolist(), 'fingerprint': self.fingerprint}
+        with open(self.cache_file, 'w') as f:
+            json.dump(cache, f, indent=2)
+
+
+class ClearingTimeSearch(object):
+    """
+    Schedule the clearing time trials of the reactive load sweep of the unintentional islanding test (e.g. step e)4)
+    of IEEE 1547.1 5.10.3). The trials stay on the 1% grid from 95% to 105% of the balanced reactive load, but they
+    are run peak-first: from the balanced point towards the longest clearing time. The grid is extended past 95% or
+    105% while the clearing times are still increasing.
+
+    The sweep stops as soon as three trials had an island frequency above nominal and three had it below, in which
+    case the remaining steps and the repeats of step e)5) may be omitted. The trip times are kept in a JSON file
+    so that an interrupted sweep resumes where it stopped. The sweep is only resumed with the same setup
+    fingerprint, and the result rows of the resumed trials point to the results directory of the run that made them.
+    """
+
+    def __init__(self, ts, case, state_file=None, q_low=0.95, q_high=1.05, step=0.01, limits=(0.8, 1.2),
+                 n_freq=3, n_repeat=2, fingerprint=None):
+        """
+        :param ts:          test script object
+        :param case:        test case name (e.g. '1A')
+        :param state_file:  JSON file of the sweep state, None to not keep it
+        :param q_low:       lowest reactive load of the sweep (pu of the balanced load)
+        :param q_high:      highest reactive load of the sweep (pu of the balanced load)
+        :param step:        reactive load increment (pu)
+        :param limits:      lowest and highest reactive load when the sweep is extended (pu)
+        :param n_freq:      number of high and low island frequency trials for the early stop
+        :param n_repeat:    number of additional iterations of the longest clearing times
+        :param fingerprint: fingerprint of the test setup, see setup_fingerprint()
+        """
+        self.ts = ts
+        self.case = case
+        self.state_file = state_file
+        self.fingerprint = fingerprint
+        self.q_low = q_low
+        self.q_high = q_high
+        self.step = step
+        self.limits = limits
+        self.n_freq = n_freq
+        self.n_repeat = n_repeat
+        self.t_trips = {}
+        self.high_freq = {}
+        self.repeats_done = {}
+        # result rows of the trials, with the results directory of the run that made them
+        self.rows = []
+        self.resumed = []
+        if state_file is not None and os.path.exists(state_file):
+            try:
+                with open(state_file) as f:
+                    state = json.load(f)
+            except (IOError, ValueError) as e:
+                ts.log_warning('Could not read the clearing time sweep state %s: %s' % (state_file, e))
+                state = None
+            if state is not None and state.get('case') == case:
+                if state.get('fingerprint') != fingerprint:
+                    ts.log_warning('The clearing time sweep state %s of test %s was made with another setup, the '
+                                   'sweep starts over' % (state_file, case))
+                else:
+                    self.t_trips = {float(q): t for q, t in state['t_trips'].items()}
+                    self.high_freq = {float(q): h for q, h in state['high_freq'].items()}
+                    self.repeats_done = {float(q): t for q, t in state['repeats'].items()}
+                    self.rows = state.get('rows', [])
+                    self.resumed = list(self.rows)
+                    ts.log('Resuming the clearing time sweep of test %s after %s trials' % (case, self.trials()))
+
+    def q(self, index):
+        return round(1. + index * self.step, 4)
+
+    def index(self, q):
+        return int(round((q - 1.) / self.step))
+
+    def trials(self):
+        return len(self.t_trips) + sum(len(t) for t in self.repeats_done.values())
+
+    def peak(self):
+        """
+        :return: reactive load of the longest clearing time so far
+        """
+        return max(self.t_trips, key=lambda q: (self.t_trips[q], -abs(q - 1.)))
+
+    def early_stop(self):
+        """
+        :return: True when three trials had an island frequency above nominal and three below
+        """
+        high = sum(1 for h in self.high_freq.values() if h)
+        return high >= self.n_freq and len(self.high_freq) - high >= self.n_freq
+
+    def grid(self):
+        """
+        :return: reactive loads of the sweep, extended at the edges while the clearing times are still increasing
+        """
+        low = self.index(self.q_low)
+        high = self.index(self.q_high)
+        t = {self.index(q): v for q, v in self.t_trips.items()}
+        while low in t and low + 1 in t and t[low] > t[low + 1] and self.q(low - 1) >= self.limits[0]:
+            low -= 1
+        while high in t and high - 1 in t and t[high] > t[high - 1] and self.q(high + 1) <= self.limits[1]:
+            high += 1
+        return [self.q(i) for i in range(low, high + 1)]
+
+    def next(self):
+        """
+        :return: next reactive load to test (pu of the balanced load) or None when the sweep is complete
+        """
+        if self.early_stop():
+            return None
+        todo = [q for q in self.grid() if q not in self.t_trips]
+        if not todo:
+            return None
+        if not self.t_trips:
+            return min(todo, key=lambda q: abs(q - 1.))
+        peak = self.peak()
+        return min(todo, key=lambda q: (abs(q - peak), q))
+
+    def resumed_rows(self):
+        """
+        :return: result rows of the trials of the previous runs, with the waveform file prefixed by the results
+                 directory of the run that made it
+        """
+        return [[row[0], os.path.join(results_dir, row[1]) if row[1] else row[1]] + row[2:]
+                for results_dir, row in self.resumed]
+
+    def _row(self, row):
+        if row is not None:
+            self.rows.append([self.ts.results_dir(), list(row)])
+
+    def record(self, q, t_trip, freq, f_nom, row=None):
+        """
+        :param q:       reactive load of the trial (pu of the balanced load)
+        :param t_trip:  clearing time (s)
+        :param freq:    island frequency (Hz)
+        :param f_nom:   nominal frequency (Hz)
+        :param row:     result row of the trial (test, waveform file, reactive load, clearing time)
+        """
+        q = round(q, 4)
+        self.t_trips[q] = t_trip
+        self.high_freq[q] = freq > f_nom
+        self._row(row)
+        self.save()
+
+    def repeats(self):
+        """
+        Step e)5): the settings of the three longest clearing times, and all the settings in between when they are
+        not consecutive, are tested twice more.
+
+        :return: list of (reactive load, iteration) still to run, empty after an early stop
+        """
+        if self.early_stop() or not self.t_trips:
+            return []
+        longest = sorted(self.t_trips, key=lambda q: self.t_trips[q], reverse=True)[:3]
+        span = [self.q(i) for i in range(self.index(min(longest)), self.index(max(longest)) + 1)]
+        return [(q, n + 1) for q in span for n in range(len(self.repeats_done.get(q, [])), self.n_repeat)]
+
+    def record_repeat(self, q, t_trip, row=None):
+        """
+        :param q:       reactive load of the trial (pu of the balanced load)
+        :param t_trip:  clearing time (s)
+        :param row:     result row of the trial (test, waveform file, reactive load, clearing time)
+        """
+        self.repeats_done.setdefault(round(q, 4), []).append(t_trip)
+        self._row(row)
+        self.save()
+
+    def save(self):
+        if self.state_file is None:
+            return
+        state = {'case': self.case,
+                 'fingerprint': self.fingerprint,
+                 't_trips': {str(q): t for q, t in self.t_trips.items()},
+                 'high_freq': {str(q): h for q, h in self.high_freq.items()},
+                 'repeats': {str(q): t for q, t in self.repeats_done.items()},
+                 'rows': self.rows}
+        with open(self.state_file + '.tmp', 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(self.state_file + '.tmp', self.state_file)
+
+    def complete(self):
+        """
+        Log the sweep and remove its state, the next run of the test case starts a new sweep
+        """
+        self.ts.log('Clearing time sweep of test %s complete after %s trials%s, longest clearing time %0.3f s at '
+                    '%0.2f pu' % (self.case, self.trials(), ' (early stop)' if self.early_stop() else '',
+                                  self.t_trips[self.peak()], self.peak()) if self.t_trips else
+                    'Clearing time sweep of test %s complete' % self.case)
+        if self.state_file is not None and os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+
+"""
+This section is for the virtual lab used to run the scripts without hardware
+"""
+
+
+class SimulatedClock(object):
+    """
+    Simulated time of the virtual lab. The time only moves forward when sleep() is called, so a run is
+    deterministic, and sleep() only waits 1/speed of the requested time.
+    """
+
+    def __init__(self, speed=100.0):
+        self.speed = float(speed)
+        self.t = 0.0
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds):
+        seconds = max(float(seconds), 0.0)
+        if self.speed > 0:
+            time.sleep(seconds / self.speed)
+        self.t += seconds
+
+
+class SimulatedEut(object):
+    """
+    EUT with a first-order open-loop response. After each change of its inputs or settings the active and reactive
+    powers move to the target of the enabled functions and reach 90% of the step after response*tr seconds.
+    The characteristics are built from the settings written by the test script, so a wrong setting shows up in the
+    evaluation. As in the library characteristics, the VV, VW and WV outputs are scaled by the power level of the
+    PV array.
+    """
+    FUNCTIONS = ['volt_var', 'volt_watt', 'watt_var', 'freq_watt', 'fixed_pf', 'reactive_power', 'limit_max_power']
+    # units of the curve points written by the scripts run in the virtual lab: p.u. (1) or percent (100)
+    CURVE_UNITS = {'Volt-Var': 1., 'Volt-Watt': 1., 'Limit Active Power': 1., 'Watt-Var': 100.}
+
+    def __init__(self, lab, response=0.5):
+        self.lab = lab
+        self.response = response
+        self.settings = {name: {'Ena': False} for name in self.FUNCTIONS}
+        now = lab.clock.now()
+        self.outputs = {'P': [now, lab.p_rated, lab.p_rated, 0.0], 'Q': [now, 0.0, 0.0, 0.0]}
+
+    def _setting(self, name, params):
+        if params is not None:
+            self.settings[name].update(params)
+            self.update()
+        return dict(self.settings[name])
+
+    def enabled(self, name):
+        settings = self.settings[name]
+        return bool(settings.get('Ena') or settings.get('MaxLimWEna'))
+
+    def volt_var(self, params=None):
+        return self._setting('volt_var', params)
+
+    def volt_watt(self, params=None):
+        return self._setting('volt_watt', params)
+
+    def watt_var(self, params=None):
+        return self._setting('watt_var', params)
+
+    def freq_watt(self, params=None):
+        return self._setting('freq_watt', params)
+
+    def fixed_pf(self, params=None):
+        return self._setting('fixed_pf', params)
+
+    def reactive_power(self, params=None):
+        return self._setting('reactive_power', params)
+
+    def limit_max_power(self, params=None):
+        return self._setting('limit_max_power', params)
+
+    def deactivate_all_fct(self):
+        for name in self.FUNCTIONS:
+            self.settings[name]['Ena'] = False
+            self.settings[name].pop('MaxLimWEna', None)
+        self.update()
+
+    def power_limit(self):
+        settings = self.settings['limit_max_power']
+        if not self.enabled('limit_max_power'):
+            return None
+        if settings.get('MaxLimW') is not None:
+            return float(settings['MaxLimW'])
+        pct = settings.get('MaxLimW_PCT', settings.get('WMaxPct'))
+        if pct is not None:
+            return float(pct) / 100. * self.lab.p_rated
+        return None
+
+    def points(self, values, base):
+        """
+        :param values:  curve points in the units the test script writes them in, see CURVE_UNITS
+        :param base:    base of the points
+        :return: array of the points in the units of base
+        """
+        script_name = self.lab.active_function.script_name
+        if script_name not in self.CURVE_UNITS:
+            raise p1547Error('Virtual lab EUT: the units of the curve points of the %s script are not known' %
+                             script_name)
+        return np.array(values, dtype=float) / self.CURVE_UNITS[script_name] * base
+
+    def characteristic(self, name, x_key, y_keys, x_base, y_base):
+        """
+        Characteristic of a function from the curve points of its settings
+
+        :param name:    function name (e.g. 'volt_var')
+        :param x_key:   key of the X points in the 'curve' settings
+        :param y_keys:  possible keys of the Y points in the 'curve' settings
+        :param x_base:  base of the X points
+        :param y_base:  base of the Y points
+        :return: PiecewiseLinearCurve object
+        """
+        curve = self.settings[name].get('curve')
+        if not isinstance(curve, dict) or curve.get(x_key) is None:
+            raise p1547Error('Virtual lab EUT: %s is enabled without curve points' % name)
+        y = next((curve[key] for key in y_keys if curve.get(key) is not None), None)
+        if y is None:
+            raise p1547Error('Virtual lab EUT: %s is enabled without curve points' % name)
+        return PiecewiseLinearCurve(self.points(curve[x_key], x_base), self.points(y, y_base),
+                                    scale=self.lab.pv.level())
+
+    def targets(self):
+        """
+        :return: tuple (P, Q) steady-state targets for the present grid, PV and settings
+        """
+        lab = self.lab
+        v = float(np.mean(lab.grid.v))
+        f = lab.grid.f
+        p = lab.pv.available()
+        p_limit = self.power_limit()
+        if p_limit is not None:
+            p = min(p, p_limit)
+        if self.enabled('volt_watt'):
+            p = self.characteristic('volt_watt', 'v', ['w'], lab.v_nom, lab.p_rated)(v)
+        if self.enabled('freq_watt'):
+            settings = self.settings['freq_watt']
+            if settings.get('dbf') is None or settings.get('kof') is None:
+                raise p1547Error('Virtual lab EUT: freq_watt is enabled without dbf and kof')
+            p = FrequencyWattCurve(lab.f_nom, float(settings['dbf']), float(settings['kof']), lab.p_rated,
+                                   lab.p_min, pwr=lab.pv.level())(f)
+
+        q = 0.0
+        if self.enabled('volt_var'):
+            # the reactive power points are in percent of var_rated with the Q_MAX_PCT reference, of s_rated otherwise
+            curve = self.settings['volt_var'].get('curve') or {}
+            q_base = lab.var_rated if curve.get('DeptRef') == 'Q_MAX_PCT' else lab.s_rated
+            q = self.characteristic('volt_var', 'v', ['var', 'q'], lab.v_nom, q_base)(v)
+        elif self.enabled('watt_var'):
+            q = self.characteristic('watt_var', 'w', ['var', 'q'], lab.p_rated, lab.var_rated)(p)
+        elif self.enabled('fixed_pf') and self.settings['fixed_pf'].get('PF'):
+            pf = float(self.settings['fixed_pf']['PF'])
+            q = math.sqrt(pow(p, 2) * ((1 / pow(pf, 2)) - 1))
+        elif self.enabled('reactive_power'):
+            q = float(self.settings['reactive_power'].get('Q', 0.0))
+        return p, q
+
+    def value(self, name, t=None):
+        t0, y0, y_ss, tau = self.outputs[name]
+        if t is None:
+            t = self.lab.clock.now()
+        if tau <= 0:
+            return y_ss
+        return y_ss + (y0 - y_ss) * math.exp(-(t - t0) / tau)
+
+    def update(self):
+        """
+        Start a new response from the present outputs toward the new targets
+        """
+        now = self.lab.clock.now()
+        tr = getattr(self.lab.active_function, 'tr', None) or 1.0
+        tau = self.response * tr / -math.log(0.1)
+        for name, y_ss in zip(('P', 'Q'), self.targets()):
+            self.outputs[name] = [now, self.value(name, now), y_ss, tau]
+
+    def measurements(self):
+        return {'W': self.value('P'), 'VAr': self.value('Q'), 'V': float(np.mean(self.lab.grid.v)),
+                'Hz': self.lab.grid.f}
+
+    def info(self):
+        return 'Virtual lab EUT'
+
+    def config(self):
+        pass
+
+    def connect(self, params=None):
+        pass
+
+    def autonomous_vref_adjustment(self, params=None):
+        pass
+
+    def vrt_stay_connected_high(self, params=None):
+        pass
+
+    def vrt_stay_connected_low(self, params=None):
+        pass
+
+    def frt_stay_connected_high(self, params=None):
+        pass
+
+    def frt_stay_connected_low(self, params=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class SimulatedGrid(object):
+    """
+    AC test source of the virtual lab
+    """
+
+    def __init__(self, lab):
+        self.lab = lab
+        self.v = [lab.v_nom] * lab.n_phases
+        self.f = lab.f_nom
+
+    def voltage(self, voltage=None):
+        if voltage is not None:
+            if isinstance(voltage, (list, tuple)):
+                self.v = [float(v) for v in voltage][:self.lab.n_phases]
+            else:
+                self.v = [float(voltage)] * self.lab.n_phases
+            self.lab.eut.update()
+        return self.v
+
+    def freq(self, freq=None):
+        if freq is not None:
+            self.f = float(freq)
+            self.lab.eut.update()
+        return self.f
+
+    def config_asymmetric_phase_angles(self, mag=None, angle=None):
+        if mag is not None:
+            self.voltage(list(mag))
+
+    def rocof(self, param=None):
+        pass
+
+    def config(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SimulatedPv(object):
+    """
+    PV simulator of the virtual lab
+    """
+
+    def __init__(self, lab):
+        self.lab = lab
+        self.pmp = lab.p_rated
+        self.rating = lab.p_rated
+        self.irr = 1000.
+
+    def available(self):
+        return self.pmp * self.irr / 1000.
+
+    def level(self):
+        """
+        :return: power level of the PV array in p.u., set by the I-V curve configuration
+        """
+        return self.rating / self.lab.p_rated
+
+    def iv_curve_config(self, pmp, vmp=None):
+        self.pmp = float(pmp)
+        self.rating = float(pmp)
+        self.lab.eut.update()
+
+    def irradiance_set(self, irradiance=1000.):
+        self.irr = float(irradiance)
+        self.lab.eut.update()
+
+    def power_set(self, power):
+        self.pmp = float(power)
+        self.lab.eut.update()
+
+    def power_on(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SimulatedDataset(object):
+    """
+    Data captured by the virtual lab DAQ, column oriented like the svpelab dataset
+    """
+
+    def __init__(self, points, data):
+        self.points = points
+        self.data = data
+
+    def to_csv(self, filename):
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.points)
+            writer.writerows(zip(*self.data))
+
+
+class SimulatedDaq(object):
+    """
+    Data acquisition of the virtual lab. The samples are read from the EUT and grid models at the simulated time.
+    """
+
+    def __init__(self, lab, sc_points=None):
+        self.lab = lab
+        self.sc = OrderedDict((point, None) for point in (sc_points or []))
+        self.capturing = False
+        self.rows = []
+
+    def data_capture(self, enable=True):
+        if enable:
+            self.rows = []
+        self.capturing = enable
+
+    def data_capture_read(self):
+        return self.lab.read()
+
+    def data_read(self):
+        return self.lab.read()
+
+    def data_sample(self):
+        if self.capturing:
+            data = self.lab.read()
+            self.rows.append((data, dict(self.sc)))
+
+    def data_capture_dataset(self):
+        if not self.rows:
+            return SimulatedDataset([], [])
+        channels = list(self.rows[0][0].keys())
+        sc_points = list(self.sc.keys())
+        points = channels + sc_points
+        data = [[row[0].get(c) for row in self.rows] for c in channels]
+        data += [[row[1].get(p) for row in self.rows] for p in sc_points]
+        return SimulatedDataset(points, data)
+
+    def set_dc_measurement(self, pv=None):
+        pass
+
+    def info(self):
+        return 'Virtual lab DAQ'
+
+    def close(self):
+        self.capturing = False
+
+
+class VirtualLab(object):
+    """
+    Grid simulator, PV simulator, EUT and DAQ models sharing a simulated clock. The test script sleeps are
+    redirected to the simulated clock.
+    """
+
+    def __init__(self, ts, active_function, speed=100.0, response=0.5):
+        """
+        :param ts:                  test script object
+        :param active_function:     ActiveFunction object of the test script
+        :param speed:               simulated time / real time
+        :param response:            EUT response time as a fraction of the Tr of the test
+        """
+        self.ts = ts
+        self.active_function = active_function
+        self.v_nom = active_function.v_nom
+        self.f_nom = active_function.f_nom
+        self.p_rated = active_function.p_rated
+        self.p_min = getattr(active_function, 'p_min', None) or 0.0
+        self.s_rated = getattr(active_function, 's_rated', None) or self.p_rated
+        self.var_rated = getattr(active_function, 'var_rated', None) or self.s_rated
+        self.n_phases = {'single phase': 1, 'split phase': 2}.get(str(active_function.phases).lower(), 3)
+        self.clock = SimulatedClock(speed)
+        self.eut = SimulatedEut(self, response)
+        self.grid = SimulatedGrid(self)
+        self.pv = SimulatedPv(self)
+        self.eut.update()
+        self.daq = SimulatedDaq(self, active_function.get_sc_points()['sc'])
+        ts.sleep = self.clock.sleep
+
+    def devices(self):
+        """
+        :return: simulated instruments by the names used with bring_up
+        """
+        return {'pvsim': self.pv, 'das': self.daq, 'der': self.eut, 'gridsim': self.grid}
+
+    def read(self):
+        """
+        :return: dictionary of the DAQ channels at the present simulated time
+        """
+        n = self.n_phases
+        p = self.eut.value('P') / n
+        q = self.eut.value('Q') / n
+        s = math.sqrt(p * p + q * q)
+        data = OrderedDict([('TIME', self.clock.now())])
+        for ph in range(1, n + 1):
+            v = self.grid.v[ph - 1]
+            data['AC_VRMS_%d' % ph] = v
+            data['AC_IRMS_%d' % ph] = s / v if v else 0.0
+            data['AC_P_%d' % ph] = p
+            data['AC_Q_%d' % ph] = q
+            data['AC_S_%d' % ph] = s
+            data['AC_PF_%d' % ph] = p / s if s else 1.0
+            data['AC_FREQ_%d' % ph] = self.grid.f
+        return data
+
+
+def virtual_lab_init(ts, active_function):
+    """
+    Create the virtual lab when it is enabled in the P1547 library options. The time responses are then
+    captured in streaming mode on the simulated clock.
+
+    :param ts:                  test script object
+    :param active_function:     ActiveFunction object of the test script
+    :return: VirtualLab object or None
+    """
+    if ts.param_value('p1547.virtual_lab') != 'Enabled':
+        return None
+    speed = ts.param_value('p1547.virtual_lab_speed') or 100.0
+    response = ts.param_value('p1547.virtual_lab_response') or 0.5
+    lab = VirtualLab(ts, active_function, speed=speed, response=response)
+    active_function.set_capture_mode(STREAMING_CAPTURE)
+    ts.log('Virtual lab enabled, simulated time runs %sx faster than real time' % speed)
+    return lab
+
+
+"""
+This section is for the offline re-evaluation of saved results
+"""
+
+
+def read_test_config(config_file):
+    """
+    Read the parameters of a SVP test configuration file (.tst). As in the SVP, the parameters that are not in the
+    file take the default value declared by the script, when the script is found in a Scripts directory above the
+    configuration.
+
+    :param config_file:     path of the .tst file
+    :return: tuple (script name, OrderedDict of parameter values)
+    """
+    try:
+        root = ET.parse(config_file).getroot()
+    except (ET.ParseError, OSError) as e:
+        raise p1547Error(f'Unable to read test configuration {config_file}: {e}')
+
+    script = root.get('script')
+    params = OrderedDict()
+    script_file = find_script(script, os.path.dirname(os.path.abspath(config_file)))
+    if script_file is not None:
+        params.update(read_script_defaults(script_file))
+    params.update(read_config_params(root))
+    return script, params
+
+
+def find_script(script, start_dir):
+    """
+    :param script:      script name
+    :param start_dir:   directory where the search starts, then its parents
+    :return: path of Scripts/<script>.py in start_dir or one of its parents, None if not found
+    """
+    if not script:
+        return None
+    directory = start_dir
+    while True:
+        script_file = os.path.join(directory, 'Scripts', script + '.py')
+        if os.path.isfile(script_file):
+            return script_file
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+@functools.lru_cache(maxsize=None)
+def read_script_defaults(script_file):
+    """
+    Default values of the info.param declarations of a SVP script. The source is parsed instead of imported, so the
+    SVP and the drivers imported by the script are not needed. Defaults that are not literals (or module constants)
+    are skipped.
+
+    :param script_file: path of the script
+    :return: dictionary of parameter name: default value
+    """
+    try:
+        with open(script_file) as f:
+            tree = ast.parse(f.read(), filename=script_file)
+    except (OSError, SyntaxError, ValueError) as e:
+        raise p1547Error(f'Unable to read script {script_file}: {e}')
+
+    def literal(node):
+        return ast.literal_eval(node)
+
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            try:
+                constants[node.targets[0].id] = literal(node.value)
+            except (ValueError, TypeError, SyntaxError):
+                pass
+
+    defaults = {}
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'param' and
+                isinstance(node.func.value, ast.Name) and node.func.value.id == 'info' and node.args and
+                isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            continue
+        for keyword in node.keywords:
+            if keyword.arg != 'default':
+                continue
+            if isinstance(keyword.value, ast.Name) and keyword.value.id in constants:
+                defaults[node.args[0].value] = constants[keyword.value.id]
+            else:
+                try:
+                    defaults[node.args[0].value] = literal(keyword.value)
+                except (ValueError, TypeError, SyntaxError):
+                    pass
+    return defaults
+
+
+def read_config_params(element):
+    """
+    Read the <param> elements of a SVP configuration element
+
+    :param element:     XML element containing the parameters
+    :return: OrderedDict of parameter values converted to their type
+    """
+    params = OrderedDict()
+    if element is None:
+        return params
+    for param in element.iter('param'):
+        value = param.text
+        if value is not None:
+            if param.get('type') == 'float':
+                value = float(value)
+            elif param.get('type') == 'int':
+                value = int(value)
+        params[param.get('name')] = value
+    return params
+
+
+def write_test_config(config_file, name, script, params):
+    """
+    Write a SVP test configuration file (.tst)
+
+    :param config_file:     path of the .tst file
+    :param name:            test configuration name
+    :param script:          script name
+    :param params:          dictionary of parameter values
+    """
+    root = ET.Element('scriptConfig', name=name, script=script)
+    params_element = ET.SubElement(root, 'params')
+    for param_name, value in params.items():
+        if isinstance(value, float):
+            param_type = 'float'
+        elif isinstance(value, int) and not isinstance(value, bool):
+            param_type = 'int'
+        else:
+            param_type = 'string'
+        param = ET.SubElement(params_element, 'param', name=param_name, type=param_type)
+        if value is not None:
+            param.text = str(value)
+    ET.ElementTree(root).write(config_file)
+
+
+class OfflineTestScript(object):
+    """
+    Stand-in for the SVP test script object (ts) built from a .tst configuration. It lets the library
+    classes be instantiated without the SVP and without hardware. The log messages are kept in messages, the errors
+    (and all the messages when verbose) are also printed on stderr so they don't mix with the output of main().
+    """
+
+    def __init__(self, params=None, results_dir=None, verbose=False):
+        self.params = OrderedDict(params or {})
+        self._results_dir = results_dir
+        self.verbose = verbose
+        self.messages = []
+
+    def param_value(self, name):
+        return self.params.get(name)
+
+    def _log(self, level, message):
+        self.messages.append((level, message))
+        if self.verbose or level == 'ERROR':
+            print(f'{level}: {message}', file=sys.stderr)
+
+    def log(self, message):
+        self._log('INFO', message)
+
+    def log_debug(self, message):
+        if self.verbose:
+            self._log('DEBUG', message)
+
+    def log_warning(self, message):
+        self._log('WARNING', message)
+
+    def log_error(self, message):
+        self._log('ERROR', message)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def results_dir(self):
+        return self._results_dir
+
+    def result_file_path(self, filename):
+        return os.path.join(self._results_dir, filename)
+
+
+# Scripts that can be graded offline. 'tr' is the response time parameter of the script and 'filename'
+# matches the dataset names written by the script to get the curve and power level of each dataset.
+REGRADE_SCRIPTS = {
+    VV: {'functions': [VV], 'script_name': 'Volt-Var', 'tr': 'vv.test_{curve}_t_r',
+         'filename': r'^VV_(?P<curve>\d+)_PWR_(?P<pwr>\d+)', 'pwr_scale': 0.01},
+    VW: {'functions': [VW], 'script_name': 'Volt-Watt', 'tr': 'vw.test_{curve}_tr',
+         'filename': r'^VW_(?P<curve>\d+)_PWR_(?P<pwr>[\d.]+)', 'pwr_scale': 1.0},
+    FW: {'functions': [FW], 'script_name': 'Frequency-Watt', 'tr': 'fw.test_{curve}_tr',
+         'filename': r'^FW_(?P<curve>\d+)_PWR_(?P<pwr>[\d.]+)', 'pwr_scale': 1.0},
+    WV: {'functions': [WV], 'script_name': 'Watt-Var', 'tr': 'eut_wv.test_{curve}_t_r',
+         'filename': r'^WV_(?P<curve>\d+)_PWR_(?P<pwr>\d+)', 'pwr_scale': 0.01},
+    CPF: {'functions': [CPF], 'script_name': 'Constant Power Factor', 'tr': 'cpf.pf_response_time',
+          'filename': None, 'pwr_scale': 1.0},
+    CRP: {'functions': [CRP], 'script_name': 'Constant Reactive Power', 'tr': 'crp.crp_response_time',
+          'filename': None, 'pwr_scale': 1.0},
+}
+RESULT_SUMMARY = 'result_summary.csv'
+REGRADED_SUMMARY = 'result_summary_regraded.csv'
+VERDICT_COLUMNS = ['90%_BY_TR=1', 'WITHIN_BOUNDS_BY_TR=1', 'WITHIN_BOUNDS_BY_LAST_TR']
+
+
+def get_dataset_tr_values(active_function, dataset, step, meas_value):
+    """
+    Recover the values used by record_timeresponse from a saved dataset. The EVENT soft channel is
+    set to '<step>_TR_<i>' right after the Tr_i sample, so that sample is the row preceding the first
+    row labelled with it. The initial value is the last row recorded one Tr before the Tr_1 sample.
+
+    :param active_function: ActiveFunction object configured for the dataset
+    :param dataset:         DataFrame read from the dataset csv file
+    :param step:            step label (e.g. "Step G")
+    :param meas_value:      measurement (e.g. 'Q')
+    :return: tuple (initial value, value at first Tr, value at last Tr)
+    """
+    if dataset is None or 'EVENT' not in dataset:
+        return np.nan, np.nan, np.nan
+    events = dataset['EVENT'].astype(str).to_numpy()
+    totals = active_function.get_dataset_measurement_total(dataset, meas_value)
+
+    def tr_row(tr_iter):
+        rows = np.flatnonzero(events == f'{step}_TR_{tr_iter}')
+        if len(rows) == 0 or rows[0] == 0:
+            return None
+        return rows[0] - 1
+
+    first = tr_row(1)
+    last = tr_row(active_function.n_tr)
+    y_initial = np.nan
+    if first is not None and 'TIME' in dataset:
+        times = dataset['TIME'].to_numpy(dtype=float)
+        initial = int(np.searchsorted(times, times[first] - active_function.tr, side='right')) - 1
+        y_initial = totals[max(initial, 0)]
+    return (y_initial,
+            totals[first] if first is not None else np.nan,
+            totals[last] if last is not None else np.nan)
+
+
+def regrade_result_dir(result_dir, config_file=None, output=REGRADED_SUMMARY, verbose=False):
+    """
+    Grade again the steps of a finished test from its result_summary.csv and dataset files
+
+    :param result_dir:      directory containing result_summary.csv and the dataset csv files
+    :param config_file:     .tst configuration of the test, default is the .tst file of result_dir
+    :param output:          name of the regraded summary written in result_dir (None to skip)
+    :param verbose:         print the library log messages
+    :return: DataFrame of the regraded summary with the original verdicts in ORIGINAL_* columns
+    """
+    if config_file is None:
+        configs = glob.glob(os.path.join(result_dir, '*.tst'))
+        if len(configs) != 1:
+            raise p1547Error(f'Expected one .tst configuration in {result_dir}, found {len(configs)}')
+        config_file = configs[0]
+
+    script, params = read_test_config(config_file)
+    if script not in REGRADE_SCRIPTS:
+        raise p1547Error(f'Offline re-evaluation is not available for the {script} script')
+    setup = REGRADE_SCRIPTS[script]
+
+    ts = OfflineTestScript(params=params, results_dir=result_dir, verbose=verbose)
+    active_function = ActiveFunction(ts=ts, script_name=setup['script_name'], functions=setup['functions'],
+                                     criteria_mode=[True, True, True])
+    y = list(active_function.y_criteria.keys())[0]
+
+    summary = pd.read_csv(os.path.join(result_dir, RESULT_SUMMARY), dtype=str, skipinitialspace=True)
+    # The summary is opened in append mode, remove the headers of previous runs
+    summary = summary[summary['STEP'] != 'STEP'].reset_index(drop=True)
+    for column in summary.columns:
+        if column not in VERDICT_COLUMNS + ['STEP', 'FILENAME']:
+            summary[column] = pd.to_numeric(summary[column], errors='coerce')
+    for column in VERDICT_COLUMNS:
+        if column in summary:
+            summary['ORIGINAL_' + column] = summary[column]
+
+    for filename, rows in summary.groupby('FILENAME', sort=False):
+        curve, pwr = 1, 1.0
+        if setup['filename'] is not None:
+            match = re.match(setup['filename'], filename)
+            if match is None:
+                ts.log_warning(f'Skipping {filename}, curve and power level not found in the name')
+                continue
+            curve = int(match.group('curve'))
+            pwr = float(match.group('pwr')) * setup['pwr_scale']
+        tr = ts.param_value(setup['tr'].format(curve=curve))
+        if tr is None:
+            tr = active_function.param.get(script, {}).get(curve, {}).get('TR')
+        if tr is None:
+            raise p1547Error(f'Response time parameter {setup["tr"].format(curve=curve)} not found')
+        active_function.reset_curve(curve)
+        active_function.reset_pwr(pwr)
+        active_function.reset_time_settings(tr=float(tr), number_tr=2)
+
+        dataset_file = os.path.join(result_dir, filename + '.csv')
+        dataset = pd.read_csv(dataset_file) if os.path.exists(dataset_file) else None
+        if dataset is None:
+            ts.log_warning(f'Dataset {dataset_file} not found, using the summary values')
+
+        steps = {x: rows[f'{x}_TARGET'].to_numpy(dtype=float) for x in active_function.x_criteria}
+        if script == CPF:
+            # The power factor is not in the summary, recover it from the recorded targets
+            p = steps['P']
+            steps['PF'] = p / np.sqrt(np.square(p) + np.square(rows[f'{y}_TARGET'].to_numpy(dtype=float)))
+        elif script == CRP:
+            steps['Q'] = rows[f'{y}_TARGET'].to_numpy(dtype=float)
+
+        tr_values = [get_dataset_tr_values(active_function, dataset, step, y) for step in rows['STEP']]
+        steps['Y_INITIAL'], steps['Y_TR_1'], steps['Y_TR_LAST'] = map(np.array, zip(*tr_values))
+        missing = np.isnan(steps['Y_TR_LAST'])
+        steps['Y_TR_LAST'][missing] = rows[f'{y}_MEAS'].to_numpy(dtype=float)[missing]
+
+        results = active_function.batch_evaluate_criterias(steps)
+        results.index = rows.index
+        # a verdict without its measurements (no dataset or no EVENT rows) keeps the original verdict
+        no_data = {'90%_BY_TR=1': np.isnan(steps['Y_TR_1']) | (np.isnan(steps['Y_INITIAL']) & (script != CRP)),
+                   'WITHIN_BOUNDS_BY_TR=1': np.isnan(steps['Y_TR_1']),
+                   'WITHIN_BOUNDS_BY_LAST_TR': np.isnan(steps['Y_TR_LAST'])}
+        for column, missing in no_data.items():
+            if column in results and missing.any():
+                original = rows.get('ORIGINAL_' + column)
+                results.loc[missing, column] = original[missing] if original is not None else 'No Data'
+                ts.log_warning(f'{filename}: {column} of {int(missing.sum())} step(s) not regraded, '
+                               f'measurements not found')
+        for column in results.columns:
+            if column in summary:
+                summary.loc[rows.index, column] = results[column]
+        summary.loc[rows.index, f'{y}_MEAS'] = steps['Y_TR_LAST']
+
+    if output is not None:
+        columns = [column for column in summary.columns if not column.startswith('ORIGINAL_')]
+        summary[columns].to_csv(os.path.join(result_dir, output), index=False)
+    return summary
+
+
+def regrade(result_dirs, config_file=None, jobs=None, output=REGRADED_SUMMARY):
+    """
+    Regrade several result directories in parallel, one process per directory
+
+    :param result_dirs:     list of result directories
+    :param config_file:     .tst configuration shared by all the directories (optional)
+    :param jobs:            number of worker processes, default is the number of cores
+    :param output:          name of the regraded summary written in each directory
+    :return: dictionary result directory -> DataFrame of the regraded summary (or the exception raised)
+    """
+    results = OrderedDict()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = OrderedDict((result_dir, executor.submit(regrade_result_dir, result_dir, config_file, output))
+                              for result_dir in result_dirs)
+        for result_dir, future in futures.items():
+            try:
+                results[result_dir] = future.result()
+            except Exception as e:
+                results[result_dir] = e
+    return results
+
+
+def count_verdict_changes(summary):
+    """
+    Number of verdicts that changed between the original and the regraded summary
+    """
+    changes = 0
+    for column in VERDICT_COLUMNS:
+        if column in summary and 'ORIGINAL_' + column in summary:
+            changes += int((summary[column] != summary['ORIGINAL_' + column]).sum())
+    return changes
+
+
+"""
+Section for the pre-flight planning of the test durations
+"""
+
+PLAN_SUMMARY = 'plan.csv'
+# waits of the ride-through scripts around the simulation: model load, start, stop time margin and the fixed wait
+# for the target to save the waveform
+RT_LOAD_TIME = 2.0
+RT_START_TIME = 0.5
+RT_STOP_MARGIN = 5.0
+RT_WAVEFORM_TIME = 10.0
+
+
+class PlanningHil(object):
+    """
+    Stand-in for the HIL driver used to build the ride-through test sequences without hardware. The parameters
+    sent to the model are kept in the parameters dictionary.
+    """
+
+    def __init__(self):
+        self.rt_lab_model = None
+        self.parameters = OrderedDict()
+
+    def set_time_sig(self, path):
+        pass
+
+    def set_matlab_variables(self, parameters):
+        self.parameters.update(parameters)
+
+
+def plan_block(block, steps=0, tr=0., n_tr=2, settle=0., hil=0.):
+    """
+    Time budget of a block of the test (one dataset)
+
+    :param block:   name of the block
+    :param steps:   number of steps, each recorded over n_tr time responses
+    :param tr:      time response (s)
+    :param n_tr:    number of time responses recorded per step
+    :param settle:  waits before the steps (s)
+    :param hil:     time the HIL simulation runs, including its waits (s)
+    :return: dictionary of the block budget
+    """
+    step_time = steps * n_tr * tr
+    return OrderedDict([('BLOCK', block), ('STEPS', steps), ('STEP_TIME', step_time), ('SETTLE_TIME', settle),
+                        ('HIL_TIME', hil), ('DURATION', step_time + settle + hil)])
+
+
+def enabled_curves(ts, group, tr_name, curves=(1, 2, 3)):
+    """
+    :return: OrderedDict curve -> time response of the enabled curves of the test
+    """
+    return OrderedDict((curve, float(ts.param_value(f'{group}.test_{curve}_{tr_name}')))
+                       for curve in curves if ts.param_value(f'{group}.test_{curve}') == 'Enabled')
+
+
+def power_levels(irr):
+    return {'20%': [0.20], '66%': [0.66], '100%': [1.]}.get(irr, [1., 0.66, 0.20])
+
+
+def plan_vv(ts):
+    active_function = ActiveFunction(ts=ts, script_name='Volt-Var', functions=[VV], criteria_mode=[True, True, True])
+    blocks = []
+    if ts.param_value('vv.mode') == 'Imbalanced grid':
+        tr = float(ts.param_value('vv.test_1_t_r'))
+        return [plan_block('VV_IMB_1', steps=4, tr=tr, settle=2 * tr)]
+    v_refs = {'95%': [0.95], '105%': [1.05], '100%': [1.0]}.get(ts.param_value('vv.vref'), [1.0, 0.95, 1.05])
+    for curve, tr in enabled_curves(ts, 'vv', 't_r').items():
+        active_function.reset_curve(curve)
+        for power in power_levels(ts.param_value('vv.irr')):
+            active_function.reset_pwr(power)
+            for v_ref in v_refs:
+                steps = active_function.create_vv_dict_steps(v_ref=v_ref)
+                blocks.append(plan_block('VV_%s_PWR_%d_vref_%d' % (curve, power * 100, v_ref * 100), len(steps), tr))
+    return blocks
+
+
+def plan_vw(ts):
+    active_function = ActiveFunction(ts=ts, script_name='Volt-Watt', functions=[VW], criteria_mode=[True, True, True])
+    blocks = []
+    if ts.param_value('vw.mode') == 'Imbalanced grid':
+        tr = float(ts.param_value('vw.test_1_tr'))
+        return [plan_block('VW_IMB_1', steps=4, tr=tr, settle=2 * tr)]
+    for curve, tr in enabled_curves(ts, 'vw', 'tr').items():
+        active_function.reset_curve(curve)
+        for power in power_levels(ts.param_value('vw.power_lvl')):
+            active_function.reset_pwr(power)
+            steps = active_function.create_vw_dict_steps()
+            blocks.append(plan_block('VW_{0}_PWR_{1}'.format(curve, power), len(steps), tr))
+    return blocks
+
+
+def plan_fw(ts):
+    active_function = ActiveFunction(ts=ts, script_name='Frequency-Watt', functions=[FW],
+                                     criteria_mode=[True, True, True])
+    mode = ts.param_value('fw.mode')
+    pwr_lvls = power_levels(ts.param_value('fw.power_lvl')) if mode == 'Above' else [1.]
+    blocks = []
+    for absorb in ([False, True] if ts.param_value('eut_fw.absorb') == 'Yes' else [False]):
+        for curve, tr in enabled_curves(ts, 'fw', 'tr', curves=(1, 2)).items():
+            active_function.reset_curve(curve=curve)
+            steps = active_function.create_fw_dict_steps(mode=mode)
+            for power in pwr_lvls:
+                block = 'FW_{0}_PWR_{1}_{2}'.format(curve, power, mode) + ('_ABSORB' if absorb else '')
+                blocks.append(plan_block(block, len(steps), tr, settle=2 * tr))
+    return blocks
+
+
+def plan_wv(ts):
+    active_function = ActiveFunction(ts=ts, script_name='Watt-Var', functions=[WV], criteria_mode=[True, True, True])
+    blocks = []
+    for curve, tr in enabled_curves(ts, 'eut_wv', 't_r').items():
+        active_function.reset_curve(curve)
+        for power in power_levels(ts.param_value('eut_wv.irr')):
+            active_function.reset_pwr(pwr=power)
+            steps = active_function.create_wv_dict_steps()
+            blocks.append(plan_block('WV_%s_PWR_%d' % (curve, power * 100), len(steps), tr))
+    return blocks
+
+
+def plan_pri(ts):
+    active_function = ActiveFunction(ts=ts, script_name='Prioritization', functions=[PRI, VW, FW, VV, CPF, CRP, WV],
+                                     criteria_mode=[True, True, True])
+    tr = float(ts.param_value('pri.pri_response_time'))
+    blocks = [plan_block('PRI_SETUP', settle=4 * tr)]
+    for function, status in [(VV, 'pri.vv_status'), (CRP, 'pri.crp_status'), (CPF, 'pri.cpf_status'),
+                             (WV, 'pri.wv_status')]:
+        if ts.param_value(status) == 'Enabled':
+            steps = active_function.create_pri_dict_steps(function=function)
+            blocks.append(plan_block('PRI_%s' % function, len(steps), tr, settle=2 * tr))
+    return blocks
+
+
+def plan_vrt(ts):
+    vrt = VoltageRideThrough(ts=ts, support_interfaces={'hil': PlanningHil()})
+    pwr_lvl = [float(ts.param_value(f'vrt.{level}_pwr_value')) for level in ('low', 'high')
+               if ts.param_value(f'vrt.{level}_pwr_ena') == 'Enabled']
+    phases = [name for name, mode in [('1PH', 'one'), ('2PH', 'two'), ('3PH', 'three')]
+              if ts.param_value(f'vrt.{mode}_phase_mode') == 'Enabled']
+    blocks = []
+    for current_mode in vrt.get_modes():
+        stop_time = vrt.get_vrt_stop_time(vrt.set_test_conditions(current_mode)) + RT_STOP_MARGIN
+        for pwr in pwr_lvl:
+            for phase in phases:
+                blocks.append(plan_block(f'{current_mode}_{round(pwr * 100)}PCT_{phase}',
+                                         settle=RT_LOAD_TIME + RT_START_TIME + RT_WAVEFORM_TIME, hil=stop_time))
+    return blocks
+
+
+def plan_frt(ts):
+    frt = FrequencyRideThrough(ts=ts, support_interfaces={'hil': PlanningHil()})
+    pwr = float(ts.param_value('frt.high_pwr_value'))
+    blocks = []
+    for current_mode in frt.get_modes():
+        stop_time = frt.get_frt_stop_time(frt.set_test_conditions(current_mode)) + RT_STOP_MARGIN
+        for repetition in range(1, int(ts.param_value('frt.repetitions')) + 1):
+            blocks.append(plan_block(f'{current_mode}_{round(pwr * 100)}PCT_{repetition}',
+                                     settle=RT_START_TIME + RT_WAVEFORM_TIME, hil=stop_time))
+    return blocks
+
+
+# Scripts with their steps built by the library, the other scripts (CPF, CRP, LAP, UI, PCRT, IOP) write their steps
+# in the script and are not planned
+PLAN_SCRIPTS = {VV: plan_vv, VW: plan_vw, FW: plan_fw, WV: plan_wv, PRI: plan_pri, 'VRT': plan_vrt,
+                'FRT': plan_frt}
+
+
+def plan_test(name, script, params, verbose=False):
+    """
+    Enumerate the steps of a test configuration without hardware and sum its mandatory waits: n_tr*tr per step,
+    the 2*tr waits for steady state and the HIL simulation stop times. The time taken by the instruments is not
+    included.
+
+    :param name:        test name
+    :param script:      script name
+    :param params:      parameter values of the .tst configuration
+    :param verbose:     print the library log messages
+    :return: DataFrame with a row per block (dataset) of the test
+    """
+    if script not in PLAN_SCRIPTS:
+        raise p1547Error(f'The {script} script cannot be planned, its steps are not built by the library')
+    ts = OfflineTestScript(params=params, verbose=verbose)
+    plan = pd.DataFrame(PLAN_SCRIPTS[script](ts), columns=['BLOCK', 'STEPS', 'STEP_TIME', 'SETTLE_TIME', 'HIL_TIME',
+                                                           'DURATION'])
+    plan.insert(0, 'SCRIPT', script)
+    plan.insert(0, 'TEST', name)
+    return plan
+
+
+def plan(config_files, output=None, verbose=False):
+    """
+    Time budget of test configurations (.tst) and suites (.ste)
+
+    :param config_files:    list of .tst and .ste files
+    :param output:          csv file of the plan (optional)
+    :param verbose:         print the library log messages
+    :return: DataFrame with a row per block, the tests that cannot be planned have an ERROR
+    """
+    tests = []
+    for config_file in config_files:
+        suite = os.path.splitext(os.path.basename(config_file))[0]
+        try:
+            if config_file.endswith('.ste'):
+                tests.extend((suite, name, script, params) for name, script, params in read_suite(config_file))
+            else:
+                script, params = read_test_config(config_file)
+                tests.append(('', suite, script, params))
+        except Exception as e:
+            # a configuration that cannot be read is reported, the other ones are still planned
+            tests.append(('', suite, None, e))
+
+    plans = []
+    for suite, name, script, params in tests:
+        try:
+            if isinstance(params, Exception):
+                raise params
+            test_plan = plan_test(name, script, params, verbose=verbose)
+            if test_plan.empty:
+                raise p1547Error('No block enabled in the configuration')
+        except Exception as e:
+            test_plan = pd.DataFrame({'TEST': [name], 'SCRIPT': [script], 'ERROR': [str(e)]})
+        test_plan.insert(0, 'SUITE', suite)
+        plans.append(test_plan)
+    merged = pd.concat(plans, ignore_index=True) if plans else pd.DataFrame()
+    if output is not None:
+        merged.to_csv(output, index=False)
+    return merged
+
+
+"""
+Section for the campaign runner
+"""
+
+CAMPAIGN_SUMMARY = 'campaign.csv'
+
+
+def read_suite(suite_file, tests_dir=None):
+    """
+    Read the test configurations of a SVP suite (.ste), including the ones of the nested suites. When the suite
+    has globals="True" its parameters override the ones of its members.
+
+    :param suite_file:  path of the .ste file
+    :param tests_dir:   directory of the .tst files, default is the Tests directory next to the Suites directory
+    :return: list of tuples (test name, script name, OrderedDict of parameter values)
+    """
+    try:
+        root = ET.parse(suite_file).getroot()
+    except (ET.ParseError, OSError) as e:
+        raise p1547Error(f'Unable to read suite {suite_file}: {e}')
+
+    suites_dir = os.path.dirname(os.path.abspath(suite_file))
+    if tests_dir is None:
+        tests_dir = os.path.join(os.path.dirname(suites_dir), 'Tests')
+
+    tests = []
+    members = root.find('members')
+    for member in (members if members is not None else []):
+        # the suites are written on Windows, the member paths use backslashes
+        name = member.get('name').replace('\\', '/')
+        if name.endswith('.ste'):
+            tests.extend(read_suite(os.path.join(suites_dir, name), tests_dir))
+        else:
+            script, params = read_test_config(os.path.join(tests_dir, name))
+            tests.append((os.path.splitext(os.path.basename(name))[0], script, params))
+
+    if root.get('globals') == 'True':
+        suite_params = read_config_params(root.find('params'))
+        for _, _, params in tests:
+            params.update(suite_params)
+    return tests
+
+
+def read_benches(bench_file):
+    """
+    Read the bench map of a campaign. The file is a JSON object bench name -> bench configuration with
+    "params", the driver parameters overriding the test configurations for this bench, and "shared", the names
+    of the instruments shared with other benches, e.g.
+
+    {"bench_1": {"params": {"gridsim.opal.ipaddr": "10.0.0.11"}, "shared": ["hil"]},
+     "bench_2": {"params": {"gridsim.opal.ipaddr": "10.0.0.12"}, "shared": ["hil"]}}
+
+    :param bench_file:  path of the JSON file
+    :return: OrderedDict bench name -> bench configuration
+    """
+    try:
+        with open(bench_file) as f:
+            benches = json.load(f, object_pairs_hook=OrderedDict)
+    except (OSError, ValueError) as e:
+        raise p1547Error(f'Unable to read bench map {bench_file}: {e}')
+    if not benches:
+        raise p1547Error(f'No bench defined in {bench_file}')
+    for name, bench in benches.items():
+        bench.setdefault('params', OrderedDict())
+        bench.setdefault('shared', [])
+    return benches
+
+
+class CampaignRunner(object):
+    """
+    Run the test configurations of a suite on several benches at once. Each bench runs one test at a time in its
+    own process. A test holds the locks of the instruments its bench shares with other benches while it runs, the
+    locks are always taken in the same order so two benches cannot wait on each other.
+    """
+
+    def __init__(self, suite_file, benches, campaign_dir, replicate=False, python=None, svp_dir=None):
+        """
+        :param suite_file:      path of the .ste file
+        :param benches:         OrderedDict bench name -> bench configuration (see read_benches)
+        :param campaign_dir:    directory of the merged result tree
+        :param replicate:       False spreads the tests over the benches, True runs every test on every bench
+        :param python:          python interpreter used to run the scripts, default is the current one
+        :param svp_dir:         directory with the Scripts and Lib directories, default is the suite parent directory
+        """
+        self.suite_file = suite_file
+        self.benches = benches
+        self.campaign_dir = os.path.abspath(campaign_dir)
+        self.replicate = replicate
+        self.python = python or sys.executable
+        if svp_dir is None:
+            svp_dir = os.path.dirname(os.path.dirname(os.path.abspath(suite_file)))
+        self.scripts_dir = os.path.join(svp_dir, 'Scripts')
+        self.lib_dir = os.path.join(svp_dir, 'Lib')
+        self.tests = read_suite(suite_file)
+        self.locks = {name: threading.Lock() for bench in benches.values() for name in bench['shared']}
+        self.results = []
+        self.results_lock = threading.Lock()
+
+    def job_queues(self):
+        """
+        :return: dictionary bench name -> queue of tests. The benches share one queue unless replicate is set
+        """
+        if self.replicate:
+            queues = {}
+            for bench in self.benches:
+                queues[bench] = queue.Queue()
+                for test in self.tests:
+                    queues[bench].put(test)
+            return queues
+
+        shared_queue = queue.Queue()
+        for test in self.tests:
+            shared_queue.put(test)
+        return {bench: shared_queue for bench in self.benches}
+
+    def run(self):
+        """
+        Run the campaign and merge the results
+
+        :return: DataFrame with one row per test run
+        """
+        os.makedirs(self.campaign_dir, exist_ok=True)
+        queues = self.job_queues()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.benches)) as executor:
+            futures = [executor.submit(self.bench_worker, bench, queues[bench]) for bench in self.benches]
+            for future in futures:
+                future.result()
+
+        campaign = pd.DataFrame(self.results, columns=['BENCH', 'TEST', 'SCRIPT', 'RETURN_CODE', 'START',
+                                                       'DURATION', 'RESULT_DIR'])
+        campaign.to_csv(os.path.join(self.campaign_dir, CAMPAIGN_SUMMARY), index=False)
+        self.merge_result_summaries(campaign)
+        return campaign
+
+    def bench_worker(self, bench, tests):
+        while True:
+            try:
+                name, script, params = tests.get_nowait()
+            except queue.Empty:
+                return
+            result = self.run_test(bench, name, script, params)
+            with self.results_lock:
+                self.results.append(result)
+
+    def run_test(self, bench, name, script, params):
+        """
+        Run one test configuration on a bench in a separate process
+
+        :return: list [bench, test, script, return code, start time, duration, result directory]
+        """
+        bench_config = self.benches[bench]
+        test_dir = os.path.join(self.campaign_dir, bench, name)
+        suffix = 1
+        while os.path.exists(test_dir):
+            suffix += 1
+            test_dir = os.path.join(self.campaign_dir, bench, f'{name}_{suffix}')
+        os.makedirs(test_dir)
+
+        test_params = OrderedDict(params)
+        test_params.update(bench_config['params'])
+        config_file = os.path.join(test_dir, f'{name}.tst')
+        write_test_config(config_file, name, script, test_params)
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in [self.lib_dir, env.get('PYTHONPATH')] if p)
+        command = [self.python, os.path.join(self.scripts_dir, f'{script}.py'), config_file]
+
+        locks = [self.locks[shared] for shared in sorted(set(bench_config['shared']))]
+        for lock in locks:
+            lock.acquire()
+        start = datetime.now()
+        try:
+            with open(os.path.join(test_dir, f'{name}.log'), 'w') as log_file:
+                return_code = subprocess.call(command, cwd=test_dir, env=env, stdout=log_file,
+                                              stderr=subprocess.STDOUT)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        duration = (datetime.now() - start).total_seconds()
+        return [bench, name, script, return_code, start.isoformat(), duration, test_dir]
+
+    def merge_result_summaries(self, campaign):
+        """
+        Merge the result summaries of all the test runs in the campaign directory
+
+        :param campaign:    DataFrame returned by run
+        :return: merged DataFrame or None when no test wrote a result summary
+        """
+        summaries = []
+        for _, row in campaign.iterrows():
+            for summary_file in sorted(glob.glob(os.path.join(row['RESULT_DIR'], '**', RESULT_SUMMARY),
+                                                 recursive=True)):
+                try:
+                    summary = pd.read_csv(summary_file)
+                except (OSError, ValueError, pd.errors.EmptyDataError):
+                    continue
+                summary.insert(0, 'TEST', row['TEST'])
+                summary.insert(0, 'BENCH', row['BENCH'])
+                summaries.append(summary)
+        if not summaries:
+            return None
+        merged = pd.concat(summaries, ignore_index=True)
+        merged.to_csv(os.path.join(self.campaign_dir, RESULT_SUMMARY), index=False)
+        return merged
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='p1547', description='P1547 library tools')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    regrade_parser = subparsers.add_parser('regrade', help='Regrade saved results without hardware')
+    regrade_parser.add_argument('result_dirs', nargs='+', help='result directories with result_summary.csv')
+    regrade_parser.add_argument('--config', default=None, help='.tst configuration used for every directory')
+    regrade_parser.add_argument('--jobs', type=int, default=None, help='number of worker processes')
+
+    campaign_parser = subparsers.add_parser('campaign', help='Run a suite on several benches at once')
+    campaign_parser.add_argument('suite', help='.ste suite file')
+    campaign_parser.add_argument('--benches', required=True, help='JSON bench map')
+    campaign_parser.add_argument('--output', required=True, help='campaign result directory')
+    campaign_parser.add_argument('--replicate', action='store_true', help='run every test on every bench')
+    campaign_parser.add_argument('--python', default=None, help='python interpreter used to run the scripts')
+
+    rt_parser = subparsers.add_parser('ride-through', help='Evaluate ride-through waveform stores')
+    rt_parser.add_argument('stores', nargs='+', help='.wfm waveform stores saved by VRT/FRT')
+    rt_parser.add_argument('--f-nom', type=float, default=60., help='nominal frequency (Hz)')
+    rt_parser.add_argument('--continuous', type=float, nargs=2, default=None, metavar=('MIN', 'MAX'),
+                           help='condition values of the continuous operation region')
+    rt_parser.add_argument('--output', default=RT_EVALUATION, help='csv file of the evaluation')
+    rt_parser.add_argument('--jobs', type=int, default=None, help='number of worker processes')
+
+    plan_parser = subparsers.add_parser('plan', help='Estimate the duration of tests and suites without hardware')
+    plan_parser.add_argument('configs', nargs='+', help='.tst test configurations or .ste suites')
+    plan_parser.add_argument('--output', default=None, help='csv file of the plan per block')
+    plan_parser.add_argument('--verbose', action='store_true', help='print the library log messages')
+
+    args = parser.parse_args(args)
+
+    if args.command == 'regrade':
+        status = 0
+        for result_dir, summary in regrade(args.result_dirs, config_file=args.config, jobs=args.jobs).items():
+            if isinstance(summary, Exception):
+                print(f'{result_dir}: ERROR {summary}')
+                status = 1
+            else:
+                print(f'{result_dir}: {len(summary)} steps regraded, '
+                      f'{count_verdict_changes(summary)} verdict(s) changed')
+        return status
+
+    if args.command == 'ride-through':
+        merged = evaluate_ride_through(args.stores, jobs=args.jobs, output=args.output, f_nom=args.f_nom,
+                                       continuous=args.continuous)
+        for path, rows in merged.groupby('FILE', sort=False):
+            print(f"{path}: {int((rows['RESULT'] == 'Pass').sum())} of {len(rows)} windows passed")
+        return int(merged['RESULT'].isin(['Fail', 'Error']).any())
+
+    if args.command == 'plan':
+        budget = plan(args.configs, output=args.output, verbose=args.verbose)
+        if 'ERROR' in budget:
+            for _, row in budget[budget['ERROR'].notna()].iterrows():
+                print(f"{row['TEST']}: not planned, {row['ERROR']}")
+            budget = budget[budget['ERROR'].isna()]
+        for (suite, test), rows in budget.groupby(['SUITE', 'TEST'], sort=False):
+            print(f"{suite + ' ' if suite else ''}{test}: {int(rows['STEPS'].sum())} steps in {len(rows)} blocks, "
+                  f"{timedelta(seconds=round(rows['DURATION'].sum()))}")
+        for suite, rows in budget[budget['SUITE'] != ''].groupby('SUITE', sort=False):
+            print(f"suite {suite}: {timedelta(seconds=round(rows['DURATION'].sum()))}")
+        return 0
+
+    if args.command == 'campaign':
+        runner = CampaignRunner(args.suite, read_benches(args.benches), args.output, replicate=args.replicate,
+                                python=args.python)
+        campaign = runner.run()
+        for _, row in campaign.iterrows():
+            print(f"{row['BENCH']} {row['TEST']}: return code {row['RETURN_CODE']} in {row['DURATION']:.1f} s")
+        return int((campaign['RETURN_CODE'] != 0).any())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -59,6 +59,8 @@ def test_run():
     rs = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
     step = None
     q_initial = None
     dataset_filename = None
@@ -113,6 +115,7 @@ def test_run():
                                               functions='CPF',
                                               script_name='Constant Power Factor',
                                               criteria_mode=[True, True, True])
+        virtual_lab = p1547.virtual_lab_init(ts, ActiveFunction)
         ActiveFunction.set_imbalance_config(imbalance_angle_fix=imbalance_fix)
         ts.log_debug("1547.1 Library configured for %s" % ActiveFunction.get_script_name())
 
@@ -145,26 +148,26 @@ def test_run():
         """
         a) Connect the EUT according to the instructions and specifications provided by the manufacturer.
         """
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
-
-        # grid simulator is initialized with test parameters and enabled
-        grid = gridsim.gridsim_init(ts, support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
-        if grid is not None:
-            grid.voltage(v_nom)
-
-        # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts, support_interfaces={'hil': chil}) 
-        if pv is not None:
-            pv.power_set(p_rated)
-            pv.power_on()  # Turn on DC so the EUT can be initialized
+        # initialize the instruments, each one as soon as the ones it needs are up
+        das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'gridsim': (lambda chil, config: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}),
+                        ('hil', 'config')),
+            'pvsim': (lambda chil, grid: pvsim.pvsim_init(ts, support_interfaces={'hil': chil}), ('hil', 'gridsim')),
+            'das': (lambda chil, pv: das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}),
+                    ('hil', 'pvsim')),
+            # the EUT communications are opened once AC and DC are on
+            'power': (lambda grid, pv, daq: p1547.power_up(ts, grid=grid, pv=pv, v_nom=v_nom, p_rated=p_rated),
+                      ('gridsim', 'pvsim', 'das')),
+            'der': (lambda chil, power: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'power'))
+        }, overrides=virtual_lab.devices() if virtual_lab is not None else None)
+        chil, grid, pv, daq, eut = \
+            devices['hil'], devices['gridsim'], devices['pvsim'], devices['das'], devices['der']
 
         # DAS soft channels
-        das_points = ActiveFunction.get_sc_points()
-        # initialize data acquisition
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil})
 
         if daq is not None:
             daq.sc['V_MEAS'] = 120
@@ -181,7 +184,6 @@ def test_run():
         control functions.
         """
         # it is assumed the EUT is on
-        eut = der.der_init(ts, support_interfaces={'hil': chil})
         if eut is not None:
             eut.config()
             ts.log_debug('If not done already, set L/HVRT and trip parameters to the widest range of adjustability.')
@@ -189,23 +191,14 @@ def test_run():
         # Special considerations for CHIL ASGC/Typhoon startup #
         if chil is not None:
             if eut.measurements() is not None:
-                inv_power = eut.measurements().get('W')
-                timeout = 120.
-                if inv_power <= p_rated * 0.85:
+                if eut.measurements().get('W') <= p_rated * 0.85:
                     pv.irradiance_set(995)  # Perturb the pv slightly to start the inverter
                     ts.sleep(3)
                     eut.connect(params={'Conn': True})
-                while inv_power <= p_rated * 0.85 and timeout >= 0:
-                    ts.log('Inverter power is at %0.1f. Waiting up to %s more seconds or until EUT starts...' %
-                        (inv_power, timeout))
-                    ts.sleep(1)
-                    timeout -= 1
-                    inv_power = eut.measurements().get('W')
-                    if timeout == 0:
-                        result = script.RESULT_FAIL
-                        raise der.DERError('Inverter did not start.')
-                ts.log('Waiting for EUT to ramp up')
-                ts.sleep(8)
+                if p1547.wait_eut_startup(ts, lambda: eut.measurements().get('W'), p_rated * 0.85,
+                                          mra=ActiveFunction.MRA['P']) is None:
+                    result = script.RESULT_FAIL
+                    raise der.DERError('Inverter did not start.')
 
         """
         c) Set all AC test source parameters to the nominal operating voltage and frequency.
@@ -215,9 +208,11 @@ def test_run():
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         """
         d) Adjust the EUT's available active power to Prated. For an EUT with an input voltage range, set the input
@@ -296,9 +291,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step_label)
                     step_dict = {'V': v_nom, 'P': p_min, 'PF': pf_target}
                     pv.power_set(step_dict['P'])
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 """
                 h) Step the EUT's available active power to Prated.
@@ -309,9 +303,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step_label)
                     step_dict = {'V': v_nom, 'P': p_rated, 'PF': pf_target}
                     pv.power_set(step_dict['P'])
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 if grid is not None:
 
@@ -321,9 +314,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step)
                     step_dict = {'V': v_min + a_v, 'P': p_rated, 'PF': pf_target}
                     grid.voltage(step_dict['V'])
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                     #   j) Step the AC test source voltage to (VH - av)
                     step = ActiveFunction.get_step_label()
@@ -331,9 +323,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step)
                     step_dict = {'V': v_min - a_v, 'P': p_rated, 'PF': pf_target}
                     grid.voltage(step_dict['V'])
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                     #   k) Step the AC test source voltage to (VL + av)
                     step = ActiveFunction.get_step_label()
@@ -341,9 +332,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step)
                     step_dict = {'V': v_min + a_v, 'P': p_rated, 'PF': pf_target}
                     grid.voltage(step_dict['V'])
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 ts.log_debug(f'Phase={phases}')
                 ts.log_debug(f'Phase={grid is not None}--{phases is "Three phase"}')
@@ -356,9 +346,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step)
                     step_dict = {'V': v_nom, 'P': p_rated, 'PF': pf_target}
                     grid.voltage(step_dict['V'])
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 if grid is not None and phases == 'Three phase':
                     """
@@ -369,9 +358,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step)
                     v_target = ActiveFunction.set_grid_asymmetric(grid=grid, case='case_a')
                     step_dict = {'V': v_target , 'P': p_rated, 'PF': pf_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
                 """
                 n) For multiphase units, step the AC test source voltage to VN.
                 """
@@ -382,9 +370,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step)
                     step_dict = {'V': v_nom, 'P': p_rated, 'PF': pf_target}
                     grid.voltage(step_dict['V'])
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 '''
                 o) For multiphase units, step the AC test source voltage to Case B from Table 24.
@@ -395,9 +382,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step)
                     v_target = ActiveFunction.set_grid_asymmetric(grid=grid, case='case_b')
                     step_dict = {'V': v_target, 'P': p_rated, 'PF': pf_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
 
 
@@ -411,9 +397,8 @@ def test_run():
                     ActiveFunction.start(daq=daq, step_label=step)
                     step_dict = {'V': v_nom, 'P': p_rated, 'PF': pf_target}
                     grid.voltage(step_dict['V'])
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
 
                 """
@@ -448,6 +433,7 @@ def test_run():
                 result_params = ActiveFunction.get_rslt_param_plot()
                 ts.log('Sampling complete')
                 dataset_filename = dataset_filename + ".csv"
+                pipeline.flush()
                 daq.data_capture(False)
                 ds = daq.data_capture_dataset()
                 ts.log('Saving file: %s' % dataset_filename)
@@ -491,6 +477,10 @@ def test_run():
         if chil is not None:
             chil.close()
 
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
 
@@ -590,6 +580,7 @@ gridsim.params(info)
 pvsim.params(info)
 das.params(info)
 hil.params(info)
+p1547.params(info)
 
 
 def script_info():
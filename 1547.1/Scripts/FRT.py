@@ -237,6 +237,8 @@ def test_run():
             for repetition in range(1,repetitions+1):        
                 dataset_filename = f'{current_mode}_{round(pwr*100)}PCT_{repetition}'
                 ts.log_debug(15 * "*" + f"Starting {dataset_filename}" + 15 * "*")
+                wave = p1547.WaveformExport(ts, daq, mat_file='Data.mat',
+                                            channels=FreqRideThrough.get_wfm_file_header())
                 if data_ena :
                     daq.data_capture(True)
 
@@ -261,7 +263,7 @@ def test_run():
                     ts.log('Stop time set to %s' % phil.set_stop_time(frt_stop_time))
 
                     # The driver should take care of this by selecting "Yes" to "Load the model to target?"
-                    phil.load_model_on_hil()
+                    FreqRideThrough.load_model_on_hil()
                     # You need to first load the model, then configure the parameters
                     # Now that we have all the test_sequences its time to sent them to the model.
                     FreqRideThrough.set_frt_model_parameters(frt_test_sequences)
@@ -284,17 +286,23 @@ def test_run():
 
                         # complete data capture
                         ts.log('Waiting for Opal to save the waveform data: {}'.format(dataset_filename))
-                        ts.sleep(10)
+                        wave.wait()
                     if wav_ena:
                         # Convert and save the .mat file 
                         ts.log('Processing waveform dataset(s)')
-                        wave_start_filename = dataset_filename + "_WAV.csv"
-
-                        ds = daq.waveform_capture_dataset()  # returns list of databases of waveforms (overloaded)
-                        ts.log(f'Number of waveforms to save {len(ds)}')
-                        if len(ds) > 0:
-                            ds[0].to_csv(ts.result_file_path(wave_start_filename))
-                            ts.result_file(wave_start_filename)
+                        wave_files = wave.export(dataset_filename + "_WAV",
+                                                 windows=p1547.sequence_windows(frt_test_sequences))
+                        if wave_files:
+                            wave_start_filename = wave_files[0]
+                        for wave_file in wave_files:
+                            if wave_file.endswith('.wfm'):
+                                # the capture is saved, an evaluation error must not stop the test sequence
+                                try:
+                                    rt_eval = FreqRideThrough.get_evaluation()
+                                    rt_eval.write(ts, dataset_filename,
+                                                  rt_eval.evaluate_store(ts.result_file_path(wave_file)))
+                                except Exception as e:
+                                    ts.log_warning('Ride-through evaluation of %s failed: %s' % (wave_file, e))
 
                     if data_ena:
                         ds = daq.data_capture_dataset()
@@ -428,6 +436,7 @@ gridsim.params(info)
 pvsim.params(info)
 das.params(info)
 hil.params(info)
+p1547.waveform_params(info)
 
 
 def script_info():
@@ -57,6 +57,8 @@ def test_run():
     eut = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
     dataset_filename = None
     fw_curves = []
     fw_response_time = [0, 0, 0]
@@ -82,6 +84,7 @@ def test_run():
                                               functions=[FW],
                                               script_name='Frequency-Watt',
                                               criteria_mode=[True, True, True])
+        virtual_lab = p1547.virtual_lab_init(ts, ActiveFunction)
         ts.log_debug("1547.1 Library configured for %s" % ActiveFunction.get_script_name())
 
 
@@ -127,17 +130,24 @@ def test_run():
         '''
         a) Connect the EUT according to the instructions and specifications provided by the manufacturer.
         '''
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
+        # initialize the instruments, each one as soon as the ones it needs are up
+        das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'das': (lambda chil, config: das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}),
+                    ('hil', 'config')),
+            'der': (lambda chil, daq: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'das')),
+            'gridsim': (lambda chil, eut: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}), ('hil', 'der')),
+            'pvsim': (lambda: pvsim.pvsim_init(ts), ())
+        }, overrides=virtual_lab.devices() if virtual_lab is not None else None)
+        chil, daq, eut, grid, pv = \
+            devices['hil'], devices['das'], devices['der'], devices['gridsim'], devices['pvsim']
 
         # DAS soft channels
         # TODO : add to library 1547
         #das_points = {'sc': ('P_TARGET', 'P_TARGET_MIN', 'P_TARGET_MAX', 'P_MEAS', 'F_TARGET', 'F_MEAS', 'event')}
-        das_points = ActiveFunction.get_sc_points()
-        # initialize data acquisition system
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}) 
         if daq is not None:
             daq.sc['P_TARGET'] = 100
             daq.sc['P_TARGET_MIN'] = 100
@@ -148,8 +158,6 @@ def test_run():
             daq.sc['event'] = 'None'
             ts.log('DAS device: %s' % daq.info())
 
-        # Configure the EUT communications
-        eut = der.der_init(ts, support_interfaces={'hil': chil}) 
         '''
         b) Set all frequency trip parameters to the widest range of adjustability. 
             Disable all reactive/active power control functions.
@@ -174,7 +182,6 @@ def test_run():
         '''
         c) Set all AC test source parameters to the nominal operating voltage and frequency 
         '''
-        grid = gridsim.gridsim_init(ts, support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
         if grid is not None:
             grid.freq(f_nom)
             if mode == 'Below':
@@ -191,15 +198,16 @@ def test_run():
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         '''
         above_d) Adjust the EUT's available active power to Prated .
         below_d) ""         ""          "". Set the EUT's output power to 50% of P rated .
         '''
-        pv = pvsim.pvsim_init(ts)
         if pv is not None:
             pv.iv_curve_config(pmp=p_rated, vmp=v_nom_in)
             pv.irradiance_set(1000.)
@@ -314,11 +322,11 @@ def test_run():
                         step_dict = {'F': f_step}
                         if grid is not None:
                             grid.freq(f_step)
-                        ActiveFunction.record_timeresponse(daq=daq)
-                        ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                        result_summary.write(ActiveFunction.write_rslt_sum())
+                        ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                        pipeline.submit(step_dict=step_dict)
 
                     dataset_filename = dataset_filename + ".csv"
+                    pipeline.flush()
                     daq.data_capture(False)
                     ds = daq.data_capture_dataset()
                     ts.log('Saving file: %s' % dataset_filename)
@@ -363,6 +371,10 @@ def test_run():
             #eut.volt_var(params={'Ena': False})
             #eut.volt_watt(params={'Ena': False})
             eut.close()
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
 
@@ -452,6 +464,7 @@ gridsim.params(info)
 pvsim.params(info)
 das.params(info)
 hil.params(info)
+p1547.params(info)
 
 # Add the SIRFN logo
 info.logo('sirfn.png')
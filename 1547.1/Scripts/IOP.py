@@ -155,30 +155,32 @@ def test_run():
         var_max = var_rated
         wait_time = float(ts.param_value('eut.wait_time'))
 
-        # initialize DER configuration
-        eut = der1547.der1547_init(ts)
+        # initialize the DER, the DAS, the HIL environment, the pv and the grid simulators at the same time
+        das_points = {'sc': ('event')}
+        devices = p1547.bring_up(ts, {'der': (lambda: der1547.der1547_init(ts), ()),
+                                      'das': (lambda: das.das_init(ts, sc_points=das_points['sc']), ()),
+                                      'hil': (lambda: hil.hil_init(ts), ()),
+                                      'pvsim': (lambda: pvsim.pvsim_init(ts), ()),
+                                      'gridsim': (lambda: gridsim.gridsim_init(ts), ())})
+        eut, daq, chil, pv, grid = \
+            devices['der'], devices['das'], devices['hil'], devices['pvsim'], devices['gridsim']
+
+        # DER configuration
         eut.config()
 
         if ts.param_value('iop_params.print_comm_map') == 'Yes':
             if callable(getattr(eut, "print_modbus_map", None)):
                 eut.print_modbus_map(w_labels=True)
 
-        das_points = {'sc': ('event')}
-        daq = das.das_init(ts, sc_points=das_points['sc'])
-
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
         if chil is not None:
             chil.config()
 
         # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts)
         if pv is not None:
             pv.power_set(p_rated)
             pv.power_on()  # Turn on DC so the EUT can be initialized
 
         # grid simulator is initialized with test parameters and enabled
-        grid = gridsim.gridsim_init(ts)  # Turn on AC so the EUT can be initialized
         if grid is not None:
             grid.voltage(v_nom)
 
@@ -62,6 +62,8 @@ def test_run():
     rs = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
     step = None
     q_initial = None
     dataset_filename = None
@@ -126,6 +128,7 @@ def test_run():
                                               functions=[LAP, FW, VW],
                                               script_name='Limit Active Power',
                                               criteria_mode=[True, True, True])
+        virtual_lab = p1547.virtual_lab_init(ts, ActiveFunction)
         ts.log_debug("1547.1 Library configured for %s" % ActiveFunction.get_script_name())
 
         # result params
@@ -162,32 +165,32 @@ def test_run():
              category of the DER
            - Enable voltage active power mode
         """
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
-
-        # grid simulator is initialized with test parameters and enabled
-        grid = gridsim.gridsim_init(ts, support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
-        if grid is not None:
-            grid.voltage(v_nom)
-
-        # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts)
-        if pv is not None:
-            pv.power_set(p_rated)
-            pv.power_on()  # Turn on DC so the EUT can be initialized
+        # initialize the instruments, each one as soon as the ones it needs are up
+        das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            'pvsim': (lambda: pvsim.pvsim_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'gridsim': (lambda chil, config: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}),
+                        ('hil', 'config')),
+            'das': (lambda pv, chil, grid: das.das_init(ts, sc_points=das_points['sc'],
+                                                        support_interfaces={'pvsim': pv, 'hil': chil}),
+                    ('pvsim', 'hil', 'gridsim')),
+            # the EUT communications are opened once AC and DC are on
+            'power': (lambda grid, pv, daq: p1547.power_up(ts, grid=grid, pv=pv, v_nom=v_nom, p_rated=p_rated),
+                      ('gridsim', 'pvsim', 'das')),
+            'der': (lambda chil, power: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'power'))
+        }, overrides=virtual_lab.devices() if virtual_lab is not None else None)
+        chil, grid, pv, daq, eut = \
+            devices['hil'], devices['gridsim'], devices['pvsim'], devices['das'], devices['der']
 
         # DAS soft channels
-        das_points = ActiveFunction.get_sc_points()
         ts.log(das_points)
-        # initialize data acquisition
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'pvsim': pv, 'hil': chil})
 
         if daq is not None:
             ts.log('DAS device: %s' % daq.info())
 
-        eut = der.der_init(ts, support_interfaces={'hil': chil}) 
         if eut is not None:
             eut.config()
             # Enable volt/watt curve and configure default settings
@@ -236,23 +239,14 @@ def test_run():
         # Special considerations for CHIL ASGC/Typhoon startup #
         if chil is not None:
             if chil.hil_info()['mode'] == 'Typhoon':
-                inv_power = eut.measurements().get('W')
-                timeout = 120.
-                if inv_power <= p_rated * 0.85:
+                if eut.measurements().get('W') <= p_rated * 0.85:
                     pv.irradiance_set(995)  # Perturb the pv slightly to start the inverter
                     ts.sleep(3)
                     eut.connect(params={'Conn': True})
-                while inv_power <= p_rated * 0.85 and timeout >= 0:
-                    ts.log('Inverter power is at %0.1f. Waiting up to %s more seconds or until EUT starts...' %
-                           (inv_power, timeout))
-                    ts.sleep(1)
-                    timeout -= 1
-                    inv_power = eut.measurements().get('W')
-                    if timeout == 0:
-                        result = script.RESULT_FAIL
-                        raise der.DERError('Inverter did not start.')
-                ts.log('Waiting for EUT to ramp up')
-                ts.sleep(8)
+                if p1547.wait_eut_startup(ts, lambda: eut.measurements().get('W'), p_rated * 0.85,
+                                          mra=ActiveFunction.MRA['P']) is None:
+                    result = script.RESULT_FAIL
+                    raise der.DERError('Inverter did not start.')
 
         # Configure Grid simulator
         if grid is not None:
@@ -260,9 +254,11 @@ def test_run():
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         """
         g) Repeat steps b) through f using active power limits of 33% and zero
@@ -331,8 +327,7 @@ def test_run():
                 #target_dict = {'P': act_pwrs_limit}
                 ActiveFunction.record_timeresponse(daq=daq)
                 ts.log_debug(f'daq={daq}')
-                ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict, y_criterias_mod={'P': LAP})
-                result_summary.write(ActiveFunction.write_rslt_sum())
+                pipeline.submit(step_dict=step_dict, y_criterias_mod={'P': LAP})
 
                 """
                 d)  - Reduce the frequency of the AC test to 59 Hz and hold until EUT active power reaches a new steady 
@@ -350,8 +345,7 @@ def test_run():
                         grid.freq(f_step)
                         step_dict = {'V': v_nom, 'F': f_step, 'P': act_pwrs_limit}
                         ActiveFunction.record_timeresponse(daq=daq)
-                        ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict, y_criterias_mod={'P': FW})
-                        result_summary.write(ActiveFunction.write_rslt_sum())
+                        pipeline.submit(step_dict=step_dict, y_criterias_mod={'P': FW})
 
 
                 """
@@ -370,8 +364,7 @@ def test_run():
                         grid.freq(f_step)
                         step_dict = {'V': v_nom, 'F': f_step, 'P': act_pwrs_limit}
                         ActiveFunction.record_timeresponse(daq=daq)
-                        ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict, y_criterias_mod={'P': FW})
-                        result_summary.write(ActiveFunction.write_rslt_sum())
+                        pipeline.submit(step_dict=step_dict, y_criterias_mod={'P': FW})
 
 
                 """
@@ -390,11 +383,11 @@ def test_run():
                         grid.voltage(v_step)
                         step_dict = {'V': v_step, 'F': f_nom, 'P': act_pwrs_limit}
                         ActiveFunction.record_timeresponse(daq=daq)
-                        ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict, y_criterias_mod={'P': VW})
-                        result_summary.write(ActiveFunction.write_rslt_sum())
+                        pipeline.submit(step_dict=step_dict, y_criterias_mod={'P': VW})
 
                 ts.log('Sampling complete')
                 dataset_filename = filename + ".csv"
+                pipeline.flush()
                 daq.data_capture(False)
                 ds = daq.data_capture_dataset()
                 ts.log('Saving file: %s' % dataset_filename)
@@ -436,6 +429,10 @@ def test_run():
         if chil is not None:
             chil.close()
 
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
 
@@ -515,6 +512,7 @@ gridsim.params(info)
 pvsim.params(info)
 das.params(info)
 hil.params(info)
+p1547.params(info)
 
 
 def script_info():
@@ -39,25 +39,20 @@ def test_run():
 
         test_num = ts.param_value('phase_jump.test_num')
         n_iter = ts.param_value('phase_jump.n_iter')
+        start_mat = ts.param_value('phase_jump.start_mat') or None
+        end_mat = ts.param_value('phase_jump.end_mat') or None
         eut_startup_time = ts.param_value('phase_jump_startup.eut_startup_time')
 
-        # initialize the hardware in the loop
-        phil = hil.hil_init(ts)
+        # initialize the hardware in the loop, the das and the pv at the same time, the der once DC is on
+        devices = p1547.bring_up(ts, {'hil': (lambda: hil.hil_init(ts), ()),
+                                      'das': (lambda: das.das_init(ts), ()),
+                                      'pvsim': (lambda: pvsim.pvsim_init(ts), ()),
+                                      'power': (lambda pv: p1547.power_up(ts, pv=pv, settle=0.5), ('pvsim',)),
+                                      'der': (lambda power: der.der_init(ts), ('power',))})
+        phil, daq, pv, eut = devices['hil'], devices['das'], devices['pvsim'], devices['der']
 
-        # initialize the das
-        daq = das.das_init(ts)
-        ts.sleep(0.5)
-
-        # initialize the pv
-        pv = pvsim.pvsim_init(ts)
-        pv.power_on()
         daq.set_dc_measurement(pv)  # send pv obj to daq to get dc measurements
-        ts.sleep(0.5)
-
-        # initialize the der
-        eut = der.der_init(ts)
         eut.config()
-        ts.sleep(0.5)
 
         if phil is not None:
             ts.log("{}".format(phil.info()))
@@ -261,15 +256,32 @@ def test_run():
                 ts.sleep(1)
                 ts.log("    {}".format(phil.stop_simulation()))
 
+            def set_params(params):
+                for p, v in params:
+                    phil.set_params(p, v)
+
+            # when the model is not reloaded, only the parameters that changed since the last iteration are written,
+            # in one transaction
+            if hasattr(phil, 'set_parameters'):
+                hil_stage = p1547.HilParameterStage(phil.set_parameters, ts)
+            else:
+                hil_stage = p1547.HilParameterStage(set_params, ts)
+
             for n in range(n_iter):
-                # write the parameters each test iteration
-                for p, v in parameters:
+                # write the parameters each test iteration, all of them before each load of the model
+                if load == 'Yes':
+                    hil_stage.invalidate()
+                hil_stage.stage(parameters)
+                for p, v in hil_stage.pending():
                     ts.log_debug('Setting %s = %s' % (p, v))
-                    phil.set_params(p, v)
+                hil_stage.commit()
 
                 if load == 'Yes':
                     ts.sleep(1)
                     ts.log("    {}".format(phil.load_model_on_hil()))
+                # the start and end of the phase jump are captured in two .mat files, each one is waited for by name
+                wave = p1547.WaveformExport(ts, daq, mat_file=start_mat)
+                end_wave = p1547.WaveformExport(ts, daq, mat_file=end_mat, wait_time=0.) if test_num in [4, 5] else None
                 if execute == 'Yes':
                     ts.log("    {}".format(phil.start_simulation()))
                     daq.data_capture(True)  # Start RMS data capture
@@ -283,26 +295,20 @@ def test_run():
                 daq.data_capture(False)
 
                 # complete data capture
-                ts.log('Waiting 10 seconds for Opal to save the waveform data.')
-                ts.sleep(10)
+                wave.wait()
+                if end_wave is not None:
+                    end_wave.wait()
 
                 test_filename = 'PhaseJump_Test%s_Num%s' % (test_num, n+1)
                 ts.log('------------{}------------'.format(test_filename))
 
                 # Convert and save the .mat file that contains the phase jump start
                 ts.log('Processing waveform dataset(s)')
-                ds = daq.waveform_capture_dataset()  # returns list of databases of waveforms (overloaded)
-
-                wave_start_filename = '%s_startwave.csv' % test_filename
-                ts.log('Saving file: %s' % wave_start_filename)
-                ds[0].to_csv(ts.result_file_path(wave_start_filename))
-                ts.result_file(wave_start_filename)
+                wave_start_filename = wave.export('%s_startwave' % test_filename)[0]
 
                 if test_num in [4, 5]:
-                    wave_end_filename = '%s_endwave.csv' % test_filename
-                    ts.log('Saving file: %s' % wave_end_filename)
-                    ds[1].to_csv(ts.result_file_path(wave_end_filename))
-                    ts.result_file(wave_end_filename)
+                    # the phase jump end is the second .mat file (second dataset of the DAS driver)
+                    wave_end_filename = end_wave.export('%s_endwave' % test_filename, index=1)[0]
                 else:
                     wave_end_filename = None
 
@@ -398,6 +404,10 @@ info.param('hil_config.model_name', label='Model Name', default="Phase_Jump_A_B_
 info.param_group('phase_jump', label='IEEE 1547.1 Phase Jump Configuration')
 info.param('phase_jump.test_num', label='Test Number (1-5)', default=1)
 info.param('phase_jump.n_iter', label='Number of Iterations', default=5)
+info.param('phase_jump.start_mat', label='.mat file of the phase jump start capture (waveform.mat_dir)',
+           default='PhaseJump_Start.mat')
+info.param('phase_jump.end_mat', label='.mat file of the phase jump end capture (waveform.mat_dir)',
+           default='PhaseJump_End.mat')
 info.param_group('phase_jump_startup', label='IEEE 1547.1 Phase Jump Startup Time', glob=True)
 info.param('phase_jump_startup.eut_startup_time', label='EUT Startup Time (s)', default=85, glob=True)
 
@@ -405,6 +415,7 @@ hil.params(info)
 das.params(info)
 pvsim.params(info)
 der.params(info)
+p1547.waveform_params(info)
 
 
 def script_info():
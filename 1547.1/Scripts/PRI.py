@@ -62,6 +62,8 @@ def test_run():
     rs = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
     step = None
     q_initial = None
     dataset_filename = None
@@ -142,28 +144,28 @@ def test_run():
         """
         a) Connect the EUT according to the instructions and specifications provided by the manufacturer.
         """
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
-
-        # grid simulator is initialized with test parameters and enabled
-        grid = gridsim.gridsim_init(ts, support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
-        if grid is not None:
-            grid.voltage(v_nom)
-
-        # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts)
-        if pv is not None:
-            pv.power_set(p_rated)
-            pv.power_on()  # Turn on DC so the EUT can be initialized
-            ts.sleep(0.5)
-
-        # DAS soft channels
+        # initialize the instruments, each one as soon as the ones it needs are up
         das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            'pvsim': (lambda: pvsim.pvsim_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'gridsim': (lambda chil, config: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}),
+                        ('hil', 'config')),
+            'das': (lambda pv, chil, grid: das.das_init(ts, sc_points=das_points['sc'],
+                                                        support_interfaces={'pvsim': pv, 'hil': chil}),
+                    ('pvsim', 'hil', 'gridsim')),
+            # the EUT communications are opened once AC and DC are on
+            'power': (lambda grid, pv, daq: p1547.power_up(ts, grid=grid, pv=pv, v_nom=v_nom, p_rated=p_rated,
+                                                           settle=0.5),
+                      ('gridsim', 'pvsim', 'das')),
+            'der': (lambda power: der.der_init(ts), ('power',))
+        })
+        chil, grid, pv, daq, eut = \
+            devices['hil'], devices['gridsim'], devices['pvsim'], devices['das'], devices['der']
 
-        # initialize data acquisition
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'pvsim': pv, 'hil': chil})
+        # DAS soft channels
 
         if daq is not None:
             daq.sc['V_MEAS'] = 100
@@ -180,7 +182,6 @@ def test_run():
         control functions.
         """
         # it is assumed the EUT is on
-        eut = der.der_init(ts)
         if eut is not None:
             eut.config()
 
@@ -195,9 +196,11 @@ def test_run():
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         """
         d) Adjust the EUT's available active power to Prated. For an EUT with an input voltage range, set the input
@@ -395,8 +398,7 @@ def test_run():
 
                 ts.log_debug('current mode %s' % current_mode)
                 ActiveFunction.record_timeresponse(daq=daq)
-                ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict, y_criterias_mod={'Q': current_mode})
-                result_summary.write(ActiveFunction.write_rslt_sum())
+                pipeline.submit(step_dict=step_dict, y_criterias_mod={'Q': current_mode})
                 i += 1
 
             if eut is not None:
@@ -411,6 +413,7 @@ def test_run():
 
             ts.log('Sampling complete')
             dataset_filename = dataset_filename + ".csv"
+            pipeline.flush()
             daq.data_capture(False)
             ds = daq.data_capture_dataset()
             ts.log('Saving file: %s' % dataset_filename)
@@ -453,6 +456,10 @@ def test_run():
         if chil is not None:
             chil.close()
 
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
 
@@ -521,6 +528,7 @@ gridsim.params(info)
 pvsim.params(info)
 das.params(info)
 hil.params(info)
+p1547.params(info)
 
 def script_info():
     return info
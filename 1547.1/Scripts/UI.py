@@ -33,24 +33,9 @@ import script
 import time
 import pprint
 
-
-def find_rlc(p_utility, q_utility, r_set, l_set, c_set):
-    """
-    Proportional controllers for adjusting the resistance and capacitance values in the RLC load bank
-
-    :param p_utility: utility/source active power in watts
-    :param q_utility: utility/source reactive power in var
-    :param r_set: prior resistor % change
-    :param l_set: prior inductor % change
-    :param c_set: prior capacitor % change
-    :return:
-    """
-
-    smoothing_factor = 0.50  # only move a small percentage of the desired change for stability
-    cap = c_set + (6./1300. * q_utility) * smoothing_factor
-    res = r_set + (50.5/11700. * p_utility) * smoothing_factor
-
-    return res, l_set, cap
+# parameters of the setup the RLC balance and the clearing times depend on
+SETUP_PARAMS = ['hil_config.model_name', 'phase_jump.phase_comp', 'phase_jump.transducer_gain', 'eut.phases',
+                'eut.cat', 'eut.cat2', 'eut.f_nom', 'eut.s_rated', 'eut.v_ll', 'eut.v_nom']
 
 
 def set_grid_support_functions(eut, cat, cat2, test_params):
@@ -289,8 +274,7 @@ def print_measurements(meas):
                                meas['AC_Q_LOAD_L_1'], meas['AC_Q_LOAD_L_2'], meas['AC_Q_LOAD_L_3']))
 
 
-def run_ui_test(phil, model_name, daq, test_num, t_trips, q_inc, high_freq_count, low_freq_count, result_summary,
-                c_set):
+def run_ui_test(phil, model_name, daq, test_num, q_inc, result_summary, c_set, suffix=''):
     """
     Run single UI test
 
@@ -298,13 +282,11 @@ def run_ui_test(phil, model_name, daq, test_num, t_trips, q_inc, high_freq_count
     :param model_name: name of the PHIL model
     :param daq: DAQ object
     :param test_num: number of the test
-    :param t_trips: trip time dict with {q_inc, t_trip}
     :param q_inc: reactive power increment
-    :param high_freq_count: number of over frequency islanding events
-    :param low_freq_count: number of under frequency islanding events
     :param result_summary: summary file
     :param c_set: capacitor setpoint
-    :return: t_trips, t_trip, high_freq_count, low_freq_count
+    :param suffix: suffix of the waveform file name (repeated iterations)
+    :return: t_trip, freq, result summary row
     """
 
     # adjust reactive load
@@ -332,6 +314,7 @@ def run_ui_test(phil, model_name, daq, test_num, t_trips, q_inc, high_freq_count
     island drops and remains below 0.05 p.u. Record this as the clearing time.
     '''
     ts.log('Step e)3) Opening switch s3')
+    wave = p1547.WaveformExport(ts, daq)
     # waveform OpWrite configured to capture when S3 is opened
     ctrl_sigs[2] = 1  #3 = Islanding Test
     phil.set_control_signals(values=ctrl_sigs)
@@ -343,7 +326,6 @@ def run_ui_test(phil, model_name, daq, test_num, t_trips, q_inc, high_freq_count
     daq.data_sample()
     t_trip = daq.data_read()['TRIP_TIME']
     freq = daq.data_read()['ISLAND_FREQ']  # calculate fundamental frequency after S3 is open
-    t_trips[q_inc] = t_trip  # append trip time in dict with reactive power increment value key
     ts.log('For reactive power setpoint %0.3f, the island frequency was %0.2f Hz and the trip time was %0.2f s' %
            (q_inc, freq, t_trip))
 
@@ -363,35 +345,19 @@ def run_ui_test(phil, model_name, daq, test_num, t_trips, q_inc, high_freq_count
     SizeBuf = 1/Nbuffers * {[(Tend - Tstart) / Ts ]*(Nsig+1)*8*Nbss} = [(5.5/40e-6)*(8)*8*1000]/16 = 1375000
     Size of one buffer in bytes (SizeBuf) = (Nsig+1) * 8 * Nbss (Minimum) = (7+1)*8*1000 = 64000
     '''
-    ts.log('Waiting 10 seconds for Opal to save the waveform data.')
-    ts.sleep(10)
+    wave.wait()
 
-    test_filename = 'UI_Test_%s_Q%0.2f' % (test_num, q_inc)
+    test_filename = 'UI_Test_%s_Q%0.2f%s' % (test_num, q_inc, suffix)
     ts.log('------------{}------------'.format(test_filename))
     # Convert and save the .mat file that contains the phase jump start
     ts.log('Processing waveform dataset')
-    ds = daq.waveform_capture_dataset()  # returns list of databases of waveforms (overloaded)
-    ui_wave = '%s.csv' % test_filename
-    ts.log('Saving file: %s' % ui_wave)
-    ds[0].to_csv(ts.result_file_path(ui_wave))
-    ts.result_file(ui_wave)
-
-    '''
-    If at any point at least three test instances show island frequency increasing above the
-    fundamental frequency of the ac test source after S3 was opened and at least three instances
-    show island frequency decreasing below the fundamental frequency of the ac test source after
-    S3 was opened S3 was opened, the remaining 1% steps and step e)5) may be omitted.
-    '''
-    f_nom = ts.param_value('eut.f_nom')
-    if freq > f_nom:
-        high_freq_count += 1
-    else:
-        low_freq_count += 1
+    ui_wave = wave.export(test_filename)[0]
 
     # 'Test, Start Waveform, Reactive Power, Trip Time'
-    result_summary.write('%s, %s, %s, %s\n' % (test_filename, ui_wave, q_inc, t_trip))
+    row = [test_filename, ui_wave, q_inc, t_trip]
+    result_summary.write('%s, %s, %s, %s\n' % tuple(row))
 
-    return t_trips, t_trip, high_freq_count, low_freq_count
+    return t_trip, freq, row
 
 
 def energize_system(ctrl_sigs, phil, daq, eut_startup_time, p_rated):
@@ -411,20 +377,15 @@ def energize_system(ctrl_sigs, phil, daq, eut_startup_time, p_rated):
     #     raise Exception
     phil.set_control_signals(values=ctrl_sigs)
 
-    count = 0
-    while count < eut_startup_time:
-        ts.sleep(1)
-        count += 1
+    def read_power():
         daq.data_sample()
-        inv_p_pu = daq.data_read()['AC_P'] / p_rated
-        ts.log('Waited %s sec for EUT to start. Inverter power is %0.4f pu.' % (count, inv_p_pu))
-        if inv_p_pu > 0.9:
-            break
-        if count >= eut_startup_time:
-            ts.log_error('EUT did not start.')
-            raise Exception
+        return daq.data_read()['AC_P']
 
-    ts.sleep(10)  # time to allow the console measurements to settle
+    # wait up to 10 sec for the console measurements to settle (p_rated is s_rated in this test, so the MRA is 5%)
+    if p1547.wait_eut_startup(ts, read_power, p_rated * 0.9, mra=0.05 * p_rated, timeout=eut_startup_time,
+                              ramp_time=10.) is None:
+        ts.log_error('EUT did not start.')
+        raise Exception
 
 # The following EUT functions are required for the UI test:
 # eut.get_ui()
@@ -495,6 +456,7 @@ def test_run():
 
         v_ll = ts.param_value('eut.v_ll')
         v_nom = ts.param_value('eut.v_nom')
+        f_nom = ts.param_value('eut.f_nom')
         s_rated = ts.param_value('eut.s_rated')
         p_rated = s_rated
         phase_comp = ts.param_value('phase_jump.phase_comp')
@@ -505,6 +467,17 @@ def test_run():
         var_rated = ts.param_value('eut.var_rated')
         phases = ts.param_value('eut.phases')
 
+        # the balanced RLC settings are kept across runs, by default next to the run results directories
+        rlc_cache = ts.param_value('ui.rlc_cache')
+        if not rlc_cache:
+            rlc_cache = os.path.join(os.path.dirname(os.path.normpath(ts.results_dir())), 'rlc_balance.json')
+        # an interrupted clearing time sweep is resumed by the next run from its state file
+        sweep_dir = ts.param_value('ui.sweep_dir')
+        if not sweep_dir:
+            sweep_dir = os.path.dirname(os.path.normpath(ts.results_dir()))
+        # the cache and the sweep state are shared by the runs, they are only reused with the same setup
+        setup = p1547.setup_fingerprint(ts, SETUP_PARAMS)
+
         '''
         a) Test circuit configuration:
         
@@ -524,9 +497,6 @@ def test_run():
             3) The ac test source voltage is set to EUT nominal voltage ± 5% and nominal frequency.
         '''
 
-        # initialize the hardware in the loop
-        phil = hil.hil_init(ts)
-
         """
         A separate module has been create for the 1547.1 Standard
         """
@@ -534,28 +504,33 @@ def test_run():
                                                criteria_mode=[False, False, False])
         ts.log_debug("1547.1 Library configured for %s" % active_function.get_script_name())
 
-        # initialize the pv
-        pv = pvsim.pvsim_init(ts)
+        # initialize the hardware in the loop
+        def hil_up():
+            phil = hil.hil_init(ts)
+            if phil is not None:
+                ts.log("{}".format(phil.info()))
+                if open_proj == 'Yes':
+                    phil.open()
+            return phil
+
+        # initialize the hil and the pv at the same time, the das once the hil and the pv are up and the der once
+        # DC is on
+        das_points = active_function.get_sc_points()
+        devices = p1547.bring_up(ts, {'hil': (hil_up, ()),
+                                      'pvsim': (lambda: pvsim.pvsim_init(ts), ()),
+                                      'das': (lambda phil, pv: das.das_init(ts, sc_points=das_points['sc'],
+                                                                           support_interfaces={'hil': phil,
+                                                                                               'pvsim': pv}),
+                                              ('hil', 'pvsim')),
+                                      'power': (lambda pv: p1547.power_up(ts, pv=pv, settle=0.5), ('pvsim',)),
+                                      'der': (lambda power: der1547.der1547_init(ts), ('power',))})
+        phil, pv, daq, eut = devices['hil'], devices['pvsim'], devices['das'], devices['der']
+
         if pv is not None:
-            pv.power_on()
-            ts.sleep(0.5)
             ts.log('Setting PV power to %0.2f W' % p_rated)
             pv.power_set(p_rated)
 
-        if phil is not None:
-            ts.log("{}".format(phil.info()))
-            if open_proj == 'Yes':
-                phil.open()
-
-        # initialize the das
-        das_points = active_function.get_sc_points()
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': phil, 'pvsim': pv})
-        ts.sleep(0.5)
-
-        # initialize the der
-        eut = der1547.der1547_init(ts)
         eut.config()
-        ts.sleep(0.5)
 
         ts.log_debug('ui = %s' % eut.get_ui())
 
@@ -798,6 +773,9 @@ def test_run():
             ctrl_sigs[7] = 12  # degrees, must be determined beforehand
             ctrl_sigs[17] = 0  # cap pot
             ctrl_sigs[8] = 0  # r pot
+            # start from the balanced RLC settings of the last run of this test case, if any
+            balancer = p1547.RlcBalancer(ts, test, cache_file=rlc_cache, fingerprint=setup)
+            ctrl_sigs[8], ctrl_sigs[14], ctrl_sigs[17] = balancer.start(ctrl_sigs[8], ctrl_sigs[14], ctrl_sigs[17])
             ts.log_debug('ctrl_sigs: %s' % ctrl_sigs)
 
             energize_system(ctrl_sigs, phil, daq, eut_startup_time, p_rated)
@@ -839,7 +817,7 @@ def test_run():
                              'RLC = [%0.3f, %0.3f, %0.3f]%%' % (p_load, q_load, p_utility, q_utility,
                                                                 r_set, l_set, c_set))
 
-                r, l, c = find_rlc(p_utility, q_utility, r_set, l_set, c_set)
+                r, l, c = balancer.update(p_utility, q_utility, r_set, l_set, c_set)
                 # ts.log('Setting R to change %0.3f%%, L to change %0.3f%%, C to change %0.3f%%' % (r, l, c))
                 ctrl_sigs[8] = r  # Resistors Pot
                 ctrl_sigs[14] = l  # Inductor Pot
@@ -877,6 +855,10 @@ def test_run():
                 ts.log_debug('WHILE LOOP LOGIC: not(-0.02 < ps3_pu < 0.02) = %s' % (not(-0.02 < qs3_pu < 0.02)))
                 ts.log_debug('WHILE LOOP LOGIC: v_out_of_band = %s' % (v_out_of_band))
 
+            ctrl_sigs = phil.get_control_signals()
+            balancer.converged(ctrl_sigs[8], ctrl_sigs[14], ctrl_sigs[17])
+            c_balanced = ctrl_sigs[17]
+
             ts.log_debug('\t\t TARGET \t Value')
             ts.log_debug('EUT P \t\t %0.5f \t\t %0.5f' % (test_params['p_eut'], meas['AC_P']/p_rated))
             ts.log_debug('EUT Q \t\t %0.5f \t\t %0.5f' % (test_params['q_eut'], meas['AC_Q']/p_rated))
@@ -966,57 +948,34 @@ def test_run():
             ctrl_sigs[2] = 1.  # open S3
             phil.set_control_signals(values=ctrl_sigs)
 
-            counter = 0
-            high_freq_count = 0
-            low_freq_count = 0
-            t_trips = {}
-            for q_inc in [1.0, 0.99, 0.98, 0.97, 0.96, 0.95, 1.01, 1.02, 1.03, 1.04, 1.05]:
+            '''
+            e)4) If clearing times are still increasing at the 95% or 105% points, additional 1% increments
+            shall be taken until clearing times begin decreasing.
+
+            If at any point at least three test instances show island frequency increasing above the
+            fundamental frequency of the ac test source after S3 was opened and at least three instances
+            show island frequency decreasing below the fundamental frequency of the ac test source after
+            S3 was opened S3 was opened, the remaining 1% steps and step e)5) may be omitted.
+            '''
+            # the trials start at the balanced load and go towards the longest clearing time, an interrupted sweep
+            # resumes from its state file
+            search = p1547.ClearingTimeSearch(ts, test,
+                                              state_file=os.path.join(sweep_dir, 'ui_sweep_%s.json' % test),
+                                              fingerprint=setup)
+            # the trials of the interrupted run are part of this run's results
+            for row in search.resumed_rows():
+                result_summary.write('%s, %s, %s, %s\n' % tuple(row))
+            q_inc = search.next()
+            while q_inc is not None:
                 ts.log('Running step e)4) with reactive power setpoint = %0.3f' % q_inc)
-                counter += 1
-                t_trips, t_trip, high_freq_count, low_freq_count = \
-                    run_ui_test(phil, model_name, daq, test_num, t_trips, q_inc, high_freq_count,
-                                low_freq_count, result_summary, c)
-
-                ''' 
-                e)4) If clearing times are still increasing at the 95% or 105% points, additional 1% increments 
-                shall be taken until clearing times begin decreasing.
-                '''
-                min_unreached = True
-                q_min = 0.95
-                while min_unreached:
-                    if q_inc == q_min:
-                        if t_trip > t_trips[round(q_min+0.01, 2)]:  # must run a lower q_inc test
-                            counter += 1
-                            t_trips, t_trip, high_freq_count, low_freq_count = \
-                                run_ui_test(phil, model_name, daq, test_num, t_trips, q_min, high_freq_count,
-                                            low_freq_count, result_summary, c)
-                            if t_trip < t_trips[round(q_min, 2)]:
-                                min_unreached = False
-                            else:
-                                q_min -= 0.01
-                    else:
-                        break
-
-                max_unreached = True
-                q_max = 1.05
-                while max_unreached:
-                    if q_inc == q_max:
-                        if t_trip > t_trips[round(q_min+0.01, 2)]:  # must run a lower q_inc test
-                            counter += 1
-                            t_trips, t_trip, high_freq_count, low_freq_count = \
-                                run_ui_test(phil, model_name, daq, test_num, t_trips, q_max, high_freq_count,
-                                            low_freq_count, result_summary, c)
-                            if t_trip < t_trips[round(q_min, 2)]:
-                                max_unreached = False
-                            else:
-                                q_min -= 0.01
-                    else:
-                        break
+                t_trip, freq, row = run_ui_test(phil, model_name, daq, test_num, q_inc, result_summary, c_balanced)
+                search.record(q_inc, t_trip, freq, f_nom, row=row)
 
                 ctrl_sigs[3] = 0.  # de-energize amplifier
                 phil.set_control_signals(values=ctrl_sigs)
                 # re-energize system and wait for EUT to start for next q_inc
                 energize_system(ctrl_sigs, phil, daq, eut_startup_time, p_rated)
+                q_inc = search.next()
 
             '''
             5) After reviewing the results of the previous step, the 1% setting increments that yielded the
@@ -1024,14 +983,16 @@ def test_run():
             longest clearing times occur at nonconsecutive 1% load setting increments, the additional two
             iterations shall be run for all load settings in between.
             '''
-            t_trips_sorted = [(q, t) for q, t in sorted(t_trips.items(), key=lambda item: item[1])]
-            q_repeats = t_trips_sorted[0:2][0]
+            for q_inc, iteration in search.repeats():
+                ts.log('Running step e)5) iteration %s with reactive power setpoint = %0.3f' % (iteration, q_inc))
+                t_trip, freq, row = run_ui_test(phil, model_name, daq, test_num, q_inc, result_summary, c_balanced,
+                                                suffix='_R%s' % iteration)
+                search.record_repeat(q_inc, t_trip, row=row)
 
-            for q_inc in q_repeats:
-                counter += 1
-                t_trips, t_trip, high_freq_count, low_freq_count = \
-                    run_ui_test(phil, model_name, daq, test_num, t_trips, q_inc, high_freq_count,
-                                low_freq_count, result_summary, c)
+                ctrl_sigs[3] = 0.  # de-energize amplifier
+                phil.set_control_signals(values=ctrl_sigs)
+                energize_system(ctrl_sigs, phil, daq, eut_startup_time, p_rated)
+            search.complete()
 
             daq.data_capture(False)
 
@@ -1129,6 +1090,11 @@ info.param('phase_jump.transducer_gain', label='PHIL transducer gain', default=4
 info.param_group('phase_jump_startup', label='IEEE 1547.1 Phase Jump Startup Time', glob=True)
 info.param('phase_jump_startup.eut_startup_time', label='EUT Startup Time (s)', default=85, glob=True)
 
+info.param_group('ui', label='Unintentional Islanding Options')
+info.param('ui.rlc_cache', label='RLC balance cache file (empty: next to the results directories)', default='')
+info.param('ui.sweep_dir', label='Clearing time sweep state directory (empty: next to the results directories)',
+           default='')
+
 info.param_group('eut', label='EUT Parameters', glob=True)
 info.param('eut.phases', label='Phases', default='Single Phase', values=['Single phase', 'Split phase', 'Three phase'])
 info.param('eut.cat', label='Alphabetic Category', default='CAT_A', values=['CAT_A', 'CAT_B'])
@@ -1145,6 +1111,7 @@ hil.params(info)
 das.params(info)
 pvsim.params(info)
 der1547.params(info)
+p1547.waveform_params(info)
 
 
 def script_info():
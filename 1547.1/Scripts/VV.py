@@ -65,6 +65,8 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
     eut = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
     dataset_filename = None
 
     try:
@@ -102,6 +104,7 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
                                               functions=[VV],
                                               script_name='Volt-Var',
                                               criteria_mode=[True, True, True])
+        virtual_lab = p1547.virtual_lab_init(ts, ActiveFunction)
         ts.log_debug("1547.1 Library configured for %s" % ActiveFunction.get_script_name())
 
         # result params
@@ -113,26 +116,30 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
         '''
         ts.log_debug(15*"*"+"HIL initialization"+15*"*")
 
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
-        ts.log_debug(15*"*"+"PVSIM initialization"+15*"*")
-        # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts, support_interfaces={'hil': chil}) 
-        if pv is not None:
-            pv.power_set(p_rated)
-            pv.power_on()  # Turn on DC so the EUT can be initialized
-            #daq.set_dc_measurement(pv)  # send pv obj to daq to get dc measurements
-            ts.sleep(0.5)
+        # initialize the instruments, each one as soon as the ones it needs are up
+        das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'pvsim': (lambda chil, config: pvsim.pvsim_init(ts, support_interfaces={'hil': chil}),
+                      ('hil', 'config')),
+            'das': (lambda chil, pv: das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}),
+                    ('hil', 'pvsim')),
+            # the EUT communications are opened once DC is on
+            'power': (lambda pv, daq: p1547.power_up(ts, pv=pv, p_rated=p_rated, settle=0.5), ('pvsim', 'das')),
+            'der': (lambda chil, power: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'power')),
+            'gridsim': (lambda chil, eut: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}), ('hil', 'der'))
+        }, overrides=virtual_lab.devices() if virtual_lab is not None else None)
+        chil, pv, daq, eut, grid = \
+            devices['hil'], devices['pvsim'], devices['das'], devices['der'], devices['gridsim']
+
+        #daq.set_dc_measurement(pv)  # send pv obj to daq to get dc measurements
 
         # DAS soft channels
         ts.log_debug(15*"*"+"DAS initialization"+15*"*")
 
         #das_points = {'sc': ('Q_TARGET', 'Q_TARGET_MIN', 'Q_TARGET_MAX', 'Q_MEAS', 'V_TARGET', 'V_MEAS', 'event')}
-        das_points = ActiveFunction.get_sc_points()
-        # initialize data acquisition system
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}) 
 
         daq.sc['V_TARGET'] = v_nom
         daq.sc['Q_TARGET'] = 100
@@ -148,7 +155,6 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
         '''
         ts.log_debug(15*"*"+"EUT initialization"+15*"*")
 
-        eut = der.der_init(ts, support_interfaces={'hil': chil}) 
         if eut is not None:
             eut.config()
             ts.log_debug(eut.measurements())
@@ -175,23 +181,14 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
         if chil is not None:
             if eut is not None:
                 if eut.measurements() is not None:
-                    inv_power = eut.measurements().get('W')
-                    timeout = 120.
-                    if inv_power <= p_rated * 0.85:
+                    if eut.measurements().get('W') <= p_rated * 0.85:
                         pv.irradiance_set(995)  # Perturb the pv slightly to start the inverter
                         ts.sleep(3)
                         eut.connect(params={'Conn': True})
-                    while inv_power <= p_rated * 0.85 and timeout >= 0:
-                        ts.log('Inverter power is at %0.1f. Waiting up to %s more seconds or until EUT starts...' %
-                            (inv_power, timeout))
-                        ts.sleep(1)
-                        timeout -= 1
-                        inv_power = eut.measurements().get('W')
-                        if timeout == 0:
-                            result = script.RESULT_FAIL
-                            raise der.DERError('Inverter did not start.')
-                    ts.log('Waiting for EUT to ramp up')
-                    ts.sleep(8)
+                    if p1547.wait_eut_startup(ts, lambda: eut.measurements().get('W'), p_rated * 0.85,
+                                              mra=ActiveFunction.MRA['P']) is None:
+                        result = script.RESULT_FAIL
+                        raise der.DERError('Inverter did not start.')
                     ts.log_debug('DAS data_read(): %s' % daq.data_read())
 
         '''
@@ -199,7 +196,6 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
         '''
         ts.log_debug(15*"*"+"GRIDSIM initialization"+15*"*")
 
-        grid = gridsim.gridsim_init(ts,support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
         if grid is not None:
             grid.voltage(v_nom)
             if chil is not None:  # If using HIL, give the grid simulator the hil object
@@ -207,9 +203,11 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         '''
         d) Adjust the EUT's available active power to Prated. For an EUT with an input voltage range, set the input
@@ -247,23 +245,14 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
                 if chil is not None:
                     if eut is not None:
                         if  eut.measurements() is not None:
-                            inv_power = eut.measurements().get('W')
-                            timeout = 120.
-                            if inv_power <= pv_power_setting * 0.85:
+                            if eut.measurements().get('W') <= pv_power_setting * 0.85:
                                 pv.irradiance_set(995)  # Perturb the pv slightly to start the inverter
                                 ts.sleep(3)
                                 eut.connect(params={'Conn': True})
-                            while inv_power <= pv_power_setting * 0.85 and timeout >= 0:
-                                ts.log('Inverter power is at %0.1f. Waiting up to %s more seconds or until EUT starts...' %
-                                    (inv_power, timeout))
-                                ts.sleep(1)
-                                timeout -= 1
-                                inv_power = eut.measurements().get('W')
-                                if timeout == 0:
-                                    result = script.RESULT_FAIL
-                                    raise der.DERError('Inverter did not start.')
-                            ts.log('Waiting for EUT to ramp up')
-                            ts.sleep(8)
+                            if p1547.wait_eut_startup(ts, lambda: eut.measurements().get('W'), pv_power_setting * 0.85,
+                                                      mra=ActiveFunction.MRA['P']) is None:
+                                result = script.RESULT_FAIL
+                                raise der.DERError('Inverter did not start.')
                     
 
 
@@ -322,12 +311,12 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
                         if grid is not None:
                             grid.voltage(step_dict['V'])
 
-                        ActiveFunction.record_timeresponse(daq=daq)
-                        ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                        result_summary.write(ActiveFunction.write_rslt_sum())
+                        ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                        pipeline.submit(step_dict=step_dict)
 
                     ts.log('Sampling complete')
                     dataset_filename = dataset_filename + ".csv"
+                    pipeline.flush()
                     daq.data_capture(False)
                     ds = daq.data_capture_dataset()
                     ts.log('Saving file: %s' % dataset_filename)
@@ -368,6 +357,10 @@ def volt_vars_mode(vv_curves, vv_response_time, pwr_lvls, v_ref_value):
         if eut is not None:
             #eut.volt_var(params={'Ena': False})
             eut.close()
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
 
@@ -389,6 +382,8 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
     eut = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
     dataset_filename = None
 
     try:
@@ -425,6 +420,7 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
                                               script_name='Volt-Var',
                                               functions=[VV],
                                               criteria_mode=[True, True, True])
+        virtual_lab = p1547.virtual_lab_init(ts, ActiveFunction)
         ActiveFunction.set_imbalance_config(imbalance_angle_fix=imbalance_fix)
         ts.log_debug('1547.1 Library configured for %s' % ActiveFunction.get_script_name())
 
@@ -434,27 +430,27 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
         '''
         a) Connect the EUT according to the instructions and specifications provided by the manufacturer.
         '''
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
-
-        # grid simulator is initialized with test parameters and enabled
-        grid = gridsim.gridsim_init(ts, support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
-        if grid is not None:
-            grid.voltage(v_nom)
-
-        # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts, support_interfaces={'hil': chil}) 
-        if pv is not None:
-            pv.power_set(p_rated)
-            pv.power_on()  # Turn on DC so the EUT can be initialized
+        # initialize the instruments, each one as soon as the ones it needs are up
+        das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'gridsim': (lambda chil, config: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}),
+                        ('hil', 'config')),
+            'pvsim': (lambda chil, grid: pvsim.pvsim_init(ts, support_interfaces={'hil': chil}), ('hil', 'gridsim')),
+            'das': (lambda chil, pv: das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}),
+                    ('hil', 'pvsim')),
+            # the EUT communications are opened once AC and DC are on
+            'power': (lambda grid, pv, daq: p1547.power_up(ts, grid=grid, pv=pv, v_nom=v_nom, p_rated=p_rated),
+                      ('gridsim', 'pvsim', 'das')),
+            'der': (lambda chil, power: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'power'))
+        }, overrides=virtual_lab.devices() if virtual_lab is not None else None)
+        chil, grid, pv, daq, eut = \
+            devices['hil'], devices['gridsim'], devices['pvsim'], devices['das'], devices['der']
 
         # DAS soft channels
-        das_points = ActiveFunction.get_sc_points()
 
-        # initialize data acquisition system
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}) 
         if daq is not None:
             daq.sc['Q_TARGET'] = 100
             daq.sc['Q_TARGET_MIN'] = 100
@@ -468,7 +464,6 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
         control functions.
         '''
         # it is assumed the EUT is on
-        eut = der.der_init(ts, support_interfaces={'hil': chil}) 
         if eut is not None:
             eut.config()
             ts.log_debug('If not done already, set L/HVRT and trip parameters to the widest range of adjustability.')
@@ -481,10 +476,12 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
 
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         '''
          d) Adjust the EUT's available active power to Prated. For an EUT with an input voltage range, set the input
@@ -579,9 +576,8 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
                     v_target = ActiveFunction.set_grid_asymmetric(grid=grid, case='case_a', imbalance_resp=imbalance_response)
                     ts.log_debug(f'v_target={v_target}')
                     step_dict = {'V': v_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 '''
                 i) For multiphase units, step the AC test source voltage to VN.
@@ -593,9 +589,8 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
                     ts.log('Voltage step: setting Grid simulator voltage to %s (%s)' % (v_nom, step))
                     grid.voltage(v_target)
                     step_dict = {'V': v_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 """
                 j) For multiphase units, step the AC test source voltage to Case B from Table 24.
@@ -606,9 +601,8 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
                     ts.log('Voltage step: setting Grid simulator to case B (IEEE 1547.1-Table 24)(%s)' % step)
                     v_target = ActiveFunction.set_grid_asymmetric(grid=grid, case='case_b', imbalance_resp=imbalance_response)
                     step_dict = {'V': v_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 """
                 k) For multiphase units, step the AC test source voltage to VN
@@ -620,12 +614,12 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
                     ts.log('Voltage step: setting Grid simulator voltage to %s (%s)' % (v_nom, step))
                     grid.voltage(v_nom)
                     step_dict = {'V': v_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 ts.log('Sampling complete')
                 dataset_filename = dataset_filename + ".csv"
+                pipeline.flush()
                 daq.data_capture(False)
                 ds = daq.data_capture_dataset()
                 ts.log('Saving file: %s' % dataset_filename)
@@ -670,6 +664,10 @@ def volt_var_mode_imbalanced_grid(imbalance_resp, vv_curves, vv_response_time):
             #eut.volt_var(params={'Ena': False})
             #eut.volt_watt(params={'Ena': False})
             eut.close()
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
 
@@ -846,6 +844,7 @@ gridsim.params(info)
 pvsim.params(info)
 das.params(info)
 hil.params(info)
+p1547.params(info)
 
 # Add the SIRFN logo
 info.logo('sirfn.png')
@@ -65,6 +65,8 @@ def volt_watt_mode(vw_curves, vw_response_time, pwr_lvls):
     eut = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
     dataset_filename = None
 
 
@@ -102,6 +104,7 @@ def volt_watt_mode(vw_curves, vw_response_time, pwr_lvls):
                                               functions=[VW],
                                               script_name='Volt-Watt',
                                               criteria_mode=[True, True, True])
+        virtual_lab = p1547.virtual_lab_init(ts, ActiveFunction)
         ts.log_debug("1547.1 Library configured for %s" % ActiveFunction.get_script_name())
 
         # result params
@@ -112,27 +115,28 @@ def volt_watt_mode(vw_curves, vw_response_time, pwr_lvls):
         '''
         ts.log_debug(15*"*"+"HIL initialization"+15*"*")
 
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
-        ts.log_debug(15*"*"+"PVSIM initialization"+15*"*")
-
-        # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts)
-        if pv is not None:
-            pv.power_set(p_rated)
-            pv.power_on()  # Turn on DC so the EUT can be initialized
+        # initialize the instruments, each one as soon as the ones it needs are up
+        das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            'pvsim': (lambda: pvsim.pvsim_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'das': (lambda chil, config: das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}),
+                    ('hil', 'config')),
+            # the EUT communications are opened once DC is on
+            'power': (lambda pv, daq: p1547.power_up(ts, pv=pv, p_rated=p_rated), ('pvsim', 'das')),
+            'der': (lambda chil, power: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'power')),
+            'gridsim': (lambda chil, eut: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}), ('hil', 'der'))
+        }, overrides=virtual_lab.devices() if virtual_lab is not None else None)
+        chil, pv, daq, eut, grid = \
+            devices['hil'], devices['pvsim'], devices['das'], devices['der'], devices['gridsim']
 
         ts.log_debug(15*"*"+"DAS initialization"+15*"*")
 
         # DAS soft channels
         #das_points = {'sc': ('P_TARGET', 'P_TARGET_MIN', 'P_TARGET_MAX', 'P_MEAS', 'V_TARGET','V_MEAS','event')}
-        das_points = ActiveFunction.get_sc_points()
 
-        # initialize data acquisition system
-        das_points = ActiveFunction.get_sc_points()
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}) 
         if daq is not None:
             daq.sc['P_TARGET'] = p_rated
             daq.sc['P_TARGET_MIN'] = 100
@@ -147,7 +151,6 @@ def volt_watt_mode(vw_curves, vw_response_time, pwr_lvls):
         '''
         ts.log_debug(15*"*"+"EUT initialization"+15*"*")
 
-        eut = der.der_init(ts, support_interfaces={'hil': chil}) 
         if eut is not None:
             eut.config()
             #Disable all functions on EUT
@@ -174,15 +177,16 @@ def volt_watt_mode(vw_curves, vw_response_time, pwr_lvls):
         ts.log_debug(15*"*"+"GRIDSIM initialization"+15*"*")
 
         # grid simulator is initialized with test parameters and enabled
-        grid = gridsim.gridsim_init(ts, support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
         if grid is not None:
             grid.voltage(v_nom)
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         '''
         v) Test may be repeated for EUT's that can also absorb power using the P' values in the characteristic
@@ -219,23 +223,14 @@ def volt_watt_mode(vw_curves, vw_response_time, pwr_lvls):
                 if chil is not None:
                     if eut is not None:
                         if  eut.measurements() is not None:
-                            inv_power = eut.measurements().get('W')
-                            timeout = 120.
-                            if inv_power <= pv_power_setting * 0.85:
+                            if eut.measurements().get('W') <= pv_power_setting * 0.85:
                                 pv.irradiance_set(995)  # Perturb the pv slightly to start the inverter
                                 ts.sleep(3)
                                 eut.connect(params={'Conn': True})
-                            while inv_power <= pv_power_setting * 0.85 and timeout >= 0:
-                                ts.log('Inverter power is at %0.1f. Waiting up to %s more seconds or until EUT starts...' %
-                                    (inv_power, timeout))
-                                ts.sleep(1)
-                                timeout -= 1
-                                inv_power = eut.measurements().get('W')
-                                if timeout == 0:
-                                    result = script.RESULT_FAIL
-                                    raise der.DERError('Inverter did not start.')
-                            ts.log('Waiting for EUT to ramp up')
-                            ts.sleep(8)
+                            if p1547.wait_eut_startup(ts, lambda: eut.measurements().get('W'), pv_power_setting * 0.85,
+                                                      mra=ActiveFunction.MRA['P']) is None:
+                                result = script.RESULT_FAIL
+                                raise der.DERError('Inverter did not start.')
 
                 '''
                 e) Set EUT volt-watt parameters to the values specified by Characteristic 1. All other functions should
@@ -280,13 +275,13 @@ def volt_watt_mode(vw_curves, vw_response_time, pwr_lvls):
                     if grid is not None:
                         grid.voltage(step_dict['V'])
 
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 # create result workbook
                 ts.log('Sampling complete')
                 dataset_filename = dataset_filename + ".csv"
+                pipeline.flush()
                 daq.data_capture(False)
                 ds = daq.data_capture_dataset()
                 ts.log('Saving file: %s' % dataset_filename)
@@ -328,6 +323,10 @@ def volt_watt_mode(vw_curves, vw_response_time, pwr_lvls):
             chil.close()
         if eut is not None:
             eut.close()
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
 
@@ -344,6 +343,8 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
     eut = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
 
     try:
         cat = ts.param_value('eut.cat')
@@ -376,6 +377,7 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
                                               functions=[VW],
                                               script_name='Volt-Watt',
                                               criteria_mode=[True, True, True])
+        virtual_lab = p1547.virtual_lab_init(ts, ActiveFunction)
         ts.log_debug('1547.1 Library configured for %s' % ActiveFunction.get_script_name())
 
         ActiveFunction.set_imbalance_config(imbalance_angle_fix=imbalance_fix)
@@ -386,28 +388,28 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
         '''
         ts.log_debug(15*"*"+"HIL initialization"+15*"*")
 
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
-        ts.log_debug(15*"*"+"GRIDSIM initialization"+15*"*")
-        # grid simulator is initialized with test parameters and enabled
-        grid = gridsim.gridsim_init(ts, support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
-        if grid is not None:
-            grid.voltage(v_nom)
-        ts.log_debug(15*"*"+"PVSIM initialization"+15*"*")
-        # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts)
-        if pv is not None:
-            pv.power_set(p_rated)
-            pv.power_on()  # Turn on DC so the EUT can be initialized
+        # initialize the instruments, each one as soon as the ones it needs are up
+        das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            'pvsim': (lambda: pvsim.pvsim_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'gridsim': (lambda chil, config: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}),
+                        ('hil', 'config')),
+            'das': (lambda chil, grid: das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}),
+                    ('hil', 'gridsim')),
+            # the EUT communications are opened once AC and DC are on
+            'power': (lambda grid, pv, daq: p1547.power_up(ts, grid=grid, pv=pv, v_nom=v_nom, p_rated=p_rated),
+                      ('gridsim', 'pvsim', 'das')),
+            'der': (lambda chil, power: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'power'))
+        }, overrides=virtual_lab.devices() if virtual_lab is not None else None)
+        chil, grid, pv, daq, eut = \
+            devices['hil'], devices['gridsim'], devices['pvsim'], devices['das'], devices['der']
+
         ts.log_debug(15*"*"+"DAS initialization"+15*"*")
         # DAS soft channels
         #das_points = {'sc': ('P_TARGET', 'P_TARGET_MIN', 'P_TARGET_MAX', 'P_MEAS', 'V_TARGET', 'V_MEAS', 'event')}
-        das_points = ActiveFunction.get_sc_points()
-
-        # initialize data acquisition system
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}) 
 
         if daq is not None:
             daq.sc['P_TARGET'] = p_rated
@@ -424,7 +426,6 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
         '''
         ts.log_debug(15*"*"+"EUT initialization"+15*"*")
 
-        eut = der.der_init(ts, support_interfaces={'hil': chil}) 
         if eut is not None:
             eut.config()
             #Disable all functions on EUT
@@ -448,23 +449,14 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
         # Special considerations for CHIL ASGC/Typhoon startup
         if chil is not None:
             if eut is not None:
-                inv_power = eut.measurements().get('W')
-                timeout = 120.
-                if inv_power <= p_rated * 0.85:
+                if eut.measurements().get('W') <= p_rated * 0.85:
                     pv.irradiance_set(995)  # Perturb the pv slightly to start the inverter
                     ts.sleep(3)
                     eut.connect(params={'Conn': True})
-                while inv_power <= p_rated * 0.85 and timeout >= 0:
-                    ts.log('Inverter power is at %0.1f. Waiting up to %s more seconds or until EUT starts...' %
-                        (inv_power, timeout))
-                    ts.sleep(1)
-                    timeout -= 1
-                    inv_power = eut.measurements().get('W')
-                    if timeout == 0:
-                        result = script.RESULT_FAIL
-                        raise der.DERError('Inverter did not start.')
-                ts.log('Waiting for EUT to ramp up')
-                ts.sleep(8)
+                if p1547.wait_eut_startup(ts, lambda: eut.measurements().get('W'), p_rated * 0.85,
+                                          mra=ActiveFunction.MRA['P']) is None:
+                    result = script.RESULT_FAIL
+                    raise der.DERError('Inverter did not start.')
 
         '''
         c) Set all AC test source parameters to the nominal operating voltage and frequency.
@@ -474,9 +466,11 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         '''
         d) Adjust the EUT's available active power to Prated. For an EUT with an input voltage range, set the input
@@ -503,11 +497,13 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
 
                 # it is assumed the EUT is on
                 eut = der.der_init(ts)
+                if virtual_lab is not None:
+                    eut = virtual_lab.eut
                 if eut is not None:
-                    vw_curve_params = {'v': [round(v_pairs['V1'] * (v_nom),2),
-                                    round(v_pairs['V2'] * (v_nom),2)],
-                                'w': [round(v_pairs['P1'] * (p_rated),2),
-                                        round(v_pairs['P2'] * (p_rated),2)],
+                    vw_curve_params = {'v': [round(v_pairs['V1'] / v_nom, 2),
+                                    round(v_pairs['V2'] / v_nom, 2)],
+                                'w': [round(v_pairs['P1'] / p_rated, 2),
+                                        round(v_pairs['P2'] / p_rated, 2)],
                                        'DeptRef': 'W_MAX_PCT'}
                     vw_params = {'Ena': True, 'ActCrv': 1, 'curve': vw_curve_params}
                     '''
@@ -544,11 +540,10 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
                     step_label = ActiveFunction.get_step_label()
                     ts.log('Voltage step: setting Grid simulator to case A (IEEE 1547.1-Table 24)(%s)' % step_label)
                     ActiveFunction.start(daq=daq, step_label=step_label)
-                    v_target=ActiveFunction.set_grid_asymmetric(grid=grid, case='case_a')
+                    v_target=ActiveFunction.set_grid_asymmetric(grid=grid, case='case_a', imbalance_resp=imbalance_response)
                     step_dict = {'V': v_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
                 '''
                 Step i) For multiphase units, step the AC test source voltage to VN.
                 '''
@@ -559,9 +554,8 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
                     v_target = v_nom
                     grid.voltage(v_target)
                     step_dict = {'V': v_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 '''
                 Step j) For multiphase units, step the AC test source voltage to Case B from Table 24
@@ -570,11 +564,10 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
                     step_label = ActiveFunction.get_step_label()
                     ts.log('Voltage step: setting Grid simulator to case B (IEEE 1547.1-Table 24)(%s)' % step_label)
                     ActiveFunction.start(daq=daq, step_label=step_label)
-                    v_target=ActiveFunction.set_grid_asymmetric(grid=grid, case='case_b')
+                    v_target=ActiveFunction.set_grid_asymmetric(grid=grid, case='case_b', imbalance_resp=imbalance_response)
                     step_dict = {'V': v_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
                 '''
                 Step k) For multiphase units, step the AC test source voltage to VN.
                 '''
@@ -585,14 +578,14 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
                     v_target = v_nom
                     grid.voltage(v_target)
                     step_dict = {'V': v_target}
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 # Get the rslt parameters for plot
                 result_params = ActiveFunction.get_rslt_param_plot()
                 ts.log('Sampling complete')
                 dataset_filename = dataset_filename + ".csv"
+                pipeline.flush()
                 daq.data_capture(False)
                 ds = daq.data_capture_dataset()
                 ts.log('Saving file: %s' % dataset_filename)
@@ -624,6 +617,10 @@ def volt_watt_mode_imbalanced_grid(imbalance_resp, vw_curves, vw_response_time):
             eut.volt_var(params={'Ena': False})
             eut.volt_watt(params={'Ena': False})
             eut.close()
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
 
@@ -788,6 +785,7 @@ gridsim.params(info)
 pvsim.params(info)
 das.params(info)
 hil.params(info)
+p1547.params(info)
 
 # Add the SIRFN logo
 info.logo('sirfn.png')
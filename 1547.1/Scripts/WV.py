@@ -61,6 +61,8 @@ def watt_var_mode(wv_curves, wv_response_time, pwr_lvls):
     eut = None
     chil = None
     result_summary = None
+    pipeline = None
+    profiler = None
     dataset_filename = None
 
     try:
@@ -97,6 +99,7 @@ def watt_var_mode(wv_curves, wv_response_time, pwr_lvls):
                                               functions=[WV],
                                               script_name='Watt-Var',
                                               criteria_mode=[True, True, True])
+        virtual_lab = p1547.virtual_lab_init(ts, ActiveFunction)
         ts.log_debug("1547.1 Library configured for %s" % ActiveFunction.get_script_name())
 
         # result params
@@ -106,22 +109,25 @@ def watt_var_mode(wv_curves, wv_response_time, pwr_lvls):
         a) Connect the EUT according to the instructions and specifications provided by the manufacturer.
         '''
 
-        # initialize HIL environment, if necessary
-        chil = hil.hil_init(ts)
-        if chil is not None:
-            chil.config()
-
-        # pv simulator is initialized with test parameters and enabled
-        pv = pvsim.pvsim_init(ts, support_interfaces={'hil': chil}) 
-        if pv is not None:
-            pv.power_set(p_rated)
-            pv.power_on()  # Turn on DC so the EUT can be initialized
-
-        # DAS soft channels
+        # initialize the instruments, each one as soon as the ones it needs are up
         das_points = ActiveFunction.get_sc_points()
+        devices = p1547.bring_up(ts, {
+            'hil': (lambda: hil.hil_init(ts), ()),
+            # the instruments share the HIL connection, they are opened one at a time once the HIL is configured
+            'config': (lambda chil: p1547.config_hil(chil), ('hil',)),
+            'pvsim': (lambda chil, config: pvsim.pvsim_init(ts, support_interfaces={'hil': chil}),
+                      ('hil', 'config')),
+            'das': (lambda chil, pv: das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}),
+                    ('hil', 'pvsim')),
+            # the EUT communications are opened once DC is on
+            'power': (lambda pv, daq: p1547.power_up(ts, pv=pv, p_rated=p_rated), ('pvsim', 'das')),
+            'der': (lambda chil, power: der.der_init(ts, support_interfaces={'hil': chil}), ('hil', 'power')),
+            'gridsim': (lambda chil, eut: gridsim.gridsim_init(ts, support_interfaces={'hil': chil}), ('hil', 'der'))
+        }, overrides=virtual_lab.devices() if virtual_lab is not None else None)
+        chil, pv, daq, eut, grid = \
+            devices['hil'], devices['pvsim'], devices['das'], devices['der'], devices['gridsim']
 
-        # initialize data acquisition system
-        daq = das.das_init(ts, sc_points=das_points['sc'], support_interfaces={'hil': chil}) 
+        # DAS soft channels
 
         ts.log_debug(0.05 * ts.param_value('eut.s_rated'))
         daq.sc['P_TARGET'] = v_nom
@@ -137,7 +143,6 @@ def watt_var_mode(wv_curves, wv_response_time, pwr_lvls):
         control functions.
         '''
 
-        eut = der.der_init(ts, support_interfaces={'hil': chil}) 
         if eut is not None:
             eut.config()
             ts.log_debug(eut.measurements())
@@ -165,37 +170,29 @@ def watt_var_mode(wv_curves, wv_response_time, pwr_lvls):
         if chil is not None:
             if eut is not None:
                 if eut.measurements() is not None:
-                    inv_power = eut.measurements().get('W')
-                    timeout = 120.
-                    if inv_power <= p_rated * 0.85:
+                    if eut.measurements().get('W') <= p_rated * 0.85:
                         pv.irradiance_set(995)  # Perturb the pv slightly to start the inverter
                         ts.sleep(3)
                         eut.connect(params={'Conn': True})
-                    while inv_power <= p_rated * 0.85 and timeout >= 0:
-                        ts.log('Inverter power is at %0.1f. Waiting up to %s more seconds or until EUT starts...' %
-                            (inv_power, timeout))
-                        ts.sleep(1)
-                        timeout -= 1
-                        inv_power = eut.measurements().get('W')
-                        if timeout == 0:
-                            result = script.RESULT_FAIL
-                            raise der.DERError('Inverter did not start.')
-                    ts.log('Waiting for EUT to ramp up')
-                    ts.sleep(8)
+                    if p1547.wait_eut_startup(ts, lambda: eut.measurements().get('W'), p_rated * 0.85,
+                                              mra=ActiveFunction.MRA['P']) is None:
+                        result = script.RESULT_FAIL
+                        raise der.DERError('Inverter did not start.')
                     ts.log_debug('DAS data_read(): %s' % daq.data_read())
         '''
         '''
         c) Set all AC test source parameters to the nominal operating voltage and frequency.
         '''
-        grid = gridsim.gridsim_init(ts, support_interfaces={'hil': chil})  # Turn on AC so the EUT can be initialized
         if grid is not None:
             grid.voltage(v_nom)
 
         # open result summary file
         result_summary_filename = 'result_summary.csv'
-        result_summary = open(ts.result_file_path(result_summary_filename), 'a+')
+        result_summary = p1547.ResultSummary(ts.result_file_path(result_summary_filename))
         ts.result_file(result_summary_filename)
         result_summary.write(ActiveFunction.get_rslt_sum_col_name())
+        pipeline = p1547.StepPipeline(ActiveFunction, daq, result_summary)
+        profiler = p1547.Profiler(ts).instrument(ActiveFunction, daq=daq, grid=grid, eut=eut, pv=pv, hil=chil)
 
         '''
         d) Adjust the EUT's available active power to Prated. For an EUT with an input voltage range, set the input
@@ -258,23 +255,14 @@ def watt_var_mode(wv_curves, wv_response_time, pwr_lvls):
                 if chil is not None:
                     if eut is not None:
                         if eut.measurements() is not None:
-                            inv_power = eut.measurements().get('W')
-                            timeout = 120.
-                            if inv_power <= pv_power_setting * 0.85:
+                            if eut.measurements().get('W') <= pv_power_setting * 0.85:
                                 pv.irradiance_set(995)  # Perturb the pv slightly to start the inverter
                                 ts.sleep(3)
                                 eut.connect(params={'Conn': True})
-                            while inv_power <= pv_power_setting * 0.85 and timeout >= 0:
-                                ts.log('Inverter power is at %0.1f. Waiting up to %s more seconds or until EUT starts...' %
-                                    (inv_power, timeout))
-                                ts.sleep(1)
-                                timeout -= 1
-                                inv_power = eut.measurements().get('W')
-                                if timeout == 0:
-                                    result = script.RESULT_FAIL
-                                    raise der.DERError('Inverter did not start.')
-                            ts.log('Waiting for EUT to ramp up')
-                            ts.sleep(8)
+                            if p1547.wait_eut_startup(ts, lambda: eut.measurements().get('W'), pv_power_setting * 0.85,
+                                                      mra=ActiveFunction.MRA['P']) is None:
+                                result = script.RESULT_FAIL
+                                raise der.DERError('Inverter did not start.')
                 '''
                 #Create Watt-Var Dictionary
                 p_steps_dict = ActiveFunction.create_wv_dict_steps()
@@ -293,12 +281,12 @@ def watt_var_mode(wv_curves, wv_response_time, pwr_lvls):
                     if pv is not None:
                         pv.power_set(step_dict['P'])
 
-                    ActiveFunction.record_timeresponse(daq=daq)
-                    ActiveFunction.evaluate_criterias(daq=daq, step_dict=step_dict)
-                    result_summary.write(ActiveFunction.write_rslt_sum())
+                    ActiveFunction.record_timeresponse(daq=daq, step_dict=step_dict)
+                    pipeline.submit(step_dict=step_dict)
 
                 ts.log('Sampling complete')
                 dataset_filename = filename + ".csv"
+                pipeline.flush()
                 daq.data_capture(False)
                 ds = daq.data_capture_dataset()
                 ts.log('Saving file: %s' % dataset_filename)
@@ -338,6 +326,10 @@ def watt_var_mode(wv_curves, wv_response_time, pwr_lvls):
         if eut is not None:
             eut.deactivate_all_fct()
             eut.close()
+        if pipeline is not None:
+            pipeline.close()
+        if profiler is not None:
+            profiler.write()
         if result_summary is not None:
             result_summary.close()
         
@@ -474,6 +466,7 @@ gridsim.params(info)
 pvsim.params(info)
 das.params(info)
 hil.params(info)
+p1547.params(info)
 
 # Add the SIRFN logo
 info.logo('sirfn.png')
@@ -0,0 +1,41 @@
+"""
+Read the shipped SVP suites and test configurations with the p1547 library
+"""
+import glob
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Lib'))
+
+from svpelab import p1547  # noqa: E402
+
+SUITES = sorted(glob.glob(os.path.join(ROOT, 'Suites', '*.ste')))
+
+
+@pytest.mark.parametrize('suite_file', SUITES, ids=os.path.basename)
+def test_read_suite(suite_file):
+    tests = p1547.read_suite(suite_file)
+    assert tests
+    for name, script, params in tests:
+        assert '\\' not in name and '/' not in name
+        assert script
+        assert params
+
+
+TESTS = sorted(glob.glob(os.path.join(ROOT, 'Tests', '*', '*.tst')))
+
+
+@pytest.mark.parametrize('config_file', TESTS, ids=os.path.basename)
+def test_read_test_config_defaults(config_file):
+    script, params = p1547.read_test_config(config_file)
+    defaults = p1547.read_script_defaults(os.path.join(ROOT, 'Scripts', script + '.py'))
+    assert set(defaults) <= set(params)
+
+
+def test_plan_missing_config():
+    plans = p1547.plan([os.path.join(ROOT, 'Suites', name) for name in ('missing.ste', 'FRT.ste')])
+    assert plans['ERROR'].iloc[0].startswith('Unable to read suite')
+    assert plans['ERROR'].iloc[1:].isna().all()